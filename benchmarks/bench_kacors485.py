@@ -0,0 +1,191 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+## benchmarks of the poll, read and parse hot paths
+##
+## usage: bench_kacors485.py [--output results.json] [--compare old.json]
+##
+## results are written as json, one entry per benchmark with throughput,
+## latency percentiles and peak bytes allocated per operation
+
+import argparse
+import json
+import os
+import platform
+import sys
+import time
+import tracemalloc
+
+#set import path to ../ directory
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), os.path.pardir)))
+
+from kacors485.kacors485 import KacoRS485, KacoRS485Parser
+from kacors485.simulator import BusSimulator, SimulatedInverter, PtyBus
+from kacors485 import wire
+
+NOON = 12 * 3600.0
+
+ANSWER0 = b'n\xd6\xf6V\xeb\x00\n*010   4 585.9  0.88   515 230.0  2.04   460  14    377 x 8000xi\r\x00'
+ANSWER3 = b'n\xd6\x96V\xeb\x00\n   883    377  44661  44661      0:47  25301:20  25301:20\x00'
+
+
+def percentile(sorted_values, p):
+    if not sorted_values:
+        return None
+    i = min(len(sorted_values) - 1, int(round(p / 100.0 * (len(sorted_values) - 1))))
+    return sorted_values[i]
+
+
+def measure(name, fn, number, items=1):
+    """
+    run fn number times and return the statistics
+
+    items: readings handled by one call of fn
+    """
+    #warm up
+    fn()
+
+    latencies = []
+    start = time.perf_counter()
+    for i in range(number):
+        t = time.perf_counter()
+        fn()
+        latencies.append(time.perf_counter() - t)
+    total = time.perf_counter() - start
+
+    tracemalloc.start()
+    peaks = []
+    for i in range(min(number, 20)):
+        tracemalloc.reset_peak()
+        before = tracemalloc.get_traced_memory()[0]
+        fn()
+        peaks.append(tracemalloc.get_traced_memory()[1] - before)
+    tracemalloc.stop()
+
+    latencies.sort()
+    return {
+        'name': name,
+        'number': number,
+        'items_per_call': items,
+        'total_s': total,
+        'throughput_per_s': number * items / total,
+        'p50_s': percentile(latencies, 50),
+        'p99_s': percentile(latencies, 99),
+        'peak_bytes_per_item': sum(peaks) / float(len(peaks)) / items,
+    }
+
+
+def benchParse(number):
+    p = KacoRS485Parser()
+    return [
+        measure('parse command 0', lambda: p.parse(ANSWER0, '#010\r\n'), number),
+        measure('parse command 3', lambda: p.parse(ANSWER3, '#013\r\n'), number),
+        measure('decode command 0', lambda: p.decode(ANSWER0, '#010\r\n'), number),
+    ]
+
+
+def benchListDictNameToKey(number):
+    p = KacoRS485Parser()
+    parsed = [p.parse(ANSWER0, '#010\r\n'), p.parse(ANSWER3, '#013\r\n')]
+    return [measure('listDictNameToKey', lambda: p.listDictNameToKey(parsed, {}), number)]
+
+
+def benchSendCmdAndRead(number, latency):
+    bus = BusSimulator([SimulatedInverter(1, latency=latency)], clock=lambda: NOON)
+    kaco = KacoRS485(bus.serial())
+    return [measure('sendCmdAndRead latency {}s'.format(latency),
+                    lambda: kaco.sendCmdAndRead('#010\r\n'), number)]
+
+
+def benchCycle(number, inverters, latency, pty):
+    bus = BusSimulator([SimulatedInverter(a, latency=latency) for a in range(1, inverters + 1)],
+                       clock=lambda: NOON)
+
+    def cycle(kaco):
+        for address in range(1, inverters + 1):
+            kaco.readInverterAndParse(address)
+
+    name = 'readInverterAndParse cycle {} inverters latency {}s{}'.format(
+        inverters, latency, ' pty' if pty else '')
+    if not pty:
+        return [measure(name, lambda: cycle(KacoRS485(bus.serial())), number, inverters)]
+
+    with PtyBus(bus) as server:
+        kaco = KacoRS485(server.port)
+        try:
+            return [measure(name, lambda: cycle(kaco), number, inverters)]
+        finally:
+            kaco.close()
+
+
+def benchWire(number, inverters):
+    bus = BusSimulator([SimulatedInverter(a, latency=0) for a in range(1, inverters + 1)],
+                       clock=lambda: NOON)
+    kaco = KacoRS485(bus.serial())
+    parsed = [kaco.readInverterAndParse(a) for a in range(1, inverters + 1)]
+    readings = [kaco.readReading(a) for a in range(1, inverters + 1)]
+    text = json.dumps(parsed, default=str)
+    data = wire.encode(readings)
+    return [
+        measure('json.dumps {} parsed dicts'.format(inverters), lambda: json.dumps(parsed, default=str), number, inverters),
+        measure('json.loads {} parsed dicts'.format(inverters), lambda: json.loads(text), number, inverters),
+        measure('wire.encode {} readings'.format(inverters), lambda: wire.encode(readings), number, inverters),
+        measure('wire.decode {} readings'.format(inverters), lambda: wire.decode(data), number, inverters),
+    ]
+
+
+def compare(results, old):
+    """
+    print the change of throughput against an older result file
+    """
+    before = {r['name']: r for r in old['results']}
+    for r in results:
+        if r['name'] in before:
+            ratio = r['throughput_per_s'] / before[r['name']]['throughput_per_s']
+            print('{:60s} {:6.2f}x'.format(r['name'], ratio))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='benchmark kacors485 hot paths')
+    parser.add_argument('--number', type=int, default=10000, help='calls of the parser benchmarks')
+    parser.add_argument('--cycles', type=int, default=5, help='poll cycles of the bus benchmarks')
+    parser.add_argument('--inverters', type=int, default=20, help='simulated inverters')
+    parser.add_argument('--latency', type=float, default=0.01, help='simulated answer latency in seconds')
+    parser.add_argument('--pty', action='store_true', help='also run the bus over a pty')
+    parser.add_argument('--output', default='bench_output.json', help='json file for the results')
+    parser.add_argument('--compare', help='json file of an older run to compare with')
+    args = parser.parse_args()
+
+    old = None
+    if args.compare:
+        with open(args.compare) as f:
+            old = json.load(f)
+
+    results = []
+    results += benchParse(args.number)
+    results += benchListDictNameToKey(args.number)
+    results += benchWire(args.number // 10, args.inverters)
+    results += benchSendCmdAndRead(args.cycles * args.inverters, args.latency)
+    results += benchCycle(args.cycles, args.inverters, args.latency, False)
+    if args.pty:
+        results += benchCycle(args.cycles, args.inverters, args.latency, True)
+
+    for r in results:
+        print('{name:60s} {throughput_per_s:12.1f}/s p50 {p50_s:.6f}s p99 {p99_s:.6f}s '
+              '{peak_bytes_per_item:8.0f} B'.format(**r))
+
+    out = {
+        'created': time.time(),
+        'python': sys.version,
+        'platform': platform.platform(),
+        'results': results,
+    }
+    with open(args.output, 'w') as f:
+        json.dump(out, f, indent=1)
+
+    if old is not None:
+        compare(results, old)
+
+
+if __name__ == '__main__':
+    main()
@@ -4,7 +4,7 @@
 
 inverterNumbers = [2,1]
 
-#wait seconds before reading data
+#maximum seconds to wait for an answer
 waitBeforeRead = 2
 
 import sys
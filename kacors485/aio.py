@@ -0,0 +1,150 @@
+# -*- coding: utf-8 -*-
+import asyncio
+import logging
+import os
+
+from .kacors485 import KacoRS485, KacoRS485Parser, NO_METRICS
+from .metrics import splitCommand
+
+logger = logging.getLogger(__name__)
+
+
+class AsyncKacoRS485(object):
+    """
+    asyncio version of KacoRS485
+
+    the serial port is configured by pyserial, all reads and writes go
+    through the non-blocking file descriptor watched by the event loop
+
+    example
+    ``
+    kaco = AsyncKacoRS485('/dev/ttyUSB0')
+    data = await kaco.readInverterAndParse(1)
+    kaco.close()
+    ``
+    """
+
+    #maximum time in seconds to wait for a complete answer
+    waitBeforeRead = 0.7
+
+    sendCommands = KacoRS485.sendCommands
+
+    #CaptureWriter which records every answer, None to not record
+    capture = None
+
+    #Metrics which get latencies, timeouts and parse failures
+    metrics = NO_METRICS
+
+    def __init__(self,serialPort):
+        self.ser = KacoRS485.openSerial(serialPort)
+        self.fd = self.ser.fileno()
+        os.set_blocking(self.fd, False)
+
+        #the bus is half duplex, only one command at a time
+        self.lock = asyncio.Lock()
+
+    def close(self):
+        """
+        close serial connection
+        """
+        self.ser.close()
+
+    async def readInverter(self,inverterNumber):
+        """
+        read all available data from inverter inverterNumber
+
+        inverterNumber: can be between 0 and 32
+        """
+        answers = {}
+        for s in self.sendCommands:
+            cmd = KacoRS485.formatCommand(inverterNumber,s)
+            answers[cmd] = await self.sendCmdAndRead(cmd)
+            if len(answers[cmd]) == 0 and s == self.sendCommands[0]:
+                #asleep or not there, do not wait for the other commands
+                break
+
+        return answers
+
+    async def readInverterAndParse(self,inverterNumber):
+        answers = await self.readInverter(inverterNumber)
+
+        return KacoRS485Parser(self.metrics).parseAnswers(answers,inverterNumber)
+
+    async def sendCmdAndRead(self,cmd,timeout=None):
+        """
+        send command on rs485 and read answer
+
+        returns as soon as a complete answer frame arrived or after
+        timeout seconds (default waitBeforeRead) have passed
+
+        return answered bytes
+        if no answer until the deadline, return empty bytes
+        """
+        if timeout is None:
+            timeout = self.waitBeforeRead
+
+        async with self.lock:
+            #drop leftovers of earlier answers
+            self.ser.reset_input_buffer()
+
+            loop = asyncio.get_running_loop()
+            sent = loop.time()
+            await self._write(cmd.encode())
+            logger.debug("send to rs485 %r", cmd)
+            self.metrics.commandSent(*splitCommand(cmd))
+
+            answer = await self._readFrame(cmd, timeout)
+
+        if self.capture is not None:
+            self.capture.write(self.ser.port, cmd, answer, loop.time() - sent)
+
+        return answer
+
+    async def _write(self, data):
+        loop = asyncio.get_running_loop()
+        view = memoryview(data)
+        while view:
+            try:
+                view = view[os.write(self.fd, view):]
+            except BlockingIOError:
+                writable = loop.create_future()
+                loop.add_writer(self.fd, writable.set_result, None)
+                try:
+                    await writable
+                finally:
+                    loop.remove_writer(self.fd)
+
+    async def _readFrame(self, cmd, timeout):
+        loop = asyncio.get_running_loop()
+        answer = bytearray()
+        complete = loop.create_future()
+        address, command = splitCommand(cmd)
+        start = loop.time()
+
+        def onReadable():
+            try:
+                data = os.read(self.fd, 4096)
+                if data and not answer:
+                    self.metrics.firstByte(address, command, loop.time() - start)
+                answer.extend(data)
+            except BlockingIOError:
+                return
+            except OSError as e:
+                loop.remove_reader(self.fd)
+                if not complete.done():
+                    complete.set_exception(e)
+                return
+
+            if not complete.done() and KacoRS485Parser.frameEnd(bytes(answer), cmd) >= 0:
+                complete.set_result(None)
+
+        loop.add_reader(self.fd, onReadable)
+        try:
+            await asyncio.wait_for(complete, timeout)
+            self.metrics.frameComplete(address, command, loop.time() - start, len(answer))
+        except asyncio.TimeoutError:
+            self.metrics.timeout(address, command, len(answer))
+        finally:
+            loop.remove_reader(self.fd)
+
+        return bytes(answer)
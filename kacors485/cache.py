@@ -0,0 +1,71 @@
+# -*- coding: utf-8 -*-
+import threading
+import time
+
+
+class CommandCache(object):
+    """
+    keep answers per (address, command) for a time to live per command
+
+    example
+    ``
+    kaco = KacoRS485('/dev/ttyUSB0')
+    #command 3 holds daily and total counters, once a minute is enough
+    kaco.cache = CommandCache({3: 60})
+    data = kaco.readInverterAndParse(1)
+    age = kaco.cache.age(1, 3)
+    ``
+    """
+
+    def __init__(self, ttl, clock=time.monotonic):
+        """
+        ttl: dict command -> seconds an answer stays valid,
+            commands not in ttl are never cached
+        """
+        self.ttl = dict(ttl)
+        self.clock = clock
+        self.lock = threading.Lock()
+        #(address, command) -> (time of the answer, answer)
+        self.answers = {}
+
+    def get(self, address, command):
+        """
+        return the cached answer or None if there is no valid one
+        """
+        ttl = self.ttl.get(command)
+        if ttl is None:
+            return None
+        with self.lock:
+            item = self.answers.get((address, command))
+        if item is None or self.clock() - item[0] >= ttl:
+            return None
+        return item[1]
+
+    def put(self, address, command, answer):
+        """
+        remember a non-empty answer of a cached command
+        """
+        if command not in self.ttl or len(answer) == 0:
+            return
+        with self.lock:
+            self.answers[(address, command)] = (self.clock(), answer)
+
+    def age(self, address, command):
+        """
+        seconds since the cached answer was read or None
+        """
+        with self.lock:
+            item = self.answers.get((address, command))
+        if item is None:
+            return None
+        return self.clock() - item[0]
+
+    def invalidate(self, address=None):
+        """
+        forget all answers, or all answers of address
+        """
+        with self.lock:
+            if address is None:
+                self.answers = {}
+            else:
+                self.answers = {k: v for k, v in self.answers.items() if k[0] != address}
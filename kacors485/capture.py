@@ -0,0 +1,219 @@
+# -*- coding: utf-8 -*-
+import collections
+import struct
+import threading
+import time
+
+
+#first bytes of every capture file
+MAGIC = b'KACOCAP1'
+
+#timestamp, latency, length of port, command and answer
+RECORD = struct.Struct('<dfBBH')
+
+#one answer read from the bus
+CaptureRecord = collections.namedtuple('CaptureRecord', ('timestamp', 'port', 'command', 'answer', 'latency'))
+
+
+class CaptureWriter(object):
+    """
+    append raw answers to a compact binary capture file
+
+    every record is a fixed header (send time, latency and lengths)
+    followed by the port name, the command and the raw answer bytes
+
+    example
+    ``
+    kaco = KacoRS485('/dev/ttyUSB0')
+    kaco.capture = CaptureWriter('bus.cap')
+    ``
+    """
+
+    def __init__(self, path):
+        #records of several threads must not interleave
+        self.lock = threading.Lock()
+        self.f = open(path, 'ab')
+        if self.f.tell() == 0:
+            self.f.write(MAGIC)
+
+    def write(self, port, command, answer, latency, timestamp=None):
+        """
+        append one answer
+
+        timestamp: wall clock time the command was sent,
+            default now minus latency
+        """
+        if timestamp is None:
+            timestamp = time.time() - latency
+        port = port.encode() if isinstance(port, str) else (port or b'')
+        command = command.encode() if isinstance(command, str) else command
+        answer = bytes(answer)
+        record = RECORD.pack(timestamp, latency, len(port), len(command), len(answer)) + port + command + answer
+        with self.lock:
+            self.f.write(record)
+
+    def flush(self):
+        with self.lock:
+            self.f.flush()
+
+    def close(self):
+        with self.lock:
+            self.f.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+class CaptureReader(object):
+    """
+    iterate over the CaptureRecord of a capture file
+    """
+
+    def __init__(self, path):
+        self.path = path
+
+    def firstTimestamp(self):
+        """
+        timestamp of the first record or None if there is none
+        """
+        with open(self.path, 'rb') as f:
+            if f.read(len(MAGIC)) != MAGIC:
+                raise Exception('{} is not a kacors485 capture file'.format(self.path))
+            header = f.read(RECORD.size)
+        if len(header) < RECORD.size:
+            return None
+        return RECORD.unpack(header)[0]
+
+    def __iter__(self):
+        with open(self.path, 'rb') as f:
+            if f.read(len(MAGIC)) != MAGIC:
+                raise Exception('{} is not a kacors485 capture file'.format(self.path))
+            data = f.read()
+
+        pos = 0
+        size = RECORD.size
+        while pos + size <= len(data):
+            timestamp, latency, portLen, commandLen, answerLen = RECORD.unpack_from(data, pos)
+            pos += size
+            end = pos + portLen + commandLen + answerLen
+            if end > len(data):
+                #cut off while writing
+                break
+            port = data[pos:pos + portLen].decode()
+            pos += portLen
+            command = data[pos:pos + commandLen].decode()
+            pos += commandLen
+            yield CaptureRecord(timestamp, port, command, data[pos:end], latency)
+            pos = end
+
+
+class AnswerSerial(object):
+    """
+    base of serial port look-alikes which answer written commands
+
+    subclasses override answerFor, the base answers nothing like a bus
+    without inverters; the answer is readable once its latency has passed
+    """
+
+    port = None
+
+    def __init__(self, clock=time.monotonic):
+        self.clock = clock
+        self._buffer = b''
+        self._pending = b''
+        self._availableAt = 0.0
+
+    def answerFor(self, command):
+        """
+        return (answer bytes, latency in seconds) for command (str)
+        or None to not answer
+        """
+        return None
+
+    def write(self, data):
+        command = data.decode('latin-1') if isinstance(data, bytes) else data
+        answer = self.answerFor(command)
+        if answer is None:
+            self._pending = b''
+        else:
+            self._pending = answer[0]
+            self._availableAt = self.clock() + answer[1]
+        return len(data)
+
+    def _release(self):
+        if self._pending and self.clock() >= self._availableAt:
+            self._buffer += self._pending
+            self._pending = b''
+
+    def inWaiting(self):
+        self._release()
+        return len(self._buffer)
+
+    @property
+    def in_waiting(self):
+        return self.inWaiting()
+
+    def read(self, size=1):
+        self._release()
+        out, self._buffer = self._buffer[:size], self._buffer[size:]
+        return out
+
+    def readinto(self, b):
+        self._release()
+        n = min(len(b), len(self._buffer))
+        b[:n] = self._buffer[:n]
+        self._buffer = self._buffer[n:]
+        return n
+
+    def reset_input_buffer(self):
+        self._buffer = b''
+
+    def close(self):
+        pass
+
+
+class ReplaySerial(AnswerSerial):
+    """
+    serial port look-alike which answers commands from a capture
+
+    every written command gets the next recorded answer to the same
+    command; with realtime the answer only shows up after the
+    recorded latency, otherwise at once
+
+    example
+    ``
+    kaco = KacoRS485(ReplaySerial(CaptureReader('bus.cap')))
+    reading = kaco.readReading(1)
+    ``
+    """
+
+    def __init__(self, records, realtime=False, port=None, clock=time.monotonic):
+        """
+        records: iterable of CaptureRecord, e.g. a CaptureReader
+        port: only replay records of this port
+        """
+        AnswerSerial.__init__(self, clock)
+        self.answers = collections.defaultdict(collections.deque)
+        for record in records:
+            if port is None or record.port == port:
+                self.answers[record.command].append(record)
+                if port is None:
+                    port = record.port
+        self.port = port
+        self.realtime = realtime
+
+    def answerFor(self, command):
+        queue = self.answers.get(command)
+        if not queue:
+            return None
+        record = queue.popleft()
+        return record.answer, (record.latency if self.realtime else 0)
+
+    def remaining(self):
+        """
+        number of recorded answers not replayed yet
+        """
+        return sum(len(q) for q in self.answers.values())
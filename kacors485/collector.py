@@ -0,0 +1,214 @@
+# -*- coding: utf-8 -*-
+import logging
+import threading
+import queue
+from concurrent.futures import ThreadPoolExecutor
+
+from .kacors485 import KacoRS485, NO_METRICS
+from .poller import KacoBusPoller
+
+logger = logging.getLogger(__name__)
+
+
+class KacoCollector(object):
+    """
+    collect data from inverters on several rs485 buses at once
+
+    every bus gets its own thread, so one collection cycle takes as long
+    as the slowest bus instead of the sum of all buses
+
+    example
+    ``
+    collector = KacoCollector('/dev/ttyUSB*', [1, 2, 3])
+    collector.start()
+    for port, address, command, data in collector.collect():
+        print(port, address, command, data)
+    ``
+
+    a bus whose port fails, e.g. after a reset of the usb adapter, is
+    reopened after retryDelay seconds, doubling up to maxRetryDelay
+    while it keeps failing
+    """
+
+    retryDelay = 1.0
+    maxRetryDelay = 60.0
+
+    def __init__(self, ports, addresses, intervals=None, kacoFactory=KacoRS485):
+        """
+        ports: port name, wildcard or list of them; every match is opened
+        addresses: list of inverter addresses polled on every bus
+            or dict port -> list of addresses
+        intervals: poll intervals, see KacoBusPoller
+        kacoFactory: callable port -> KacoRS485-like object
+        """
+        if isinstance(ports, str):
+            ports = [ports]
+
+        self.ports = []
+        for port in ports:
+            if '*' in port:
+                self.ports.extend(KacoRS485.ports_from_wildcard(port))
+            else:
+                self.ports.append(port)
+
+        self.addresses = {}
+        for port in self.ports:
+            if isinstance(addresses, dict):
+                self.addresses[port] = addresses.get(port, [])
+            else:
+                self.addresses[port] = list(addresses)
+
+        self.intervals = intervals
+        self.kacoFactory = kacoFactory
+
+        self.kacos = {}
+        self.pollers = {}
+        #(port, address) -> dict of latest data of all commands
+        self.latest = {}
+        #port -> number of failures of the bus and the last one
+        self.errors = {}
+        self.lastError = {}
+
+        self._results = queue.Queue()
+        self._stop = threading.Event()
+        self._threads = []
+        self._lock = threading.Lock()
+
+    def open(self):
+        """
+        open all ports which are not open yet
+        """
+        for port in self.ports:
+            if port not in self.kacos:
+                self.kacos[port] = self.kacoFactory(port)
+
+    def close(self):
+        """
+        stop polling and close all ports
+        """
+        self.stop()
+        for port in list(self.kacos):
+            self.kacos.pop(port).close()
+
+    def readAll(self):
+        """
+        read all inverters of all buses once, buses in parallel
+
+        return dict (port, address) -> parsed data or None if the
+        inverter did not answer
+        """
+        self.open()
+
+        def readBus(port):
+            kaco = self.kacos[port]
+            out = {}
+            for address in self.addresses[port]:
+                try:
+                    out[(port, address)] = kaco.readInverterAndParse(address)
+                except Exception:
+                    out[(port, address)] = None
+            return out
+
+        ret = {}
+        with ThreadPoolExecutor(max_workers=max(len(self.ports), 1)) as pool:
+            for out in pool.map(readBus, self.ports):
+                ret.update(out)
+
+        return ret
+
+    def start(self):
+        """
+        start one polling thread per bus
+        """
+        if self._threads:
+            return
+
+        self.open()
+        self._stop.clear()
+        for port in self.ports:
+            if not self.addresses[port]:
+                continue
+            #sleep on the stop event, so stop() interrupts waiting threads
+            self.pollers[port] = KacoBusPoller(self.kacos[port], self.addresses[port],
+                                               self.intervals, sleep=self._stop.wait)
+            thread = threading.Thread(target=self._run, args=(port,), name='kacors485 {}'.format(port))
+            thread.daemon = True
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self):
+        """
+        stop all polling threads and wait for them
+        """
+        self._stop.set()
+        for thread in self._threads:
+            thread.join()
+        self._threads = []
+
+    def _run(self, port):
+        poller = self.pollers[port]
+        delay = self.retryDelay
+        while not self._stop.is_set():
+            try:
+                address, command, data = poller.step()
+            except Exception as e:
+                self._busError(port, e)
+                if self._stop.wait(delay):
+                    break
+                delay = min(delay * 2, self.maxRetryDelay)
+                try:
+                    self._reopen(port)
+                except Exception as e:
+                    self._busError(port, e)
+                continue
+            delay = self.retryDelay
+            if self._stop.is_set():
+                break
+            if data is not None:
+                with self._lock:
+                    self.latest.setdefault((port, address), {}).update(data)
+            self._results.put((port, address, command, data))
+
+    def _busError(self, port, error):
+        logger.exception("error on bus %s", port)
+        with self._lock:
+            self.errors[port] = self.errors.get(port, 0) + 1
+            self.lastError[port] = repr(error)
+        getattr(self.kacos.get(port), 'metrics', NO_METRICS).busError(port)
+
+    def _reopen(self, port):
+        """
+        close the port and open it again for its poller
+        """
+        old = self.kacos.get(port)
+        metrics = getattr(old, 'metrics', None)
+        if old is not None:
+            try:
+                old.close()
+            except Exception:
+                logger.debug("closing %s failed", port, exc_info=True)
+        kaco = self.kacoFactory(port)
+        if metrics is not None:
+            kaco.metrics = metrics
+        self.kacos[port] = kaco
+        self.pollers[port].kaco = kaco
+
+    def collect(self, timeout=None):
+        """
+        generator of (port, address, command, data) from all buses
+        in the order they arrive
+
+        stops if no result arrived for timeout seconds
+        """
+        while True:
+            try:
+                yield self._results.get(timeout=timeout)
+            except queue.Empty:
+                return
+
+    def cycleTime(self):
+        """
+        achieved cycle time of the slowest bus
+        """
+        times = [p.cycleTime for p in self.pollers.values() if p.cycleTime is not None]
+        return max(times) if times else None
@@ -0,0 +1,276 @@
+# -*- coding: utf-8 -*-
+
+## long running collector serving the latest data over a unix socket
+##
+## usage: python -m kacors485.daemon --socket /run/kacors485.sock --port '/dev/ttyUSB*' --address 1 2 3
+##
+## the daemon owns the serial ports and the poll schedule; clients send
+## one json object per line and get one json object per line back
+
+import argparse
+import collections
+import json
+import os
+import socket
+import socketserver
+import threading
+import time
+
+from .collector import KacoCollector
+
+
+class KacoDaemon(object):
+    """
+    poll all buses of a KacoCollector and serve the results over a
+    unix socket as json lines
+
+    requests are json objects with 'op':
+    {"op": "latest"} latest data of all inverters
+    {"op": "latest", "address": 1, "port": "/dev/ttyUSB0"} of one inverter,
+        port can be left out if only one bus is polled
+    {"op": "history", "address": 1, "since": 1500000000.0} results of
+        the last historySize commands of one inverter
+    {"op": "status"} ports, addresses, cycle time and failures per bus
+
+    example
+    ``
+    daemon = KacoDaemon(KacoCollector('/dev/ttyUSB*', [1, 2]), '/run/kacors485.sock')
+    daemon.serve_forever()
+    ``
+    """
+
+    #results kept per inverter for history requests
+    historySize = 360
+
+    def __init__(self, collector, socketPath, historySize=None):
+        self.collector = collector
+        self.socketPath = socketPath
+        if historySize is not None:
+            self.historySize = historySize
+
+        self.lock = threading.Lock()
+        #(port, address) -> {'timestamp': time of the last answer, 'data': merged data}
+        self.latest = {}
+        #(port, address) -> deque of (timestamp, command, data)
+        self.history = {}
+
+        self.server = None
+        self._stop = threading.Event()
+        self._threads = []
+
+    def start(self):
+        """
+        start polling and serving in background threads
+        """
+        if os.path.exists(self.socketPath):
+            probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            try:
+                probe.connect(self.socketPath)
+            except ConnectionRefusedError:
+                #left over from a daemon which did not stop cleanly
+                os.unlink(self.socketPath)
+            else:
+                raise Exception('another daemon serves {}'.format(self.socketPath))
+            finally:
+                probe.close()
+        self.server = DaemonServer(self.socketPath, DaemonHandler)
+        self.server.kacoDaemon = self
+
+        self._stop.clear()
+        self.collector.start()
+        for target, name in ((self._collect, 'kacors485 daemon collect'),
+                             (self.server.serve_forever, 'kacors485 daemon serve')):
+            thread = threading.Thread(target=target, name=name)
+            thread.daemon = True
+            thread.start()
+            self._threads.append(thread)
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
+            self.server = None
+        self.collector.close()
+        for thread in self._threads:
+            thread.join()
+        self._threads = []
+        if os.path.exists(self.socketPath):
+            os.unlink(self.socketPath)
+
+    def serve_forever(self):
+        self.start()
+        try:
+            while not self._stop.wait(1):
+                pass
+        finally:
+            self.stop()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *args):
+        self.stop()
+
+    def _collect(self):
+        while not self._stop.is_set():
+            for port, address, command, data in self.collector.collect(timeout=0.2):
+                if data is not None:
+                    self.add(port, address, command, data)
+                if self._stop.is_set():
+                    return
+
+    def add(self, port, address, command, data, timestamp=None):
+        """
+        remember the data of one answer
+        """
+        if timestamp is None:
+            timestamp = time.time()
+        key = (port, address)
+        with self.lock:
+            latest = self.latest.setdefault(key, {'timestamp': timestamp, 'data': {}})
+            latest['timestamp'] = timestamp
+            latest['data'].update(data)
+            if key not in self.history:
+                self.history[key] = collections.deque(maxlen=self.historySize)
+            self.history[key].append((timestamp, command, data))
+
+    def _key(self, request):
+        address = request.get('address')
+        port = request.get('port')
+        if address is None:
+            raise Exception('address missing')
+        if port is None:
+            ports = set(p for p, a in self.latest)
+            if len(ports) != 1:
+                raise Exception('port missing')
+            port = ports.pop()
+        return port, address
+
+    def handle(self, request):
+        """
+        answer one request, see class doc
+        """
+        op = request.get('op')
+        with self.lock:
+            if op == 'latest':
+                if request.get('address') is None:
+                    keys = sorted(self.latest)
+                else:
+                    keys = [self._key(request)]
+                return {'inverters': [{'port': port, 'address': address,
+                                       'timestamp': self.latest[(port, address)]['timestamp'],
+                                       'data': dict(self.latest[(port, address)]['data'])}
+                                      for port, address in keys if (port, address) in self.latest]}
+            if op == 'history':
+                key = self._key(request)
+                since = request.get('since', 0)
+                return {'port': key[0], 'address': key[1],
+                        'history': [{'timestamp': t, 'command': c, 'data': d}
+                                    for t, c, d in self.history.get(key, ()) if t >= since]}
+            if op == 'status':
+                return {'ports': self.collector.ports,
+                        'addresses': self.collector.addresses,
+                        'cycle_time': self.collector.cycleTime(),
+                        'errors': dict(self.collector.errors)}
+        raise Exception('unknown op {!r}'.format(op))
+
+
+class DaemonServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+class DaemonHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        for line in self.rfile:
+            try:
+                response = self.server.kacoDaemon.handle(json.loads(line.decode()))
+            except Exception as e:
+                response = {'error': str(e)}
+            self.wfile.write(json.dumps(response).encode() + b'\n')
+            self.wfile.flush()
+
+
+class KacoDaemonClient(object):
+    """
+    read data collected by a KacoDaemon
+
+    example
+    ``
+    client = KacoDaemonClient('/run/kacors485.sock')
+    print(client.latest(1)['p_ac'])
+    ``
+    """
+
+    def __init__(self, socketPath):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.connect(socketPath)
+        self.f = self.sock.makefile('rwb')
+        self.lock = threading.Lock()
+
+    def request(self, **request):
+        """
+        send one request and return the response, raise on errors
+        """
+        with self.lock:
+            self.f.write(json.dumps(request).encode() + b'\n')
+            self.f.flush()
+            line = self.f.readline()
+        if not line:
+            raise Exception('daemon closed the connection')
+        response = json.loads(line.decode())
+        if 'error' in response:
+            raise Exception(response['error'])
+        return response
+
+    def latest(self, address=None, port=None):
+        """
+        dict field name -> value of one inverter or, without address,
+        list of dicts with port, address, timestamp and data of all
+        """
+        inverters = self.request(op='latest', address=address, port=port)['inverters']
+        if address is None:
+            return inverters
+        if not inverters:
+            return None
+        return inverters[0]['data']
+
+    def history(self, address, port=None, since=0):
+        """
+        list of dicts with timestamp, command and data of one inverter
+        """
+        return self.request(op='history', address=address, port=port, since=since)['history']
+
+    def status(self):
+        return self.request(op='status')
+
+    def close(self):
+        self.f.close()
+        self.sock.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='poll kaco inverters and serve the data on a unix socket')
+    parser.add_argument('--socket', required=True, help='path of the unix socket')
+    parser.add_argument('--port', nargs='+', required=True, help='serial ports, wildcards are expanded')
+    parser.add_argument('--address', nargs='+', type=int, required=True, help='inverter addresses')
+    parser.add_argument('--interval0', type=float, default=10, help='seconds between command 0')
+    parser.add_argument('--interval3', type=float, default=60, help='seconds between command 3')
+    args = parser.parse_args()
+
+    collector = KacoCollector(args.port, args.address, {0: args.interval0, 3: args.interval3})
+    try:
+        KacoDaemon(collector, args.socket).serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,84 @@
+# -*- coding: utf-8 -*-
+
+
+class DeltaFilter(object):
+    """
+    reduce readings to the fields which changed since they were last sent
+
+    a number counts as changed if it moved more than its deadband away
+    from the last sent value, text on any change. Every
+    snapshotInterval seconds an inverter gets a full snapshot so a
+    receiver can resync.
+
+    example
+    ``
+    delta = DeltaFilter({'p_ac': 50})
+    for address, command, data in poller.poll():
+        out = delta.update(address, time.time(), data)
+    ``
+    """
+
+    #absolute deadbands of numeric fields, others send on any change
+    defaultDeadbands = {
+        'u_dc': 1.0, 'i_dc': 0.05, 'p_dc': 10.0,
+        'u_ac': 1.0, 'i_ac': 0.05, 'p_ac': 10.0,
+        'temp': 1.0,
+    }
+
+    #fields which are never sent
+    excludeFields = ('last_command_sent', 'checksum')
+
+    def __init__(self, deadbands=None, snapshotInterval=900):
+        self.deadbands = dict(self.defaultDeadbands)
+        if deadbands:
+            self.deadbands.update(deadbands)
+        self.snapshotInterval = snapshotInterval
+
+        #address -> field name -> last sent value
+        self.sent = {}
+        #address -> field name -> latest value
+        self.latest = {}
+        #address -> time of the last snapshot
+        self.lastSnapshot = {}
+
+    def changed(self, name, old, new):
+        if old is None or new is None:
+            return old is not new
+        deadband = self.deadbands.get(name)
+        if deadband is None or not isinstance(new, (int, float)):
+            return old != new
+        return abs(new - old) > deadband
+
+    def update(self, address, timestamp, data):
+        """
+        feed decoded data (field name -> value) of address
+
+        return tuple (dict of fields to send, True for a full snapshot)
+        or None if nothing needs to be sent
+        """
+        if not data:
+            return None
+
+        latest = self.latest.setdefault(address, {})
+        sent = self.sent.setdefault(address, {})
+        for name, value in data.items():
+            if name not in self.excludeFields:
+                latest[name] = value
+
+        last = self.lastSnapshot.get(address)
+        if last is None or timestamp - last >= self.snapshotInterval:
+            self.lastSnapshot[address] = timestamp
+            sent.clear()
+            sent.update(latest)
+            return dict(latest), True
+
+        out = {}
+        for name, value in data.items():
+            if name in self.excludeFields:
+                continue
+            if self.changed(name, sent.get(name), value):
+                out[name] = value
+                sent[name] = value
+        if not out:
+            return None
+        return out, False
@@ -0,0 +1,176 @@
+# -*- coding: utf-8 -*-
+import json
+import os
+import time
+
+from .kacors485 import KacoRS485, KacoRS485Parser
+
+
+class AddressMap(object):
+    """
+    inverters found on a bus, kept in a json file
+
+    every address maps to a dict with the inverter 'type', its typical
+    answer 'latency' in seconds and 'last_seen' (unix time)
+    """
+
+    #weight of a new latency in the typical latency
+    latencyWeight = 0.3
+
+    def __init__(self, path=None):
+        """
+        path: json file, None to keep the map in memory only
+        """
+        self.path = path
+        self.inverters = {}
+        if path is not None and os.path.exists(path):
+            with open(path) as f:
+                self.inverters = {int(a): info for a, info in json.load(f).items()}
+
+    def addresses(self):
+        return sorted(self.inverters)
+
+    def update(self, address, type, latency, seen):
+        info = self.inverters.get(address)
+        if info is not None and info.get('latency') is not None:
+            latency = info['latency'] + self.latencyWeight * (latency - info['latency'])
+        self.inverters[address] = {'type': type, 'latency': latency, 'last_seen': seen}
+
+    def save(self):
+        if self.path is None:
+            return
+        #write and rename, a crash must not leave half a map
+        tmp = self.path + '.tmp'
+        with open(tmp, 'w') as f:
+            json.dump({str(a): info for a, info in sorted(self.inverters.items())}, f, indent=1)
+        os.replace(tmp, self.path)
+
+
+class BusScanner(object):
+    """
+    find the inverters on a bus by sending command 0 with short deadlines
+
+    example
+    ``
+    kaco = KacoRS485('/dev/ttyUSB0')
+    scanner = BusScanner(kaco, AddressMap('/var/lib/kaco/bus0.json'))
+    #scan only if no inverter is known yet
+    addresses = scanner.addresses()
+    #unknown addresses are probed while the bus is idle
+    poller = KacoBusPoller(kaco, addresses, scanner=scanner)
+    ``
+    """
+
+    #deadlines of the passes of scan, later passes only probe silent addresses
+    scanTimeouts = (0.15, 0.3)
+    #deadline of a probe while polling
+    probeTimeout = 0.15
+    #seconds until an address without inverter is probed again while polling
+    rescanInterval = 3600
+
+    def __init__(self, kaco, addressMap=None, addresses=range(1, 33), clock=time.monotonic,
+                 timestamp=time.time):
+        """
+        kaco: open KacoRS485 instance which owns the bus
+        addressMap: AddressMap with the inverters found so far
+        addresses: addresses which can hold an inverter
+        """
+        self.kaco = kaco
+        self.parser = KacoRS485Parser(getattr(kaco, 'metrics', None))
+        self.addressMap = addressMap if addressMap is not None else AddressMap()
+        self.candidates = list(addresses)
+        self.clock = clock
+        self.timestamp = timestamp
+
+        #address -> clock of the last probe while polling
+        self.lastProbe = {}
+
+    def probe(self, address, timeout=None):
+        """
+        send command 0 to address and record an answering inverter
+
+        return dict with type, latency and last_seen or None if nothing answered
+        """
+        if timeout is None:
+            timeout = self.probeTimeout
+        cmd = KacoRS485.formatCommand(address, 0)
+        start = self.clock()
+        answer = self.kaco.sendCmdAndRead(cmd, timeout)
+        latency = self.clock() - start
+        if len(answer) == 0:
+            return None
+
+        try:
+            type = self.parser.decode(answer, cmd).get('type')
+        except Exception:
+            #something answered, even if it was garbled
+            type = None
+        self.addressMap.update(address, type, latency, self.timestamp())
+        return self.addressMap.inverters[address]
+
+    def record(self, address, type, latency):
+        """
+        record an inverter which answered while polling,
+        the map is saved if address was not known yet
+        """
+        known = address in self.addressMap.inverters
+        self.addressMap.update(address, type, latency, self.timestamp())
+        if not known:
+            self.addressMap.save()
+
+    def scan(self):
+        """
+        probe all candidate addresses and save the address map
+
+        return dict address -> info of the inverters which answered
+        """
+        found = {}
+        silent = list(self.candidates)
+        for timeout in self.scanTimeouts:
+            for address in list(silent):
+                info = self.probe(address, timeout)
+                if info is not None:
+                    found[address] = info
+                    silent.remove(address)
+        self.addressMap.save()
+        return found
+
+    def addresses(self):
+        """
+        known addresses, scanning the bus first if none is known
+        """
+        if not self.addressMap.addresses():
+            self.scan()
+        return self.addressMap.addresses()
+
+    def probeNext(self, exclude=()):
+        """
+        probe the next candidate address which is not in exclude and was
+        not probed for rescanInterval seconds, saving the map on a find
+
+        return tuple (address, info or None) or None if no address is due
+        """
+        now = self.clock()
+        never = float('-inf')
+        due = [a for a in self.candidates if a not in exclude
+               and now - self.lastProbe.get(a, never) >= self.rescanInterval]
+        if not due:
+            return None
+        address = min(due, key=lambda a: self.lastProbe.get(a, never))
+        self.lastProbe[address] = now
+        info = self.probe(address)
+        if info is not None:
+            self.addressMap.save()
+        return address, info
+
+    def nextProbe(self, exclude=()):
+        """
+        clock time at which probeNext probes the next candidate address
+        which is not in exclude
+
+        return None if there is no such candidate
+        """
+        never = float('-inf')
+        times = [self.lastProbe.get(a, never) + self.rescanInterval
+                 for a in self.candidates if a not in exclude]
+        return min(times) if times else None
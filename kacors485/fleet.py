@@ -0,0 +1,172 @@
+# -*- coding: utf-8 -*-
+import time
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+from .rollup import plainValues
+
+#numeric fields kept per inverter and cycle
+FLEET_FIELDS = ('status', 'u_dc', 'i_dc', 'p_dc', 'u_ac', 'i_ac', 'p_ac', 'temp', 'e_day')
+
+
+class FleetBuffer(object):
+    """
+    the last cycles of all inverters of a site in one numpy array
+    (needs numpy), with checks which compare all inverters at once
+
+    values are kept as array field x cycle x inverter, missing values
+    are nan
+
+    example
+    ``
+    fleet = FleetBuffer(range(1, 33), cycles=60)
+    for ...:
+        fleet.addCycle(time.time(), {address: kaco.readInverterAndParse(address) ...})
+        checks = fleet.check()
+        print(checks['addresses'][checks['derating']])
+    ``
+    """
+
+    #status codes of an inverter reducing its power
+    deratingStatus = (11, 12)
+    #status codes of an inverter which is too hot
+    overTemperatureStatus = (10,)
+
+    #robust z-score above which a value is an outlier
+    outlierThreshold = 3.5
+    #efficiency is only computed above this dc power in W
+    minPower = 50.0
+
+    def __init__(self, addresses, cycles=60, fields=FLEET_FIELDS):
+        if numpy is None:
+            raise Exception('FleetBuffer needs numpy')
+
+        self.addresses = numpy.array(sorted(addresses))
+        self.column = {int(a): i for i, a in enumerate(self.addresses)}
+        self.fields = tuple(fields)
+        self.index = {name: i for i, name in enumerate(self.fields)}
+        self.cycles = cycles
+
+        self.values = numpy.full((len(self.fields), cycles, len(self.addresses)), numpy.nan)
+        self.timestamps = numpy.full(cycles, numpy.nan)
+        #row of the latest cycle, -1 before the first
+        self.head = -1
+        self.count = 0
+
+    def startCycle(self, timestamp=None):
+        """
+        start a new cycle, overwriting the oldest one
+        """
+        if timestamp is None:
+            timestamp = time.time()
+        self.head = (self.head + 1) % self.cycles
+        self.count = min(self.count + 1, self.cycles)
+        self.values[:, self.head, :] = numpy.nan
+        self.timestamps[self.head] = timestamp
+
+    def set(self, address, data):
+        """
+        store data of address in the latest cycle: a decoded dict,
+        a readInverterAndParse dict or an InverterReading
+        """
+        if self.head < 0:
+            self.startCycle()
+        column = self.column[address]
+        for name, value in plainValues(data).items():
+            i = self.index.get(name)
+            if i is not None and value is not None:
+                self.values[i, self.head, column] = value
+
+    def addCycle(self, timestamp, readings):
+        """
+        add one cycle, readings: dict address -> data (see set) or None
+        """
+        self.startCycle(timestamp)
+        for address, data in readings.items():
+            if data is not None:
+                self.set(address, data)
+
+    def addPoller(self, poller, timestamp=None):
+        """
+        add one cycle with the latest results of a KacoBusPoller
+        """
+        self.addCycle(timestamp, {a: poller.reading(a) for a in poller.intervals if a in self.column})
+
+    def _rows(self, cycles):
+        """
+        rows of the last cycles, oldest first
+        """
+        cycles = self.count if cycles is None else min(cycles, self.count)
+        return (numpy.arange(self.head - cycles + 1, self.head + 1)) % self.cycles
+
+    def window(self, name, cycles=None):
+        """
+        array cycle x inverter of field name for the last cycles, oldest first
+        """
+        return self.values[self.index[name]][self._rows(cycles)]
+
+    def latest(self, name):
+        """
+        array of the latest value of field name per inverter
+        """
+        return self.values[self.index[name], self.head]
+
+    def efficiency(self, cycles=1):
+        """
+        p_ac / p_dc per inverter over the last cycles,
+        nan while the dc power is below minPower
+        """
+        p_ac = self.window('p_ac', cycles)
+        p_dc = self.window('p_dc', cycles)
+        valid = (p_dc >= self.minPower) & ~numpy.isnan(p_ac)
+        ac = numpy.where(valid, p_ac, 0.0).sum(axis=0)
+        dc = numpy.where(valid, p_dc, 0.0).sum(axis=0)
+        out = numpy.full(len(self.addresses), numpy.nan)
+        numpy.divide(ac, dc, out=out, where=dc > 0)
+        return out
+
+    def outliers(self, name, threshold=None):
+        """
+        True for inverters whose latest value of field name is far from
+        the other inverters: robust z-score from median and median
+        absolute deviation above threshold
+        """
+        if threshold is None:
+            threshold = self.outlierThreshold
+        values = self.latest(name)
+        known = ~numpy.isnan(values)
+        out = numpy.zeros(len(values), dtype=bool)
+        if known.sum() < 3:
+            return out
+        median = numpy.median(values[known])
+        mad = numpy.median(numpy.abs(values[known] - median))
+        if mad == 0:
+            out[known] = values[known] != median
+            return out
+        out[known] = 0.6745 * numpy.abs(values[known] - median) / mad > threshold
+        return out
+
+    def statusIn(self, codes, cycles=1):
+        """
+        True for inverters which had one of the status codes
+        in the last cycles
+        """
+        return numpy.isin(self.window('status', cycles), codes).any(axis=0)
+
+    def check(self, cycles=1):
+        """
+        all fleet checks of the last cycles as dict of arrays per inverter:
+        addresses, efficiency, u_dc_outlier, i_dc_outlier, derating,
+        over_temperature
+        """
+        return {
+            'addresses': self.addresses,
+            'efficiency': self.efficiency(cycles),
+            'u_dc_outlier': self.outliers('u_dc'),
+            'i_dc_outlier': self.outliers('i_dc'),
+            'derating': self.statusIn(self.deratingStatus, cycles),
+            'over_temperature': self.statusIn(self.overTemperatureStatus, cycles),
+        }
@@ -1,8 +1,39 @@
 # -*- coding: utf-8 -*-
 import serial
 import glob
-import json
 import string
+import time
+import logging
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+from .reading import InverterReading, Schema
+from .metrics import Metrics, splitCommand
+from .timing import AdaptiveTimeouts
+from .stream import FrameDecoder
+
+logger = logging.getLogger(__name__)
+
+#metrics which record nothing
+NO_METRICS = Metrics()
+
+#bytes which are dropped from text fields
+NONPRINTABLE = bytes(bytearray(i for i in range(256) if chr(i) not in string.printable))
+
+#bytes split() treats as whitespace, as lookup table for numpy
+if numpy is not None:
+    WHITESPACE = numpy.zeros(256, dtype=bool)
+    WHITESPACE[list(bytearray(b' \t\n\r\x0b\x0c'))] = True
+
+
+def toPrintable(value):
+    """
+    convert bytes of a text field to str, dropping non printable bytes
+    """
+    return value.translate(None, NONPRINTABLE).decode('ascii')
 
 
 class KacoRS485Parser(object):
@@ -98,19 +129,111 @@ der drei Netzphasen ausgefallen ist oder die Spannung außerhalb der Toleranz is
         }
 
 
-    def parse(self,answer,command):
-        #split on any whitespace
-        answer = answer.replace('\r','').replace('\x00','').replace('\n','')
-        l = answer.split()
+    #bytes which end an answer frame
+    terminators = (b'\r', b'\x00')
+
+    #command -> (layout, layout without command echo), see compile
+    layouts = None
+
+    def __init__(self, metrics=None):
+        """
+        metrics: Metrics which get parse failures and missing command echos
+        """
+        self.metrics = metrics or NO_METRICS
+
+    @classmethod
+    def frameEnd(cls, answer, command, start=0, end=None):
+        """
+        find the end of the first complete answer frame in answer
+
+        a frame is complete if a terminator follows a line holding as many
+        fields as the template of the command (or one less, if the inverter
+        left out the command echo)
+
+        answer: bytes or bytearray, e.g. a read buffer
+        start, end: only look for terminators in answer[start:end], to
+            check only the bytes which arrived since the last call
+
+        return index after the terminator or -1 if no frame is complete yet
+        """
+        try:
+            sentCommand = int(command[-3])
+        except (ValueError, IndexError):
+            sentCommand = None
+
+        if sentCommand in cls.mapping:
+            expected = (len(cls.mapping[sentCommand]), len(cls.mapping[sentCommand]) - 1)
+        else:
+            expected = None
+
+        if end is None:
+            end = len(answer)
+
+        pos = start
+        while pos < end:
+            i = -1
+            for terminator in cls.terminators:
+                found = answer.find(terminator, pos, end)
+                if found >= 0 and (i < 0 or found < i):
+                    i = found
+            if i < 0:
+                break
+            lineStart = answer.rfind(b'\n', 0, i) + 1
+            fields = len(answer[lineStart:i].split())
+            if fields > 0 and (expected is None or fields in expected):
+                return i + 1
+            pos = i + 1
+
+        return -1
+
+    @classmethod
+    def compile(cls):
+        """
+        compile the field layout of every command in mapping into tuples
+        of (name, converter)
+
+        call again after changing mapping
+        """
+        layouts = {}
+        for command, template in cls.mapping.items():
+            layout = tuple((template[i]['name'], template[i].get('convert_to', toPrintable))
+                           for i in sorted(template))
+            layouts[command] = (layout, layout[1:])
+        cls.layouts = layouts
+        return layouts
+
+    @classmethod
+    def compiled(cls):
+        """
+        layouts of this class, compiled on first use; a subclass with
+        another mapping does not get the layouts of its base class
+        """
+        layouts = cls.__dict__.get('layouts')
+        return layouts if layouts is not None else cls.compile()
+
+    def decode(self,answer,command):
+        """
+        decode an answer into a dict field name -> value
+
+        answer: bytes or bytearray (or str) as read from the serial port
+        command: the command sent, e.g. '#010\\r\\n'
+        """
+        if isinstance(answer, str):
+            answer = answer.encode('latin-1', 'ignore')
+        elif isinstance(answer, memoryview):
+            answer = answer.tobytes()
+
+        #drop line ends, then split on any whitespace
+        l = answer.translate(None, b'\r\x00\n').split()
 
-        #parse first field
         sentCommand = int(command[-3])
 
-        if not sentCommand in self.mapping:
+        layouts = self.compiled()
+        if not sentCommand in layouts:
+            self.metrics.parseFailure(*splitCommand(command))
             raise Exception('unknown command "{}" to parse in {:s}'.format(sentCommand, repr(answer)))
 
-        # fix: copy if we remove an item
-        mymap = self.mapping[sentCommand].copy()
+        layout, short = layouts[sentCommand]
 
         if len(l) == 1 and sentCommand == 3:
             #some inverters do not have a command 3
@@ -119,35 +242,232 @@ der drei Netzphasen ausgefallen ist oder die Spannung außerhalb der Toleranz is
             return {}
 
         # if one less long, assume command is missing:
-        if len(l) == (len(mymap) -1):
-            # remove last command sent
-            print("assume command_sent is missing in answer")
-            del mymap[0]
-            # rearrange keys, lower each key by one
-            mymap = {(key-1): mymap[key] for key in mymap}
-
-        if len(l) != len(mymap):
-            print("input",l,"len",len(l))
-            print("map",mymap,"len",len(mymap))
-            raise Exception('length of answer and template not the same: {:s}'.format(repr(answer)))
+        if len(l) == len(short):
+            logger.debug("assume command_sent is missing in answer %r", answer)
+            self.metrics.commandEchoMissing(*splitCommand(command))
+            layout = short
+
+        if len(l) != len(layout):
+            recovered = self.recover(answer, command)
+            if recovered is not None:
+                return recovered
+            self.metrics.parseFailure(*splitCommand(command))
+            raise Exception('length of answer and template not the same ({} != {}): {:s}'.format(
+                len(l), len(layout), repr(answer)))
+
+        try:
+            return {name: convert(value) for (name, convert), value in zip(layout, l)}
+        except ValueError:
+            recovered = self.recover(answer, command)
+            if recovered is not None:
+                return recovered
+            self.metrics.parseFailure(*splitCommand(command))
+            raise
+
+    def frameDecoder(self, verifyChecksum=True):
+        """
+        FrameDecoder for a continuous byte stream with the layouts of mapping
+        """
+        return FrameDecoder(self.compiled(), verifyChecksum=verifyChecksum)
 
-        ret = {}
-        for i,value in enumerate(l):
-            if 'convert_to' in mymap[i]:
-                value = mymap[i]['convert_to'](value)
+    def recover(self, answer, command):
+        """
+        look for a valid frame answering command in a garbled answer,
+        e.g. behind noise with spaces or with a checksum byte which
+        looks like whitespace
+
+        return dict field name -> value or None
+        """
+        address, sentCommand = splitCommand(command)
+        decoder = self.frameDecoder()
+        decoder.expect(address, sentCommand)
+        for frameAddress, frameCommand, data in reversed(decoder.feed(answer)):
+            if frameCommand == sentCommand and (address is None or frameAddress == address):
+                logger.debug("recovered frame from answer %r", answer)
+                return data
+        return None
+
+    @classmethod
+    def schema(cls):
+        """
+        field metadata of mapping as Schema
+        """
+        return Schema(cls.mapping)
+
+    def parseReading(self,answers,inverterNumber,timestamp=None):
+        """
+        parse dict command -> answer of one inverter into an InverterReading
+
+        raise an exception if all answers are empty
+        """
+        decoded = [self.decode(answers[k],k) for k in answers if len(answers[k]) > 0]
+        if not decoded:
+            raise Exception('Could not get an answer from the inverter number {}; Answer: {:s}'.format(inverterNumber, repr(answers)))
+
+        if timestamp is None:
+            timestamp = time.time()
 
+        return InverterReading.fromDecoded(inverterNumber, timestamp, *decoded)
+
+    def parse_many(self,frames,command):
+        """
+        decode many answers to the same command at once (needs numpy)
+
+        frames: iterable of answers as bytes, or one bytes buffer
+            holding one answer per line
+        command: the command sent (0, 3 or e.g. '#010\\r\\n')
+
+        return dict field name -> numpy array for every numeric field
+        of the command and 'valid' -> boolean array, False for answers
+        which could not be decoded (their values are nan or 0)
+        """
+        if numpy is None:
+            raise Exception('parse_many needs numpy')
+
+        if isinstance(frames, (bytes, bytearray, memoryview)):
+            frames = bytes(frames).split(b'\n')
+            if frames[-1] == b'':
+                del frames[-1]
+
+        sentCommand = command if isinstance(command, int) else int(command[-3])
+
+        layouts = self.compiled()
+        if not sentCommand in layouts:
+            raise Exception('unknown command "{}" to parse'.format(sentCommand))
+        layout, short = layouts[sentCommand]
+
+        #one answer per line, whitespace split like in decode
+        originals = frames
+        frames = [bytes(f).translate(None, b'\r\x00\n') for f in frames]
+        nrows = len(frames)
+        buf = numpy.frombuffer(b'\n'.join(frames) or b'\n', dtype=numpy.uint8)
+
+        #start and end of every token
+        space = numpy.concatenate(([True], WHITESPACE[buf], [True])).view(numpy.int8)
+        edges = numpy.diff(space)
+        starts = numpy.flatnonzero(edges == -1)
+        ends = numpy.flatnonzero(edges == 1)
+
+        #tokens per answer and index of the first token of every answer
+        rowOfToken = numpy.searchsorted(numpy.flatnonzero(buf == ord('\n')), starts)
+        counts = numpy.bincount(rowOfToken, minlength=nrows)[:nrows]
+        offsets = numpy.cumsum(counts) - counts
+
+        full = counts == len(layout)
+        valid = full | (counts == len(short))
+        #answers without command echo start one token earlier
+        first = offsets[valid] - (~full[valid])
+
+        columns = {}
+        for i, (name, convert) in enumerate(layout):
+            if convert not in (int, float):
+                continue
+            sel = first + i
+            columns[name] = self._tokensToFloat(buf, starts[sel], ends[sel], convert is int)
+
+        #answers with a broken number are not valid at all
+        good = numpy.ones(len(first), dtype=bool)
+        for column in columns.values():
+            good &= ~numpy.isnan(column)
+        valid[valid] = good
+
+        ret = {}
+        for name, convert in layout:
+            if name not in columns:
+                continue
+            if convert is int:
+                out = numpy.zeros(nrows, dtype=numpy.int64)
+            else:
+                out = numpy.full(nrows, numpy.nan)
+            out[valid] = columns[name][good]
+            ret[name] = out
+
+        #the rest goes through decode, which finds a frame by position
+        #if e.g. the checksum byte looks like whitespace
+        cmd = command if not isinstance(command, int) else '#..{}\r\n'.format(command)
+        for row in numpy.flatnonzero(~valid):
             try:
-                json.dumps(value)
+                decoded = self.decode(originals[row], cmd)
             except Exception:
-                value = self.convert_to_printable(value)
+                continue
+            if not decoded:
+                continue
+            for name in ret:
+                ret[name][row] = decoded[name]
+            valid[row] = True
+
+        ret['valid'] = valid
+        return ret
+
+    @staticmethod
+    def _tokensToFloat(buf, starts, ends, integer=False):
+        """
+        convert the tokens buf[starts[i]:ends[i]] to floats, nan if not a
+        number (or with integer, not a number int() takes)
+        """
+        lengths = ends - starts
+        width = int(lengths.max()) if len(lengths) else 1
+        #gather tokens into a fixed width byte matrix, zero padded
+        padded = numpy.concatenate((buf, numpy.zeros(width, dtype=numpy.uint8)))
+        matrix = padded[starts[:, None] + numpy.arange(width)]
+        matrix[numpy.arange(width)[None, :] >= lengths[:, None]] = 0
+        tokens = matrix.view('S{}'.format(width)).ravel()
+
+        convert = int if integer else float
+        try:
+            if integer and not numpy.char.isdigit(tokens).all():
+                raise ValueError()
+            return tokens.astype(numpy.float64)
+        except ValueError:
+            out = numpy.full(len(tokens), numpy.nan)
+            for j, token in enumerate(tokens):
+                try:
+                    out[j] = convert(token)
+                except ValueError:
+                    pass
+            return out
+
+    def parse(self,answer,command):
+        """
+        parse an answer into a dict index -> field template with 'value'
+        """
+        decoded = self.decode(answer, command)
+
+        template = self.mapping[int(command[-3])]
+        byName = {template[i]['name']: template[i] for i in template}
 
-            ret[i] = mymap[i]
-            ret[i]['value'] = value
+        ret = {}
+        for i, name in enumerate(decoded):
+            #copy, the template is shared by all answers
+            ret[i] = dict(byName[name])
+            ret[i]['value'] = decoded[name]
 
         return ret
 
+    def parseAnswers(self,answers,inverterNumber):
+        """
+        parse dict command -> answer of one inverter
+        and merge all fields into one dict keyed by field name
+        """
+        parsed = []
+        for k in answers:
+            item = answers[k]
+            if len(item) == 0:
+                continue
+            parsed.append(self.parse(item,k))
+
+        #all answers could be empty, what should we do?
+        #we could also silently answer an empty dict
+        #but we prefer to raise an exception
+        if len(parsed) <= 0:
+            raise Exception('Could not get an answer from the inverter number {}; Answer: {:s}'.format(inverterNumber, repr(answers)))
+
+        #important, set input to empty dict
+        #otherwise, we will reuse input from last function call
+        return self.listDictNameToKey(parsed,{})
+
     def convert_to_printable(self, value):
-        return filter(lambda x: x in self.printable, value)
+        return ''.join(filter(lambda x: x in self.printable, value))
 
     def listDictNameToKey(self,l,out={}):
         for i in l:
@@ -173,28 +493,42 @@ class KacoRS485(object):
         * reading current values
     """
 
+    #maximum time in seconds to wait for a complete answer
     waitBeforeRead = 0.7
 
-    def port_from_wildcard(self, port):
-        port = glob.glob(port)
-        if not port:
-            raise Exception('could not find a valid rs485 port')
-        return port[0]
+    #time in seconds between two looks at the serial input buffer
+    pollInterval = 0.005
 
-    def __init__(self,serialPort):
+    #initial size of the read buffer in bytes
+    bufferSize = 256
+
+    #commands sent to read all available data
+    sendCommands = [0,3]
+
+    @staticmethod
+    def ports_from_wildcard(port):
         """
-        initalize which serial port we should use
+        return all ports matching port, sorted by name
+        """
+        ports = sorted(glob.glob(port))
+        if not ports:
+            raise Exception('could not find a valid rs485 port')
+        return ports
 
-        example
-        ``
-        kaco = KacoRS485('/dev/ttyUSB0')
-        ``
+    @classmethod
+    def port_from_wildcard(cls, port):
+        return cls.ports_from_wildcard(port)[0]
+
+    @classmethod
+    def openSerial(cls,serialPort):
+        """
+        open serialPort (may contain a wildcard) with the settings
+        of the kaco rs485 interface
         """
         if '*' in serialPort:
-            serialPort = self.port_from_wildcard(serialPort)
+            serialPort = cls.port_from_wildcard(serialPort)
 
-        #create and open serial port
-        self.ser = serial.Serial(
+        return serial.Serial(
             port=serialPort,
             baudrate=9600,
             parity=serial.PARITY_NONE,
@@ -203,81 +537,204 @@ class KacoRS485(object):
             timeout=0.5
         )
 
+    #CaptureWriter which records every answer, None to not record
+    capture = None
+
+    #Metrics which get latencies, timeouts and parse failures
+    metrics = NO_METRICS
+
+    def __init__(self,serialPort):
+        """
+        initalize which serial port we should use
+
+        serialPort: name of the port or an already open serial-like
+        object, e.g. a ReplaySerial
+
+        example
+        ``
+        kaco = KacoRS485('/dev/ttyUSB0')
+        ``
+        """
+        if isinstance(serialPort, str):
+            #create and open serial port
+            self.ser = self.openSerial(serialPort)
+        else:
+            self.ser = serialPort
+
+        #deadlines learned per inverter, None to always wait waitBeforeRead
+        self.timeouts = AdaptiveTimeouts()
+
+        #CommandCache which answers commands without the bus, None to always ask
+        self.cache = None
+
+        #answers are read into this buffer, it grows if an answer is longer
+        self.buffer = bytearray(self.bufferSize)
+
     def close(self):
         """
         close serial connection
         """
         self.ser.close()
 
+    @staticmethod
+    def formatCommand(inverterNumber,command):
+        """
+        return the string to send for command to inverter inverterNumber
+        """
+        return '#{:02d}{:01d}\r\n'.format(inverterNumber,command)
+
     def readInverter(self,inverterNumber):
         """
         read all available data from inverter inverterNumber
 
+        answers of commands held by cache are not read again
+
         inverterNumber: can be between 0 and 32
         """
+        return self._readInverter(inverterNumber)[0]
+
+    def _readInverter(self,inverterNumber):
+        """
+        return tuple (dict command -> answer, list of the commands
+        answered from cache); cached answers come first, so fresh
+        values win when the answers are merged
+        """
 
-        answers = {}
+        cached = {}
+        fresh = {}
+        cachedCommands = []
 
-        sendCommands = [0,3]
-        commands = []
-        for s in sendCommands:
-            commands.append('#{:02d}{:01d}\r\n'.format(inverterNumber,s))
+        for i, s in enumerate(self.sendCommands):
+            cmd = self.formatCommand(inverterNumber,s)
 
-        for cmd in commands:
-            answers[cmd] = self.sendCmdAndRead(cmd)
+            if self.cache is not None:
+                answer = self.cache.get(inverterNumber,s)
+                if answer is not None:
+                    cached[cmd] = answer
+                    cachedCommands.append(s)
+                    continue
 
-        return answers
+            fresh[cmd] = self.sendCmdAndRead(cmd)
+            if len(fresh[cmd]) == 0 and i == 0:
+                #asleep or not there, do not wait for the other commands
+                break
+
+            if self.cache is not None:
+                self.cache.put(inverterNumber,s,fresh[cmd])
+
+        answers = cached
+        answers.update(fresh)
+        return answers, cachedCommands
 
     def readInverterAndParse(self,inverterNumber):
-        answers = self.readInverter(inverterNumber)
+        answers, cachedCommands = self._readInverter(inverterNumber)
 
-        P = KacoRS485Parser()
+        logger.debug("answers %r", answers)
 
-        print("answers",answers)
+        out = KacoRS485Parser(self.metrics).parseAnswers(answers,inverterNumber)
 
-        parsed = []
-        for k in answers:
-            item = answers[k]
-            if len(item) == 0:
-                continue
-            parsed.append(P.parse(item,k))
+        #fields of cached commands tell how old they are,
+        #unless a fresh answer holds the same field
+        freshNames = set()
+        for s in self.sendCommands:
+            if s not in cachedCommands and len(answers.get(self.formatCommand(inverterNumber,s), b'')) > 0:
+                freshNames.update(item['name'] for item in KacoRS485Parser.mapping.get(s, {}).values())
+        for command in cachedCommands:
+            age = self.cache.age(inverterNumber,command)
+            for item in KacoRS485Parser.mapping.get(command, {}).values():
+                if age is not None and item['name'] in out and item['name'] not in freshNames:
+                    out[item['name']]['age'] = age
 
-        #all answers could be empty, what should we do?
-        #we could also silently answer an empty dict
-        #but we prefer to raise an exception
-        if len(parsed) <= 0:
-            raise Exception('Could not get an answer from the inverter number {}; Answer: {:s}'.format(inverterNumber, repr(answers)))
+        return out
 
-        #important, set input to empty dict
-        #otherwise, we will reuse input from last function call
-        return P.listDictNameToKey(parsed,{})
+    def readReading(self,inverterNumber):
+        """
+        read all available data from inverter inverterNumber
+        and return it as InverterReading
+        """
+        timestamp = time.time()
+        answers = self.readInverter(inverterNumber)
 
+        return KacoRS485Parser(self.metrics).parseReading(answers,inverterNumber,timestamp)
 
-    def sendCmdAndRead(self,cmd):
-        import time
+    def sendCmdAndRead(self,cmd,timeout=None):
         """
         send command on rs485 and read answer
 
-        return list of answered lines
-        if no answer after waiting time, return empty list
+        returns as soon as a complete answer frame arrived or after
+        timeout seconds have passed; the default is the deadline learned
+        by timeouts for the inverter, at most waitBeforeRead
+
+        return answered bytes
+        if no answer until the deadline, return empty bytes
         """
+        address, command = splitCommand(cmd)
+        timeouts = self.timeouts if address is not None else None
+
+        if timeout is None:
+            if timeouts is not None:
+                timeout = timeouts.deadline(address, command, self.waitBeforeRead)
+            else:
+                timeout = self.waitBeforeRead
+
+        #drop leftovers of earlier answers
+        self.ser.reset_input_buffer()
 
         #can only send bytearrays
         bytearr = cmd.encode()
         self.ser.write(bytearr)
 
-        print("send to rs485",bytearr)
-
-        #wait some time to let device answer
-        time.sleep(self.waitBeforeRead)
-
-        #read answer
-        #while ser.inWaiting() > 0:
-        #    out += ser.read(1)
-
-        #read answer line
-        answer = []
-        while self.ser.inWaiting() > 0:
-            answer.append(self.ser.readline())
-
-        return ''.join(answer)
+        logger.debug("send to rs485 %r", bytearr)
+
+        metrics = self.metrics
+        metrics.commandSent(address, command)
+
+        sent = time.monotonic()
+        deadline = sent + timeout
+
+        #read straight into the reused buffer, only the answer is copied out
+        buf = self.buffer
+        view = memoryview(buf)
+        length = 0
+        complete = False
+        try:
+            while True:
+                waiting = self.ser.inWaiting()
+                if waiting > 0:
+                    if length == 0:
+                        metrics.firstByte(address, command, time.monotonic() - sent)
+                    if length + waiting > len(buf):
+                        #move to a larger buffer, an exported bytearray can not grow
+                        bigger = bytearray(max(2 * len(buf), length + waiting))
+                        bigger[:length] = view[:length]
+                        view.release()
+                        buf = self.buffer = bigger
+                        view = memoryview(buf)
+                    got = self.ser.readinto(view[length:length + waiting]) or 0
+                    if KacoRS485Parser.frameEnd(buf, cmd, length, length + got) >= 0:
+                        length += got
+                        complete = True
+                        break
+                    length += got
+                if time.monotonic() >= deadline:
+                    break
+                if waiting == 0:
+                    time.sleep(self.pollInterval)
+            answer = view[:length].tobytes()
+        finally:
+            view.release()
+
+        elapsed = time.monotonic() - sent
+        if complete:
+            metrics.frameComplete(address, command, elapsed, len(answer))
+            if timeouts is not None:
+                timeouts.answered(address, command, elapsed)
+        else:
+            metrics.timeout(address, command, len(answer))
+            if timeouts is not None:
+                timeouts.incomplete(address, command, elapsed, len(answer))
+
+        if self.capture is not None:
+            self.capture.write(self.ser.port, cmd, answer, time.monotonic() - sent)
+
+        return answer
@@ -0,0 +1,194 @@
+# -*- coding: utf-8 -*-
+import threading
+
+
+def splitCommand(cmd):
+    """
+    return (address, command) of a command like '#010\\r\\n',
+    None for parts which can not be read
+    """
+    cmd = cmd.strip()
+    try:
+        address = int(cmd[1:3])
+    except ValueError:
+        address = None
+    try:
+        command = int(cmd[3:4])
+    except ValueError:
+        command = None
+    return address, command
+
+
+class Metrics(object):
+    """
+    hooks called by KacoRS485 and KacoRS485Parser, all do nothing
+
+    subclass and set kaco.metrics to record them
+    """
+
+    def commandSent(self, address, command):
+        pass
+
+    def firstByte(self, address, command, seconds):
+        """
+        first byte of the answer arrived seconds after sending
+        """
+        pass
+
+    def frameComplete(self, address, command, seconds, nbytes):
+        """
+        complete answer of nbytes arrived seconds after sending
+        """
+        pass
+
+    def timeout(self, address, command, nbytes):
+        """
+        no complete answer until the deadline, nbytes arrived
+        """
+        pass
+
+    def parseFailure(self, address, command):
+        pass
+
+    def commandEchoMissing(self, address, command):
+        """
+        the parser assumed the answer left out the command echo
+        """
+        pass
+
+    def busError(self, port):
+        """
+        reading from port failed, the port is opened again
+        """
+        pass
+
+
+class Histogram(object):
+    """
+    cumulative histogram with fixed bucket bounds
+    """
+
+    def __init__(self, bounds):
+        self.bounds = tuple(bounds)
+        self.counts = [0] * (len(self.bounds) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        i = 0
+        while i < len(self.bounds) and value > self.bounds[i]:
+            i += 1
+        self.counts[i] += 1
+        self.sum += value
+        self.count += 1
+
+    def cumulative(self):
+        """
+        list of (upper bound, count of values <= bound), last bound is '+Inf'
+        """
+        out = []
+        total = 0
+        for bound, count in zip(self.bounds + ('+Inf',), self.counts):
+            total += count
+            out.append((bound, total))
+        return out
+
+
+class BusMetrics(Metrics):
+    """
+    counters and latency histograms per inverter address,
+    exported in the prometheus text format
+
+    example
+    ``
+    metrics = BusMetrics()
+    kaco.metrics = metrics
+    ...
+    print(metrics.prometheus())
+    ``
+    """
+
+    #bucket bounds in seconds
+    latencyBounds = (0.01, 0.025, 0.05, 0.1, 0.2, 0.3, 0.5, 0.75, 1.0, 2.0)
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        #name -> (address, command) -> value
+        self.counters = {}
+        #name -> address -> Histogram
+        self.histograms = {}
+        #port -> failures of the bus
+        self.busErrors = {}
+
+    def _count(self, name, address, command, value=1):
+        with self.lock:
+            counter = self.counters.setdefault(name, {})
+            counter[(address, command)] = counter.get((address, command), 0) + value
+
+    def _observe(self, name, address, value):
+        with self.lock:
+            histograms = self.histograms.setdefault(name, {})
+            if address not in histograms:
+                histograms[address] = Histogram(self.latencyBounds)
+            histograms[address].observe(value)
+
+    def counter(self, name, address=None, command=None):
+        """
+        value of a counter, summed over all addresses and commands
+        which are None
+        """
+        with self.lock:
+            return sum(v for (a, c), v in self.counters.get(name, {}).items()
+                       if (address is None or a == address) and (command is None or c == command))
+
+    def histogram(self, name, address):
+        return self.histograms.get(name, {}).get(address)
+
+    def commandSent(self, address, command):
+        self._count('commands', address, command)
+
+    def firstByte(self, address, command, seconds):
+        self._observe('first_byte_seconds', address, seconds)
+
+    def frameComplete(self, address, command, seconds, nbytes):
+        self._observe('frame_seconds', address, seconds)
+        self._count('bytes_read', address, command, nbytes)
+
+    def timeout(self, address, command, nbytes):
+        self._count('timeouts', address, command)
+        self._count('bytes_read', address, command, nbytes)
+
+    def parseFailure(self, address, command):
+        self._count('parse_failures', address, command)
+
+    def commandEchoMissing(self, address, command):
+        self._count('command_echo_missing', address, command)
+
+    def busError(self, port):
+        with self.lock:
+            self.busErrors[port] = self.busErrors.get(port, 0) + 1
+
+    def prometheus(self, prefix='kacors485_'):
+        """
+        all metrics in the prometheus text exposition format
+        """
+        lines = []
+        with self.lock:
+            for name in sorted(self.counters):
+                lines.append('# TYPE {}{}_total counter'.format(prefix, name))
+                for (address, command), value in sorted(self.counters[name].items(), key=str):
+                    lines.append('{}{}_total{{address="{}",command="{}"}} {}'.format(
+                        prefix, name, address, command, value))
+            for name in sorted(self.histograms):
+                lines.append('# TYPE {}{} histogram'.format(prefix, name))
+                for address, histogram in sorted(self.histograms[name].items(), key=str):
+                    for bound, count in histogram.cumulative():
+                        lines.append('{}{}_bucket{{address="{}",le="{}"}} {}'.format(
+                            prefix, name, address, bound, count))
+                    lines.append('{}{}_sum{{address="{}"}} {}'.format(prefix, name, address, histogram.sum))
+                    lines.append('{}{}_count{{address="{}"}} {}'.format(prefix, name, address, histogram.count))
+            if self.busErrors:
+                lines.append('# TYPE {}bus_errors_total counter'.format(prefix))
+                for port, value in sorted(self.busErrors.items()):
+                    lines.append('{}bus_errors_total{{port="{}"}} {}'.format(prefix, port, value))
+        return '\n'.join(lines) + '\n'
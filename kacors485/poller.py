@@ -0,0 +1,361 @@
+# -*- coding: utf-8 -*-
+import heapq
+import time
+
+from .kacors485 import KacoRS485, KacoRS485Parser
+from .reading import InverterReading
+from .delta import DeltaFilter
+
+AWAKE = 'awake'
+SLEEPING = 'sleeping'
+UNREACHABLE = 'unreachable'
+
+
+class KacoBusPoller(object):
+    """
+    poll many inverters on one rs485 bus
+
+    the bus is half duplex, so all commands are queued by their due time
+    and sent back-to-back; the poller only waits if nothing is due
+
+    example
+    ``
+    kaco = KacoRS485('/dev/ttyUSB0')
+    poller = KacoBusPoller(kaco, [1, 2, 3], intervals={0: 10, 3: 60})
+    for address, command, data in poller.poll():
+        print(address, command, data)
+    ``
+    """
+
+    #default seconds between two polls of the same command
+    defaultIntervals = {0: 10, 3: 60}
+
+    minAddress = 1
+    maxAddress = 32
+
+    #status codes of an inverter going to sleep
+    sleepStatus = (15,)
+    #empty answers in a row until an inverter counts as unreachable
+    missLimit = 2
+    #longest time in seconds between two probes of a sleeping inverter
+    maxBackoff = 600
+
+    def __init__(self, kaco, addresses, intervals=None, clock=time.monotonic, sleep=time.sleep,
+                 timestamp=time.time, scanner=None):
+        """
+        kaco: open KacoRS485 instance which owns the bus
+        addresses: list of inverter addresses (1 to 32)
+        intervals: dict command -> seconds for all addresses
+            or dict address -> (dict command -> seconds) per address
+        clock, sleep: monotonic clock and sleep used for scheduling
+        timestamp: wall clock used to stamp results
+        scanner: BusScanner which probes other addresses while the bus
+            is idle, inverters it finds are polled from then on; all
+            inverters which answer are kept in its address map
+        """
+        self.kaco = kaco
+        self.parser = KacoRS485Parser(getattr(kaco, 'metrics', None))
+        self.clock = clock
+        self.sleep = sleep
+        self.timestamp = timestamp
+        self.scanner = scanner
+        self._intervalSettings = intervals
+
+        self.intervals = {}
+        for address in addresses:
+            self._checkAddress(address)
+            self.intervals[address] = self._intervalsFor(address, intervals)
+
+        #(address, command) -> (timestamp, decoded dict)
+        self.results = {}
+        #(address, command) -> timestamp of last answer
+        self.lastAnswer = {}
+        #(address, command) -> number of commands without usable answer
+        self.failures = {}
+
+        #address -> AWAKE, SLEEPING or UNREACHABLE
+        self.states = {address: AWAKE for address in self.intervals}
+        #address -> seconds between probes while not awake
+        self.backoff = {address: None for address in self.intervals}
+        #address -> empty answers in a row
+        self.misses = {}
+        self._parked = {}
+
+        self.cycleTime = None
+        self.busyTime = 0.0
+        self.started = self.clock()
+
+        self._queue = []
+        self._seq = 0
+        for address in sorted(self.intervals):
+            for command in sorted(self.intervals[address]):
+                self._schedule(self.started, address, command)
+
+        self._cycleStart = self.started
+        self._cyclePending = self._cycleTasks()
+
+    def _checkAddress(self, address):
+        if not self.minAddress <= address <= self.maxAddress:
+            raise Exception('inverter address {} not between {} and {}'.format(
+                address, self.minAddress, self.maxAddress))
+
+    def addAddress(self, address):
+        """
+        start polling address with the intervals given to the poller
+        """
+        if address in self.intervals:
+            return
+        self._checkAddress(address)
+        self.intervals[address] = self._intervalsFor(address, self._intervalSettings)
+        self.states[address] = AWAKE
+        self.backoff[address] = None
+        now = self.clock()
+        for command in sorted(self.intervals[address]):
+            self._schedule(now, address, command)
+            self._cyclePending.add((address, command))
+
+    def _intervalsFor(self, address, intervals):
+        if intervals is None:
+            return dict(self.defaultIntervals)
+        if address in intervals and isinstance(intervals[address], dict):
+            return dict(intervals[address])
+        perCommand = {k: v for k, v in intervals.items() if not isinstance(v, dict)}
+        return perCommand or dict(self.defaultIntervals)
+
+    def _schedule(self, due, address, command):
+        self._seq += 1
+        heapq.heappush(self._queue, (due, self._seq, address, command))
+
+    def tasks(self):
+        """
+        list of all scheduled (address, command) pairs
+        """
+        return [(a, c) for a in self.intervals for c in self.intervals[a]]
+
+    def _cycleTasks(self):
+        """
+        set of the (address, command) pairs of one cycle,
+        without the commands parked while an inverter is not awake
+        """
+        return set((a, c) for a, c in self.tasks()
+                   if self.states[a] == AWAKE or c == self._probeCommand(a))
+
+    def execute(self, address, command):
+        """
+        send one command and decode the answer
+
+        return tuple (raw answer, dict field name -> value or None if
+        the answer could not be decoded)
+        """
+        cmd = KacoRS485.formatCommand(address, command)
+        answer = self.kaco.sendCmdAndRead(cmd)
+        if len(answer) == 0:
+            return answer, None
+
+        try:
+            return answer, self.parser.decode(answer, cmd)
+        except Exception:
+            return answer, None
+
+    def _probeCommand(self, address):
+        return 0 if 0 in self.intervals[address] else min(self.intervals[address])
+
+    def _updateState(self, address, command, answer, data):
+        """
+        move address between awake, sleeping and unreachable
+
+        return seconds until the next probe if address is not awake
+        """
+        if data is None:
+            #an empty answer or garbage which can not be framed, which
+            #is what some inverters send while asleep
+            if command != self._probeCommand(address):
+                #some inverters do not have a command 3
+                return None
+            self.misses[address] = self.misses.get(address, 0) + 1
+            if self.misses[address] < self.missLimit and self.states[address] == AWAKE:
+                return None
+            state = UNREACHABLE if self.states[address] != SLEEPING else SLEEPING
+        elif data is not None and data.get('status') in self.sleepStatus:
+            self.misses[address] = 0
+            state = SLEEPING
+        else:
+            self.misses[address] = 0
+            if self.states[address] != AWAKE:
+                self.states[address] = AWAKE
+                self.backoff[address] = None
+                #resume the commands parked while asleep
+                now = self.clock()
+                for c in self._parked.pop(address, []):
+                    self._schedule(now, address, c)
+                    self._cyclePending.add((address, c))
+            return None
+
+        if self.states[address] == AWAKE or self.backoff[address] is None:
+            self.backoff[address] = self.intervals[address][command]
+        else:
+            self.backoff[address] = min(self.backoff[address] * 2, self.maxBackoff)
+        self.states[address] = state
+        return self.backoff[address]
+
+    def step(self):
+        """
+        run the next due command, waiting until it is due if necessary
+
+        commands to inverters which sleep or do not answer are parked,
+        only the probe command (0) is sent with growing intervals. Without
+        any address to poll the scanner probes for inverters
+
+        return tuple (address, command, decoded dict or None)
+        """
+        while True:
+            if not self._queue:
+                self._waitForInverter()
+                continue
+            due, _, address, command = heapq.heappop(self._queue)
+            if self.states[address] == AWAKE or command == self._probeCommand(address):
+                break
+            self._parked.setdefault(address, []).append(command)
+            self._cyclePending.discard((address, command))
+
+        now = self.clock()
+        #use idle time to look for new inverters
+        try:
+            while self.scanner is not None and due - now > self.scanner.probeTimeout:
+                probed = self.scanner.probeNext(self.intervals)
+                if probed is None:
+                    break
+                if probed[1] is not None:
+                    self.addAddress(probed[0])
+                now = self.clock()
+        except Exception:
+            #the popped command is still due
+            self._schedule(due, address, command)
+            raise
+        if due > now:
+            self.sleep(due - now)
+
+        start = self.clock()
+        try:
+            answer, data = self.execute(address, command)
+        except Exception:
+            #send it again once the bus works
+            self._schedule(due, address, command)
+            raise
+        now = self.clock()
+        self.busyTime += now - start
+
+        key = (address, command)
+        if data is None:
+            self.failures[key] = self.failures.get(key, 0) + 1
+        else:
+            self.failures[key] = 0
+            self.lastAnswer[key] = now
+            self.results[key] = (self.timestamp(), data)
+            if self.scanner is not None and address not in self.scanner.addressMap.inverters:
+                #also keep addresses which were given, not found
+                self.scanner.record(address, data.get('type'), now - start)
+
+        backoff = self._updateState(address, command, answer, data)
+        if backoff is not None:
+            self._schedule(now + backoff, address, command)
+        else:
+            #keep the rhythm, but do not burst to catch up missed slots
+            self._schedule(max(due + self.intervals[address][command], now), address, command)
+
+        self._cyclePending.discard(key)
+        if not self._cyclePending:
+            self.cycleTime = now - self._cycleStart
+            self._cycleStart = now
+            self._cyclePending = self._cycleTasks()
+
+        return address, command, data
+
+    def _waitForInverter(self):
+        #no address to poll: probe the next address or sleep until one is due
+        if self.scanner is None:
+            raise Exception('no inverter address to poll')
+        probed = self.scanner.probeNext(self.intervals)
+        if probed is None:
+            nextProbe = self.scanner.nextProbe(self.intervals)
+            if nextProbe is None:
+                raise Exception('no inverter address to poll or probe')
+            self.sleep(max(nextProbe - self.clock(), 0))
+        elif probed[1] is not None:
+            self.addAddress(probed[0])
+
+    def poll(self, duration=None):
+        """
+        generator which runs step forever or for duration seconds
+        and yields its results
+        """
+        end = None if duration is None else self.clock() + duration
+        while end is None or self.clock() < end:
+            yield self.step()
+
+    def deltas(self, deltaFilter=None, duration=None):
+        """
+        generator like poll, but only yields fields which changed
+
+        deltaFilter: DeltaFilter with deadbands and snapshot interval
+
+        yields tuple (address, timestamp, dict of changed fields,
+        True for a full snapshot)
+        """
+        if deltaFilter is None:
+            deltaFilter = DeltaFilter()
+        for address, command, data in self.poll(duration):
+            if data is None:
+                continue
+            timestamp = self.results[(address, command)][0]
+            out = deltaFilter.update(address, timestamp, data)
+            if out is not None:
+                yield address, timestamp, out[0], out[1]
+
+    def staleness(self, address, command=None):
+        """
+        seconds since the last answer of address for command
+        or for the oldest of its commands if command is None
+
+        return None if there was no answer yet
+        """
+        commands = self.intervals[address] if command is None else [command]
+        now = self.clock()
+        ages = []
+        for c in commands:
+            if (address, c) not in self.lastAnswer:
+                return None
+            ages.append(now - self.lastAnswer[(address, c)])
+        return max(ages)
+
+    def stalenessAll(self):
+        """
+        dict address -> staleness of its oldest command
+        """
+        return {address: self.staleness(address) for address in self.intervals}
+
+    def utilisation(self):
+        """
+        fraction of time since start the bus was busy
+        """
+        elapsed = self.clock() - self.started
+        if elapsed <= 0:
+            return 0.0
+        return self.busyTime / elapsed
+
+    def reading(self, address):
+        """
+        merge the latest results of all commands of address
+        into one InverterReading stamped with the newest result;
+        a field in several commands (e_day) takes the newest value
+
+        return None if there was no answer yet
+        """
+        results = [self.results[(address, c)] for c in sorted(self.intervals[address])
+                   if (address, c) in self.results]
+        if not results:
+            return None
+        #oldest first, newer results overwrite it
+        results.sort(key=lambda r: r[0])
+        timestamp = results[-1][0]
+        return InverterReading.fromDecoded(address, timestamp, *[r[1] for r in results])
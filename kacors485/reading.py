@@ -0,0 +1,141 @@
+# -*- coding: utf-8 -*-
+import array
+import math
+from collections import namedtuple
+
+
+#all fields of command 0 and 3 except the command echo
+READING_FIELDS = (
+    'address', 'timestamp',
+    #command 0
+    'status', 'u_dc', 'i_dc', 'p_dc', 'u_ac', 'i_ac', 'p_ac', 'temp', 'e_day',
+    'checksum', 'type',
+    #command 3
+    'p_top', 'no_idea', 'e_all', 'run_today', 'run_all', 'run_all_again',
+)
+
+
+class InverterReading(namedtuple('InverterReading', READING_FIELDS, defaults=(None,) * len(READING_FIELDS))):
+    """
+    values read from one inverter at one time
+
+    fields which were not in the answer are None;
+    descriptions of the fields are in Schema
+    """
+    __slots__ = ()
+
+    @classmethod
+    def fromDecoded(cls, address, timestamp, *decoded):
+        """
+        build a reading from dicts field name -> value
+        as returned by KacoRS485Parser.decode
+        """
+        merged = {}
+        for d in decoded:
+            merged.update(d)
+        return cls._make([address, timestamp] + [merged.get(f) for f in READING_FIELDS[2:]])
+
+    def asDict(self):
+        """
+        dict field name -> value without the missing fields
+        """
+        return {k: v for k, v in zip(self._fields, self) if v is not None}
+
+
+#description of one field of an answer
+Field = namedtuple('Field', ('name', 'command', 'index', 'convert_to', 'description'))
+
+
+class Schema(object):
+    """
+    field metadata of KacoRS485Parser.mapping, kept apart from the values
+    """
+
+    def __init__(self, mapping):
+        #name -> Field, first command wins for fields in several answers
+        self.fields = {}
+        #command -> list of Field in answer order
+        self.byCommand = {}
+        for command in sorted(mapping):
+            template = mapping[command]
+            fields = []
+            for i in sorted(template):
+                item = template[i]
+                field = Field(item['name'], command, i, item.get('convert_to'), item.get('description', ''))
+                fields.append(field)
+                self.fields.setdefault(field.name, field)
+            self.byCommand[command] = fields
+
+    def __getitem__(self, name):
+        return self.fields[name]
+
+    def __contains__(self, name):
+        return name in self.fields
+
+    def numeric(self):
+        """
+        names of all fields converted to numbers, in reading order
+        """
+        return [name for name in READING_FIELDS
+                if name in self.fields and self.fields[name].convert_to in (int, float)]
+
+
+class ReadingColumns(object):
+    """
+    compact in-memory list of readings
+
+    numbers are kept in typed arrays, one per field (missing values are
+    nan), text fields as lists of shared strings; a reading costs about
+    a hundred bytes instead of an object per field
+    """
+
+    numericFields = ('timestamp', 'status', 'u_dc', 'i_dc', 'p_dc', 'u_ac', 'i_ac', 'p_ac',
+                     'temp', 'e_day', 'p_top', 'e_all')
+
+    def __init__(self):
+        self.address = array.array('B')
+        self.columns = {name: array.array('d') for name in self.numericFields}
+        self.text = {name: [] for name in READING_FIELDS
+                     if name != 'address' and name not in self.numericFields}
+        self._strings = {}
+
+    def __len__(self):
+        return len(self.address)
+
+    def append(self, reading):
+        self.address.append(reading.address)
+        for name, column in self.columns.items():
+            value = getattr(reading, name)
+            column.append(math.nan if value is None else value)
+        for name, column in self.text.items():
+            value = getattr(reading, name)
+            column.append(self._strings.setdefault(value, value))
+
+    def extend(self, readings):
+        for reading in readings:
+            self.append(reading)
+
+    def column(self, name):
+        """
+        array of all values of a numeric field or list of a text field
+        """
+        if name == 'address':
+            return self.address
+        if name in self.columns:
+            return self.columns[name]
+        return self.text[name]
+
+    def __getitem__(self, i):
+        values = {name: column[i] for name, column in self.columns.items()}
+        for name, value in values.items():
+            if math.isnan(value):
+                values[name] = None
+        if values['status'] is not None:
+            values['status'] = int(values['status'])
+        for name, column in self.text.items():
+            values[name] = column[i]
+        return InverterReading(address=self.address[i], **values)
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
@@ -0,0 +1,266 @@
+# -*- coding: utf-8 -*-
+
+## parse raw capture files again, e.g. after changing KacoRS485Parser.mapping
+##
+## usage: python -m kacors485.reparse --store DIR [--checkpoint FILE] [--workers N] [--port PORT] capture...
+##
+## every capture file is one shard parsed by a worker process; the
+## readings are written to a new ReadingStore in the order of the first
+## record of the files and a checkpoint lists the finished files, so an
+## interrupted run goes on where it stopped. Rotate captures (e.g. one file per day) to use
+## many cores. The store is keyed by address only, so every run takes the
+## captures of one bus.
+
+import argparse
+import json
+import multiprocessing
+import os
+import sys
+import time
+
+from .capture import CaptureReader
+from .kacors485 import KacoRS485Parser
+from .metrics import splitCommand
+from .store import ReadingStore, DAY
+
+#seconds a command 3 answer may follow the command 0 answer of the same reading
+PAIR_WINDOW = 10.0
+
+
+def parseCapture(path, parserClass=KacoRS485Parser, port=None):
+    """
+    parse all answers of one capture file into InverterReading
+
+    an answer to command 0 and the next answer to command 3 of the same
+    port and address within PAIR_WINDOW seconds make one reading
+
+    port: only parse answers of this port
+
+    return (list of readings sorted by time, dict of counters,
+    set of the ports of the parsed answers)
+    """
+    parser = parserClass()
+    readings = []
+    stats = {'answers': 0, 'readings': 0, 'failures': 0}
+    #(port, address) -> command 0 record waiting for its command 3
+    pending = {}
+    ports = set()
+
+    def emit(address, first, second=None):
+        answers = {first.command: first.answer}
+        if second is not None:
+            answers[second.command] = second.answer
+        try:
+            readings.append(parser.parseReading(answers, address, first.timestamp))
+        except Exception:
+            stats['failures'] += 1
+
+    for record in CaptureReader(path):
+        if port is not None and record.port != port:
+            continue
+        address, command = splitCommand(record.command)
+        if address is None or len(record.answer) == 0:
+            continue
+        ports.add(record.port)
+        stats['answers'] += 1
+        key = (record.port, address)
+        first = pending.pop(key, None)
+
+        if command == 0:
+            if first is not None:
+                emit(address, first)
+            pending[key] = record
+        elif first is not None and record.timestamp - first.timestamp <= PAIR_WINDOW:
+            emit(address, first, record)
+        else:
+            if first is not None:
+                emit(address, first)
+            emit(address, record)
+
+    for (recordPort, address), first in pending.items():
+        emit(address, first)
+
+    readings.sort(key=lambda r: (r.timestamp, r.address))
+    stats['readings'] = len(readings)
+    return readings, stats, ports
+
+
+def _captureOrder(path):
+    #empty captures last, by path if their first records are at the same time
+    first = CaptureReader(path).firstTimestamp()
+    return (first is None, first or 0.0, path)
+
+
+def _parseShard(args):
+    path, parserClass, port = args
+    readings, stats, ports = parseCapture(path, parserClass, port)
+    return path, readings, stats, ports
+
+
+class Checkpoint(object):
+    """
+    json file listing the capture files already written to the store,
+    with size and modification time so a changed file is parsed again,
+    and the length of the segments before the file being written, so
+    they can be cut back if the run was interrupted
+    """
+
+    def __init__(self, path):
+        self.path = path
+        #abspath -> [size, mtime]
+        self.done = {}
+        #{'capture': abspath, 'segments': [[address, day, records], ...]} or None
+        self.current = None
+        if path is not None and os.path.exists(path):
+            with open(path) as f:
+                state = json.load(f)
+            self.done = state['done']
+            self.current = state['current']
+
+    def started(self):
+        """
+        True if a run wrote to the store with this checkpoint
+        """
+        return bool(self.done) or self.current is not None
+
+    @staticmethod
+    def stamp(capture):
+        st = os.stat(capture)
+        return [st.st_size, st.st_mtime]
+
+    def isDone(self, capture):
+        return self.done.get(os.path.abspath(capture)) == self.stamp(capture)
+
+    def begin(self, capture, segments):
+        """
+        capture is written next, segments: dict (address, day) -> records
+        in the segment before
+        """
+        self.current = {'capture': os.path.abspath(capture),
+                        'segments': [[a, d, n] for (a, d), n in sorted(segments.items())]}
+        self.save()
+
+    def markDone(self, capture):
+        self.done[os.path.abspath(capture)] = self.stamp(capture)
+        self.current = None
+        self.save()
+
+    def save(self):
+        if self.path is None:
+            return
+        #write and rename, an interrupted write must not lose the checkpoint
+        tmp = self.path + '.tmp'
+        with open(tmp, 'w') as f:
+            json.dump({'done': self.done, 'current': self.current}, f)
+        os.replace(tmp, self.path)
+
+
+def reparse(captures, store, workers=None, checkpoint=None, progress=None, parserClass=KacoRS485Parser,
+            port=None):
+    """
+    parse capture files in a process pool and append the readings to store
+
+    captures: paths of capture files, written to the store sorted by the
+        time of their first record, whatever their names
+    store: new ReadingStore or its directory; a store which holds readings
+        is only taken to resume the run of checkpoint
+    workers: worker processes, default one per core, 1 parses in this process
+    checkpoint: path of the checkpoint file, None to always parse all files
+    progress: called with (files done, files total, path, counters)
+        after every file
+    parserClass: KacoRS485Parser or a subclass with another mapping
+    port: only store answers of this port; without, all captures must
+        hold the answers of one port, as the store does not tell
+        inverters of different buses apart
+
+    a file which was written only in part before an interruption is cut
+    back from the store and written again. Readings older than the last
+    one of their segment, e.g. of overlapping captures, are skipped and
+    counted
+
+    return dict of counters summed over all parsed files
+    """
+    if not isinstance(store, ReadingStore):
+        store = ReadingStore(store)
+    checkpoint = Checkpoint(checkpoint)
+
+    if not checkpoint.started() and store.days():
+        raise Exception('store {} already holds readings, parse captures again into a new store '
+                        'or resume with the checkpoint of the interrupted run'.format(store.directory))
+    if checkpoint.current is not None:
+        #cut back the file which was written in part
+        for address, day, records in checkpoint.current['segments']:
+            store.segment(address, day).truncate(records)
+        store.close()
+
+    captures = sorted(captures, key=_captureOrder)
+    todo = [c for c in captures if not checkpoint.isDone(c)]
+    total = len(captures)
+    done = total - len(todo)
+
+    totals = {'files': 0, 'answers': 0, 'readings': 0, 'failures': 0, 'stored': 0, 'skipped': 0}
+    jobs = [(path, parserClass, port) for path in todo]
+    seenPorts = set()
+
+    if workers == 1:
+        results = map(_parseShard, jobs)
+        pool = None
+    else:
+        pool = multiprocessing.Pool(workers)
+        results = pool.imap(_parseShard, jobs)
+
+    try:
+        for path, readings, stats, ports in results:
+            seenPorts |= ports
+            if len(seenPorts) > 1:
+                raise Exception('captures of several ports {}, choose one with port'.format(sorted(seenPorts)))
+
+            keys = set((r.address, int(r.timestamp // DAY) * DAY) for r in readings)
+            checkpoint.begin(path, {key: len(store.segment(*key)) for key in keys})
+            for reading in readings:
+                last = store.segment(reading.address, int(reading.timestamp // DAY) * DAY).last()
+                if last is not None and reading.timestamp < last:
+                    totals['skipped'] += 1
+                    continue
+                store.append(reading)
+                totals['stored'] += 1
+            #close the segments, years of captures would use up the file handles
+            store.close()
+            checkpoint.markDone(path)
+
+            totals['files'] += 1
+            for name in stats:
+                totals[name] += stats[name]
+            done += 1
+            if progress is not None:
+                progress(done, total, path, stats)
+    finally:
+        if pool is not None:
+            pool.terminate()
+            pool.join()
+
+    return totals
+
+
+def main():
+    parser = argparse.ArgumentParser(description='parse kacors485 capture files into a reading store')
+    parser.add_argument('captures', nargs='+', help='capture files')
+    parser.add_argument('--store', required=True, help='directory of the reading store')
+    parser.add_argument('--checkpoint', help='checkpoint file to resume an interrupted run')
+    parser.add_argument('--workers', type=int, help='worker processes, default one per core')
+    parser.add_argument('--port', help='only parse answers of this port')
+    args = parser.parse_args()
+
+    start = time.time()
+
+    def progress(done, total, path, stats):
+        sys.stderr.write('{}/{} {} {answers} answers {readings} readings {failures} failures {:.0f}s\n'.format(
+            done, total, path, time.time() - start, **stats))
+
+    with ReadingStore(args.store) as store:
+        totals = reparse(args.captures, store, args.workers, args.checkpoint, progress, port=args.port)
+    print(json.dumps(totals))
+
+
+if __name__ == '__main__':
+    main()
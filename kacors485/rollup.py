@@ -0,0 +1,221 @@
+# -*- coding: utf-8 -*-
+import collections
+import math
+
+
+def plainValues(data):
+    """
+    dict field name -> value of a decoded dict, a readInverterAndParse
+    dict or an InverterReading
+    """
+    if hasattr(data, 'asDict'):
+        data = data.asDict()
+    out = {}
+    for name, value in data.items():
+        if isinstance(value, dict):
+            value = value.get('value')
+        out[name] = value
+    return out
+
+
+class Rollup(object):
+    """
+    incremental aggregates of inverter data in time buckets
+
+    every window (seconds) has buckets aligned to multiples of the window,
+    e.g. minutes, quarters of an hour and hours. A bucket holds the mean
+    of meanFields, the minimum and maximum of extremeFields and the
+    energy of the counter fields produced in it. Every sample costs the
+    same, whatever the length of the windows.
+
+    energy is taken from differences of e_day (Wh) and e_all (kWh). A
+    falling e_day is the reset at the start of a day, its new value is the
+    energy since the reset. A step which would need more than maxPower
+    watts since the counter last changed, or a falling e_all, is a counter
+    jump and counted in 'jumps' without energy; the counter is only taken
+    at its new value if it stays off for jumpConfirm samples. Measuring
+    from the last change allows for coarse counters, e.g. e_all in whole
+    kWh: a step which came too soon is counted once enough time passed.
+
+    example
+    ``
+    rollup = Rollup()
+    for address, command, data in poller.poll():
+        if data is not None:
+            rollup.add(address, time.time(), data)
+    quarters = rollup.completed(1, 900)
+    ``
+    """
+
+    defaultWindows = (60, 900, 3600)
+    meanFields = ('p_ac', 'p_dc', 'u_dc')
+    extremeFields = ('temp',)
+    #counter field -> (Wh per unit, resets every day)
+    counterFields = {'e_day': (1.0, True), 'e_all': (1000.0, False)}
+
+    #highest plausible power of one inverter in W
+    maxPower = 100000.0
+    #jumps in a row after which a counter is taken at its new value
+    jumpConfirm = 3
+    #completed buckets kept per address and window
+    keep = 96
+
+    def __init__(self, windows=None, keep=None):
+        self.windows = tuple(windows or self.defaultWindows)
+        if keep is not None:
+            self.keep = keep
+
+        #(address, window) -> open bucket
+        self.current = {}
+        #(address, window) -> deque of completed buckets, oldest first
+        self.done = {}
+        #address -> counter field -> (timestamp of the last change, value,
+        #jumps since) of the last plausible sample
+        self.counters = {}
+
+    def newBucket(self, start):
+        bucket = {'start': start, 'samples': 0, 'jumps': 0}
+        for name in self.meanFields:
+            bucket[name + '_sum'] = 0.0
+            bucket[name + '_count'] = 0
+        for name in self.extremeFields:
+            bucket[name + '_min'] = None
+            bucket[name + '_max'] = None
+        for name in self.counterFields:
+            bucket[name + '_wh'] = 0.0
+        return bucket
+
+    def _energy(self, address, timestamp, values):
+        """
+        energy in Wh per counter field since the last sample and jumps
+        """
+        last = self.counters.setdefault(address, {})
+        energy = {}
+        jumps = 0
+        for name, (scale, daily) in self.counterFields.items():
+            value = values.get(name)
+            if value is None or (isinstance(value, float) and math.isnan(value)):
+                continue
+            previous = last.get(name)
+            if previous is None:
+                last[name] = (timestamp, value, 0)
+                continue
+            if value == previous[1]:
+                #no change, keep the time of the last change
+                last[name] = (previous[0], value, 0)
+                continue
+
+            delta = (value - previous[1]) * scale
+            if delta < 0 and daily:
+                #reset at the start of the day
+                delta = value * scale
+            limit = self.maxPower * max(timestamp - previous[0], 0) / 3600.0
+            if delta < 0 or delta > limit:
+                jumps += 1
+                #keep the last good value unless the counter stays off
+                if previous[2] + 1 >= self.jumpConfirm:
+                    #no energy, a step which became plausible since the
+                    #last change was taken above
+                    last[name] = (timestamp, value, 0)
+                else:
+                    last[name] = (previous[0], previous[1], previous[2] + 1)
+                continue
+            last[name] = (timestamp, value, 0)
+            energy[name] = delta
+        return energy, jumps
+
+    def add(self, address, timestamp, data):
+        """
+        add one sample of address: a decoded dict, a readInverterAndParse
+        dict or an InverterReading; timestamps of an address must not
+        decrease
+        """
+        values = plainValues(data)
+        energy, jumps = self._energy(address, timestamp, values)
+
+        for window in self.windows:
+            key = (address, window)
+            start = timestamp // window * window
+            bucket = self.current.get(key)
+            if bucket is None or bucket['start'] != start:
+                if bucket is not None:
+                    if key not in self.done:
+                        self.done[key] = collections.deque(maxlen=self.keep)
+                    self.done[key].append(bucket)
+                bucket = self.current[key] = self.newBucket(start)
+
+            bucket['samples'] += 1
+            bucket['jumps'] += jumps
+            for name in self.meanFields:
+                value = values.get(name)
+                if value is not None and not math.isnan(value):
+                    bucket[name + '_sum'] += value
+                    bucket[name + '_count'] += 1
+            for name in self.extremeFields:
+                value = values.get(name)
+                if value is not None and not math.isnan(value):
+                    if bucket[name + '_min'] is None or value < bucket[name + '_min']:
+                        bucket[name + '_min'] = value
+                    if bucket[name + '_max'] is None or value > bucket[name + '_max']:
+                        bucket[name + '_max'] = value
+            for name, wh in energy.items():
+                bucket[name + '_wh'] += wh
+
+    def summary(self, bucket, window):
+        """
+        dict with start, end, samples, jumps, <field>_avg, <field>_min,
+        <field>_max and <counter>_wh of a bucket
+        """
+        out = {'start': bucket['start'], 'end': bucket['start'] + window,
+               'samples': bucket['samples'], 'jumps': bucket['jumps']}
+        for name in self.meanFields:
+            count = bucket[name + '_count']
+            out[name + '_avg'] = bucket[name + '_sum'] / count if count else None
+        for name in self.extremeFields:
+            out[name + '_min'] = bucket[name + '_min']
+            out[name + '_max'] = bucket[name + '_max']
+        for name in self.counterFields:
+            out[name + '_wh'] = bucket[name + '_wh']
+        return out
+
+    def completed(self, address, window, since=None):
+        """
+        summaries of the completed buckets of address, oldest first
+
+        since: only buckets starting at or after since
+        """
+        return [self.summary(b, window) for b in self.done.get((address, window), ())
+                if since is None or b['start'] >= since]
+
+    def latest(self, address, window):
+        """
+        summary of the open bucket of address or None
+        """
+        bucket = self.current.get((address, window))
+        return None if bucket is None else self.summary(bucket, window)
+
+    def snapshot(self):
+        """
+        state as json serialisable dict, see restore
+        """
+        return {
+            'windows': list(self.windows),
+            'keep': self.keep,
+            'current': [[a, w, b] for (a, w), b in self.current.items()],
+            'done': [[a, w, list(d)] for (a, w), d in self.done.items()],
+            'counters': [[a, {n: list(v) for n, v in c.items()}] for a, c in self.counters.items()],
+        }
+
+    @classmethod
+    def restore(cls, snapshot):
+        """
+        Rollup with the state of a snapshot
+        """
+        rollup = cls(snapshot['windows'], snapshot['keep'])
+        for address, window, bucket in snapshot['current']:
+            rollup.current[(address, window)] = dict(bucket)
+        for address, window, buckets in snapshot['done']:
+            rollup.done[(address, window)] = collections.deque((dict(b) for b in buckets), maxlen=rollup.keep)
+        for address, counters in snapshot['counters']:
+            rollup.counters[address] = {n: tuple(v) for n, v in counters.items()}
+        return rollup
@@ -0,0 +1,128 @@
+# -*- coding: utf-8 -*-
+import threading
+import time
+
+from .kacors485 import KacoRS485, KacoRS485Parser
+
+
+class Flight(object):
+    """
+    one bus transaction other threads can wait for
+    """
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.answer = None
+        self.error = None
+
+
+class SharedKacoRS485(object):
+    """
+    KacoRS485 which can be shared by many threads
+
+    only one command is on the bus at a time. Threads asking for the
+    same (address, command) while it is on the bus wait for that
+    transaction and get its answer instead of sending the command again;
+    with maxAge an answer which is at most maxAge seconds old is
+    returned without using the bus at all.
+
+    example
+    ``
+    kaco = SharedKacoRS485('/dev/ttyUSB0')
+    #in any thread
+    data = kaco.readInverterAndParse(1, maxAge=5)
+    ``
+    """
+
+    def __init__(self, kaco, clock=time.monotonic):
+        """
+        kaco: KacoRS485 or anything KacoRS485 accepts as serial port
+        """
+        if not isinstance(kaco, KacoRS485):
+            kaco = KacoRS485(kaco)
+        self.kaco = kaco
+        self.clock = clock
+
+        #held while a command is on the bus
+        self.busLock = threading.Lock()
+        #guards flights and recent
+        self.lock = threading.Lock()
+        #(address, command) -> Flight on the bus or waiting for it
+        self.flights = {}
+        #(address, command) -> (time the command was sent, answer)
+        self.recent = {}
+
+        #commands sent, requests which waited for another thread's
+        #transaction and requests answered from recent
+        self.transactions = 0
+        self.coalesced = 0
+        self.reused = 0
+
+    def transaction(self, address, command, maxAge=None):
+        """
+        send command to address and return the answer bytes,
+        empty if the inverter did not answer
+
+        maxAge: seconds an earlier answer may be old to be returned instead
+        """
+        key = (address, command)
+        with self.lock:
+            if maxAge is not None and key in self.recent:
+                sent, answer = self.recent[key]
+                if self.clock() - sent <= maxAge:
+                    self.reused += 1
+                    return answer
+            flight = self.flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self.flights[key] = Flight()
+            else:
+                self.coalesced += 1
+
+        if not leader:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.answer
+
+        try:
+            with self.busLock:
+                sent = self.clock()
+                flight.answer = self.kaco.sendCmdAndRead(self.kaco.formatCommand(address, command))
+            with self.lock:
+                self.transactions += 1
+                self.recent[key] = (sent, flight.answer)
+            return flight.answer
+        except Exception as e:
+            flight.error = e
+            raise
+        finally:
+            with self.lock:
+                del self.flights[key]
+            flight.done.set()
+
+    def readInverter(self, inverterNumber, maxAge=None):
+        """
+        like KacoRS485.readInverter, see transaction for maxAge
+        """
+        answers = {}
+        for i, command in enumerate(self.kaco.sendCommands):
+            cmd = self.kaco.formatCommand(inverterNumber, command)
+            answers[cmd] = self.transaction(inverterNumber, command, maxAge)
+            if len(answers[cmd]) == 0 and i == 0:
+                #asleep or not there, do not wait for the other commands
+                break
+        return answers
+
+    def readInverterAndParse(self, inverterNumber, maxAge=None):
+        answers = self.readInverter(inverterNumber, maxAge)
+        return KacoRS485Parser(self.kaco.metrics).parseAnswers(answers, inverterNumber)
+
+    def readReading(self, inverterNumber, maxAge=None):
+        timestamp = time.time()
+        answers = self.readInverter(inverterNumber, maxAge)
+        return KacoRS485Parser(self.kaco.metrics).parseReading(answers, inverterNumber, timestamp)
+
+    def close(self):
+        with self.busLock:
+            self.kaco.close()
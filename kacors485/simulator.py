@@ -0,0 +1,281 @@
+# -*- coding: utf-8 -*-
+import math
+import os
+import random
+import select
+import threading
+import time
+
+from .capture import AnswerSerial
+
+
+def checksum(line):
+    """
+    checksum of an answer to command 0: sum of all bytes from '*'
+    up to and including the space before the checksum, modulo 256
+    """
+    return bytes(bytearray([sum(bytearray(line)) & 0xff]))
+
+
+class SimulatedInverter(object):
+    """
+    one simulated inverter with a sunny day as power curve
+
+    latency, jitter: seconds until the answer starts, jitter is the
+        standard deviation added to the latency
+    dropRate, garbleRate, truncateRate: probabilities of no answer,
+        an answer with flipped bytes and an answer cut off before its end
+    sleepAtNight: do not answer while the sun is down
+    echo3: answer to command 3 starts with the command echo
+    """
+
+    def __init__(self, address, latency=0.08, jitter=0.0, dropRate=0.0, garbleRate=0.0,
+                 truncateRate=0.0, peakPower=8000, type='8000xi', sleepAtNight=True,
+                 echo3=True, rng=None):
+        self.address = address
+        self.latency = latency
+        self.jitter = jitter
+        self.dropRate = dropRate
+        self.garbleRate = garbleRate
+        self.truncateRate = truncateRate
+        self.peakPower = peakPower
+        self.type = type
+        self.sleepAtNight = sleepAtNight
+        self.echo3 = echo3
+        self.rng = rng or random.Random(address)
+
+        #energy of all days before the simulation in kWh
+        self.energyBefore = 40000.0
+
+    def sun(self, t):
+        """
+        irradiance between 0 and 1 at unix time t (UTC): sine from 6 to 18 h
+        """
+        hour = (t % 86400) / 3600.0
+        if hour <= 6 or hour >= 18:
+            return 0.0
+        return math.sin(math.pi * (hour - 6) / 12)
+
+    def values(self, t):
+        """
+        dict field name -> value at unix time t
+        """
+        hour = (t % 86400) / 3600.0
+        sun = self.sun(t)
+        noise = 1 + self.rng.gauss(0, 0.01)
+
+        p_dc = self.peakPower * sun * noise
+        u_dc = 450 + 120 * sun if sun > 0 else 0.0
+        p_ac = p_dc * 0.95
+        u_ac = 230 + self.rng.gauss(0, 1)
+
+        #energy and operating time so far, integral of the sine
+        daylight = min(max(hour - 6, 0), 12)
+        e_day = self.peakPower * 12 / math.pi * (1 - math.cos(math.pi * daylight / 12))
+        days = t // 86400
+
+        if sun == 0:
+            status = 15
+        elif sun < 0.05:
+            status = 2
+        elif sun < 0.3:
+            status = 4
+        else:
+            status = 5
+
+        return {
+            'status': status,
+            'u_dc': u_dc,
+            'i_dc': p_dc / u_dc if u_dc else 0.0,
+            'p_dc': p_dc,
+            'u_ac': u_ac,
+            'i_ac': p_ac / u_ac,
+            'p_ac': p_ac,
+            'temp': 15 + 40 * sun,
+            'e_day': e_day,
+            'p_top': self.peakPower * math.sin(math.pi * min(daylight, 6) / 12),
+            'e_all': self.energyBefore + days * self.peakPower * 24 / math.pi / 1000 + e_day / 1000,
+            'run_today': daylight * 60,
+            'run_all': days * 720 + daylight * 60,
+        }
+
+    def frame(self, command, t):
+        """
+        clean answer to command at unix time t
+        """
+        v = self.values(t)
+        if command == 0:
+            line = '*{:02d}0 {:3d} {:5.1f} {:5.2f} {:5.0f} {:5.1f} {:5.2f} {:5.0f} {:3.0f} {:6.0f} '.format(
+                self.address, v['status'], v['u_dc'], v['i_dc'], v['p_dc'], v['u_ac'], v['i_ac'],
+                v['p_ac'], v['temp'], v['e_day']).encode()
+            return b'\n' + line + checksum(line) + b' ' + self.type.encode() + b'\r'
+        if command == 3:
+            run_today = '{:d}:{:02d}'.format(int(v['run_today'] // 60), int(v['run_today'] % 60))
+            run_all = '{:d}:{:02d}'.format(int(v['run_all'] // 60), int(v['run_all'] % 60))
+            line = '{:6.0f} {:6.0f} {:6.0f} {:6.0f} {:>6s} {:>9s} {:>9s}'.format(
+                v['p_top'], v['e_day'], v['e_all'], v['e_all'], run_today, run_all, run_all).encode()
+            if self.echo3:
+                line = '*{:02d}3 '.format(self.address).encode() + line
+            return b'\n' + line + b'\x00'
+        return None
+
+    def answer(self, command, t):
+        """
+        answer to command at unix time t including faults
+
+        return (answer bytes, latency) or None for no answer
+        """
+        if self.sleepAtNight and self.sun(t) == 0:
+            return None
+        if self.rng.random() < self.dropRate:
+            return None
+
+        frame = self.frame(command, t)
+        if frame is None:
+            return None
+
+        if self.rng.random() < self.garbleRate:
+            frame = bytearray(frame)
+            for i in range(self.rng.randint(1, 3)):
+                frame[self.rng.randrange(len(frame))] = self.rng.randrange(256)
+            frame = bytes(frame)
+        if self.rng.random() < self.truncateRate:
+            frame = frame[:self.rng.randrange(1, len(frame))]
+
+        latency = max(0.0, self.latency + self.rng.gauss(0, self.jitter)) if self.jitter else self.latency
+        return frame, latency
+
+
+class BusSimulator(object):
+    """
+    up to 32 simulated inverters on one bus
+
+    example
+    ``
+    bus = BusSimulator([SimulatedInverter(a, latency=0.06) for a in range(1, 21)])
+    kaco = KacoRS485(bus.serial())
+    ``
+    """
+
+    def __init__(self, inverters, clock=time.time):
+        """
+        inverters: list of SimulatedInverter
+        clock: time seen by the inverters, e.g. to simulate noon at night
+        """
+        self.inverters = {}
+        for inverter in inverters:
+            if not 1 <= inverter.address <= 32:
+                raise Exception('inverter address {} not between 1 and 32'.format(inverter.address))
+            self.inverters[inverter.address] = inverter
+        self.clock = clock
+        self._input = b''
+
+    def answer(self, command):
+        """
+        answer to a command line like '#010'
+
+        return (answer bytes, latency) or None for no answer
+        """
+        command = command.strip()
+        if len(command) != 4 or not command.startswith('#') or not command[1:].isdigit():
+            return None
+        inverter = self.inverters.get(int(command[1:3]))
+        if inverter is None:
+            return None
+        return inverter.answer(int(command[3]), self.clock())
+
+    def feed(self, data):
+        """
+        feed bytes received on the bus
+
+        return list of (answer bytes, latency) for all complete commands
+        """
+        self._input += data
+        out = []
+        while b'\n' in self._input:
+            line, self._input = self._input.split(b'\n', 1)
+            answer = self.answer(line.decode('latin-1'))
+            if answer is not None:
+                out.append(answer)
+        return out
+
+    def serial(self, timeScale=1.0):
+        """
+        serial port look-alike for KacoRS485 served in-process
+
+        timeScale: factor applied to all latencies, 0 to answer at once
+        """
+        return SimulatedSerial(self, timeScale)
+
+
+class SimulatedSerial(AnswerSerial):
+    """
+    serial port look-alike answering from a BusSimulator
+    """
+
+    port = 'simulator'
+
+    def __init__(self, bus, timeScale=1.0, clock=time.monotonic):
+        AnswerSerial.__init__(self, clock)
+        self.bus = bus
+        self.timeScale = timeScale
+
+    def answerFor(self, command):
+        answer = self.bus.answer(command)
+        if answer is None:
+            return None
+        return answer[0], answer[1] * self.timeScale
+
+
+class PtyBus(object):
+    """
+    serve a BusSimulator on a pty, KacoRS485 opens PtyBus.port
+
+    example
+    ``
+    with PtyBus(bus) as pty:
+        kaco = KacoRS485(pty.port)
+    ``
+    """
+
+    def __init__(self, bus):
+        self.bus = bus
+        self.master, self.slave = os.openpty()
+        self.port = os.ttyname(self.slave)
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name='kacors485 simulator')
+        self._thread.daemon = True
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        os.close(self.master)
+        os.close(self.slave)
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *args):
+        self.stop()
+
+    def _run(self):
+        while not self._stop.is_set():
+            readable, _, _ = select.select([self.master], [], [], 0.05)
+            if not readable:
+                continue
+            try:
+                data = os.read(self.master, 1024)
+            except OSError:
+                return
+            #half duplex: answer one command after the other
+            for answer, latency in self.bus.feed(data):
+                if self._stop.wait(latency):
+                    return
+                os.write(self.master, answer)
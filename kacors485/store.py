@@ -0,0 +1,281 @@
+# -*- coding: utf-8 -*-
+import array
+import calendar
+import collections
+import math
+import mmap
+import os
+import struct
+import time
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+#first bytes of every segment file
+MAGIC = b'KACOSEG1'
+
+#header of a segment file: magic, then the comma separated field names
+HEADER_SIZE = 256
+
+#numeric fields of command 0 and 3 stored after the timestamp
+STORE_FIELDS = ('status', 'u_dc', 'i_dc', 'p_dc', 'u_ac', 'i_ac', 'p_ac', 'temp', 'e_day',
+                'p_top', 'e_all')
+
+DAY = 86400
+
+
+class Segment(object):
+    """
+    one day of fixed-width records of one inverter, sorted by time
+
+    records are appended to the file and read through a memory map,
+    so a range query only touches the pages it needs
+    """
+
+    def __init__(self, path, fields=STORE_FIELDS):
+        self.path = path
+        self.fields = tuple(fields)
+        self.record = struct.Struct('<d' + 'f' * len(self.fields))
+        self._file = None
+        self._map = None
+        self._last = None
+
+        header = MAGIC + ','.join(self.fields).encode()
+        if len(header) > HEADER_SIZE:
+            raise Exception('too many fields for a segment header')
+        self.header = header.ljust(HEADER_SIZE, b'\x00')
+
+        if os.path.exists(path):
+            with open(path, 'rb') as f:
+                if f.read(HEADER_SIZE) != self.header:
+                    raise Exception('{} has another record layout'.format(path))
+
+    def __len__(self):
+        self.flush()
+        if not os.path.exists(self.path):
+            return 0
+        return (os.path.getsize(self.path) - HEADER_SIZE) // self.record.size
+
+    def append(self, timestamp, values):
+        """
+        append one record, timestamps must not decrease
+        """
+        if self._file is None:
+            self._open()
+        if self._last is not None and timestamp < self._last:
+            raise Exception('timestamp {} older than last record in {}'.format(timestamp, self.path))
+        self._file.write(self.record.pack(timestamp, *values))
+        self._last = timestamp
+        self._closeMap()
+
+    def _open(self):
+        directory = os.path.dirname(self.path)
+        if directory and not os.path.isdir(directory):
+            os.makedirs(directory)
+        self._file = open(self.path, 'ab')
+        if self._file.tell() == 0:
+            self._file.write(self.header)
+        elif len(self) > 0:
+            self._last = self._timestamp(self._mapped(), len(self) - 1)
+            self._closeMap()
+
+    def last(self):
+        """
+        timestamp of the last record or None if there is none
+        """
+        if self._last is None and len(self) > 0:
+            self._last = self._timestamp(self._mapped(), len(self) - 1)
+            self._closeMap()
+        return self._last
+
+    def truncate(self, n):
+        """
+        drop all records after the first n
+        """
+        self.close()
+        if os.path.exists(self.path) and len(self) > n:
+            os.truncate(self.path, HEADER_SIZE + n * self.record.size)
+        self._last = None
+
+    def flush(self):
+        if self._file is not None:
+            self._file.flush()
+
+    def close(self):
+        self._closeMap()
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def _closeMap(self):
+        if self._map is not None:
+            self._map.close()
+            self._map = None
+
+    def _mapped(self):
+        if self._map is None:
+            self.flush()
+            with open(self.path, 'rb') as f:
+                self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        return self._map
+
+    def _timestamp(self, m, i):
+        return struct.unpack_from('<d', m, HEADER_SIZE + i * self.record.size)[0]
+
+    def _bisect(self, m, n, timestamp):
+        #first record with a timestamp >= timestamp
+        lo, hi = 0, n
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._timestamp(m, mid) < timestamp:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def range(self, start, end):
+        """
+        raw bytes of all records with start <= timestamp < end
+        """
+        n = len(self)
+        if n == 0:
+            return b''
+        m = self._mapped()
+        lo = self._bisect(m, n, start)
+        hi = self._bisect(m, n, end)
+        size = self.record.size
+        return m[HEADER_SIZE + lo * size:HEADER_SIZE + hi * size]
+
+
+class ReadingStore(object):
+    """
+    append-only time-series store for InverterReading
+
+    every inverter gets one segment file per (UTC) day in
+    directory/YYYYMMDD/inverterNN.seg holding fixed-width records of the
+    timestamp and the numeric fields; the path is the index by address
+    and day, inside a day records are found by binary search
+
+    example
+    ``
+    store = ReadingStore('/var/lib/kaco')
+    store.append(kaco.readReading(7))
+    week = store.query(7, time.time() - 7 * 86400, time.time(), ['p_ac'])
+    ``
+    """
+
+    #segments kept open, the least recently used one is closed beyond,
+    #enough for today and yesterday of 32 inverters
+    maxOpenSegments = 64
+
+    def __init__(self, directory, fields=STORE_FIELDS):
+        self.directory = directory
+        self.fields = tuple(fields)
+        #(address, day) -> open Segment, least recently used first
+        self._segments = collections.OrderedDict()
+
+    def path(self, address, day):
+        """
+        path of the segment of address for the day starting at day (unix time)
+        """
+        return os.path.join(self.directory, time.strftime('%Y%m%d', time.gmtime(day)),
+                            'inverter{:02d}.seg'.format(address))
+
+    def segment(self, address, day):
+        key = (address, day)
+        if key in self._segments:
+            self._segments.move_to_end(key)
+            return self._segments[key]
+        while len(self._segments) >= self.maxOpenSegments:
+            self._segments.popitem(last=False)[1].close()
+        segment = self._segments[key] = Segment(self.path(address, day), self.fields)
+        return segment
+
+    def append(self, reading):
+        """
+        store one InverterReading
+        """
+        day = int(reading.timestamp // DAY) * DAY
+        values = []
+        for name in self.fields:
+            value = getattr(reading, name)
+            values.append(math.nan if value is None else value)
+        self.segment(reading.address, day).append(reading.timestamp, values)
+
+    def extend(self, readings):
+        for reading in readings:
+            self.append(reading)
+
+    def flush(self):
+        for segment in self._segments.values():
+            segment.flush()
+
+    def close(self):
+        for segment in self._segments.values():
+            segment.close()
+        self._segments.clear()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def days(self):
+        """
+        all stored days as unix time of their start
+        """
+        if not os.path.isdir(self.directory):
+            return []
+        return sorted(calendar.timegm(time.strptime(name, '%Y%m%d'))
+                      for name in os.listdir(self.directory)
+                      if len(name) == 8 and name.isdigit())
+
+    def query(self, address, start, end, fields=None):
+        """
+        all values of address with start <= timestamp < end
+
+        fields: names of the fields to return, default all
+
+        return dict name -> column with 'timestamp' and the fields;
+        numpy arrays if numpy is installed, otherwise array.array
+        """
+        if fields is None:
+            fields = self.fields
+        for name in fields:
+            if name not in self.fields:
+                raise Exception('field {} is not stored'.format(name))
+
+        chunks = []
+        day = int(start // DAY) * DAY
+        while day < end:
+            if (address, day) in self._segments:
+                chunks.append(self._segments[(address, day)].range(start, end))
+            elif os.path.exists(self.path(address, day)):
+                #do not keep maps of old days open
+                segment = Segment(self.path(address, day), self.fields)
+                chunks.append(segment.range(start, end))
+                segment.close()
+            day += DAY
+        data = b''.join(chunks)
+
+        if numpy is not None:
+            dtype = numpy.dtype([('timestamp', '<f8')] + [(name, '<f4') for name in self.fields])
+            records = numpy.frombuffer(data, dtype=dtype)
+            ret = {'timestamp': records['timestamp'].copy()}
+            for name in fields:
+                ret[name] = records[name].copy()
+            return ret
+
+        record = struct.Struct('<d' + 'f' * len(self.fields))
+        columns = [array.array('d') for i in range(len(self.fields) + 1)]
+        for values in record.iter_unpack(data):
+            for column, value in zip(columns, values):
+                column.append(value)
+        ret = {'timestamp': columns[0]}
+        for name in fields:
+            ret[name] = columns[1 + self.fields.index(name)]
+        return ret
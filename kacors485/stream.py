@@ -0,0 +1,219 @@
+# -*- coding: utf-8 -*-
+import re
+
+#echo of the command at the start of an answer: '*', address, command
+HEADER = re.compile(b'\\*([0-9]{2})([0-9])')
+
+#bytes between fields
+SEPARATORS = frozenset(bytearray(b' \t\x0b\x0c\n'))
+
+#bytes which end an answer frame
+TERMINATORS = re.compile(b'[\r\x00]')
+
+
+def checksumOk(line, pos):
+    """
+    True if the byte at pos is the sum of all bytes before it modulo 256,
+    line has to start with the command echo
+    """
+    return sum(bytearray(line[:pos])) & 0xff == bytearray(line[pos:pos + 1])[0]
+
+
+class FrameDecoder(object):
+    """
+    decode answers out of a continuous byte stream
+
+    a frame starts with the command echo '*AAC' and ends with a
+    terminator. Bytes outside of frames are skipped, a frame with the
+    wrong number of fields, a bad checksum or fields which do not
+    convert is dropped and decoding goes on at the next echo. The
+    checksum field is taken by position, so a checksum byte which
+    looks like whitespace does not shift the other fields.
+
+    answers without command echo (some inverters answer command 3 like
+    this) are only decoded for the command given to expect.
+
+    example
+    ``
+    decoder = KacoRS485Parser().frameDecoder()
+    decoder.expect(1, 3)
+    for address, command, data in decoder.feed(chunk):
+        print(address, command, data['e_all'])
+    ``
+    """
+
+    #bytes kept while waiting for a terminator
+    maxFrame = 512
+
+    def __init__(self, layouts, metrics=None, verifyChecksum=True):
+        """
+        layouts: command -> (layout, layout without command echo),
+            see KacoRS485Parser.compile
+        metrics: Metrics which get parse failures
+        verifyChecksum: drop answers to command 0 with a wrong checksum
+        """
+        self.layouts = layouts
+        self.metrics = metrics
+        self.verifyChecksum = verifyChecksum
+        self.buffer = bytearray()
+        self.expected = None
+
+        #decoded frames, dropped frames and skipped bytes outside of frames
+        self.frames = 0
+        self.errors = 0
+        self.skipped = 0
+
+    def expect(self, address, command):
+        """
+        decode answers without command echo as answer of address to
+        command, None to drop them
+        """
+        self.expected = None if address is None else (address, command)
+
+    def feed(self, data):
+        """
+        feed received bytes
+
+        return list of (address, command, dict field name -> value)
+        of all frames completed by data
+        """
+        self.buffer += data
+        out = []
+
+        pos = 0
+        while True:
+            end = TERMINATORS.search(self.buffer, pos)
+            if end is None:
+                break
+            end = end.start()
+            if self._isChecksum(end):
+                pos = end + 1
+                continue
+
+            line = bytes(self.buffer[:end])
+            del self.buffer[:end + 1]
+            pos = 0
+
+            frame = self.decodeLine(line)
+            if frame is not None:
+                out.append(frame)
+
+        self._trim()
+        return out
+
+    def _isChecksum(self, end):
+        """
+        True if the terminator at end is in fact the checksum byte
+        of an answer to command 0
+        """
+        header = None
+        for header in HEADER.finditer(self.buffer, 0, end):
+            pass
+        if header is None or int(header.group(2)) not in self.layouts:
+            return False
+        names = [name for name, convert in self.layouts[int(header.group(2))][0]]
+        if 'checksum' not in names:
+            return False
+        line = bytes(self.buffer[header.start():end + 1])
+        return (len(line) > 1 and line[-2] in SEPARATORS
+                and len(line[:-1].split()) == names.index('checksum')
+                and checksumOk(line, len(line) - 1))
+
+    def decodeLine(self, line):
+        """
+        decode the last frame in line, which ends before a terminator
+        """
+        headers = list(HEADER.finditer(line))
+        for header in headers[:-1]:
+            #cut off by the next echo
+            self._error(int(header.group(1)), int(header.group(2)))
+
+        if headers:
+            header = headers[-1]
+            self.skipped += header.start()
+            address, command = int(header.group(1)), int(header.group(2))
+            if command not in self.layouts:
+                self._error(address, command)
+                return None
+            data = self._fields(line[header.start():], self.layouts[command][0], True)
+        elif self.expected is not None and self.expected[1] in self.layouts:
+            start = line.rfind(b'\n') + 1
+            self.skipped += start
+            line = line[start:]
+            if not line.strip():
+                return None
+            address, command = self.expected
+            data = self._fields(line, self.layouts[command][1], False)
+        else:
+            self.skipped += len(line)
+            return None
+
+        if data is None:
+            self._error(address, command)
+            return None
+
+        self.frames += 1
+        return address, command, data
+
+    def _fields(self, line, layout, echo):
+        """
+        split line into the fields of layout and convert them,
+        None if they do not fit
+        """
+        values = {}
+        pos = 0
+        n = len(line)
+        for name, convert in layout:
+            if name == 'checksum':
+                #one separator, then the checksum byte, which can be anything
+                if pos + 1 >= n or line[pos] not in SEPARATORS:
+                    return None
+                if echo and self.verifyChecksum and not checksumOk(line, pos + 1):
+                    return None
+                values[name] = convert(line[pos + 1:pos + 2])
+                pos += 2
+                continue
+
+            while pos < n and line[pos] in SEPARATORS:
+                pos += 1
+            start = pos
+            while pos < n and line[pos] not in SEPARATORS:
+                pos += 1
+            if start == pos:
+                return None
+            try:
+                values[name] = convert(line[start:pos])
+            except ValueError:
+                return None
+
+        if line[pos:].strip():
+            #more fields than the layout
+            return None
+        return values
+
+    def _error(self, address, command):
+        self.errors += 1
+        if self.metrics is not None:
+            self.metrics.parseFailure(address, command)
+
+    def _trim(self):
+        """
+        drop bytes which can not become part of a frame
+        """
+        headers = list(HEADER.finditer(self.buffer))
+        for header in headers[:-1]:
+            #cut off by the next echo
+            self._error(int(header.group(1)), int(header.group(2)))
+        if headers:
+            header = headers[-1]
+            keep = header.start()
+        elif self.expected is not None:
+            keep = max(self.buffer.rfind(b'\n'), 0)
+        else:
+            #the start of a header could be at the end
+            star = self.buffer.rfind(b'*', max(len(self.buffer) - 3, 0))
+            keep = star if star >= 0 else len(self.buffer)
+        keep = max(keep, len(self.buffer) - self.maxFrame)
+        if keep > 0:
+            self.skipped += keep
+            del self.buffer[:keep]
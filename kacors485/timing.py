@@ -0,0 +1,101 @@
+# -*- coding: utf-8 -*-
+import collections
+import threading
+
+
+class AdaptiveTimeouts(object):
+    """
+    per inverter deadlines learned from observed answer times
+
+    the deadline of a command is a high percentile of the recent answer
+    times of the same address and command plus a margin, never more than
+    the default deadline. After a missing answer the full default is
+    used again; an address which stayed silent for silentLimit commands
+    is only probed with probeTimeout, with a full deadline every
+    probeEvery commands so slow wake-ups are still noticed. Bytes which
+    do not make a complete frame, e.g. the garbage some inverters send
+    while asleep, count as a missing answer.
+    """
+
+    #answer times kept per (address, command)
+    window = 50
+    #answers needed before the deadline adapts
+    minSamples = 5
+    percentile = 0.95
+    factor = 1.2
+    margin = 0.05
+    minimum = 0.05
+
+    silentLimit = 3
+    probeTimeout = 0.15
+    probeEvery = 10
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        #(address, command) -> deque of seconds until the answer was complete
+        self.samples = {}
+        #address -> commands in a row without a complete answer
+        self.silent = {}
+        #address -> commands sent while silent
+        self._probes = {}
+
+    def estimate(self, address, command):
+        """
+        percentile of the recent answer times or None if too few
+        """
+        with self.lock:
+            samples = self.samples.get((address, command))
+            if not samples or len(samples) < self.minSamples:
+                return None
+            ordered = sorted(samples)
+        return ordered[min(len(ordered) - 1, int(self.percentile * len(ordered)))]
+
+    def deadline(self, address, command, default):
+        """
+        seconds to wait for the answer to command of address
+
+        default: deadline without knowledge, also the maximum
+        """
+        silent = self.silent.get(address, 0)
+        if silent >= self.silentLimit:
+            with self.lock:
+                self._probes[address] = self._probes.get(address, 0) + 1
+                probe = self._probes[address]
+            if probe % self.probeEvery == 0:
+                return default
+            return min(self.probeTimeout, default)
+        if silent > 0:
+            return default
+
+        estimate = self.estimate(address, command)
+        if estimate is None:
+            return default
+        return min(default, max(self.minimum, estimate * self.factor + self.margin))
+
+    def answered(self, address, command, seconds):
+        """
+        a complete answer arrived after seconds
+        """
+        with self.lock:
+            key = (address, command)
+            if key not in self.samples:
+                self.samples[key] = collections.deque(maxlen=self.window)
+            self.samples[key].append(seconds)
+            self.silent[address] = 0
+            self._probes[address] = 0
+
+    def incomplete(self, address, command, seconds, nbytes):
+        """
+        the deadline of seconds passed with nbytes of an answer
+        which could not be framed
+
+        this is a missing answer, the time is no answer time
+        """
+        with self.lock:
+            self.silent[address] = self.silent.get(address, 0) + 1
+
+    def isSilent(self, address):
+        """
+        True if address did not answer for silentLimit commands
+        """
+        return self.silent.get(address, 0) >= self.silentLimit
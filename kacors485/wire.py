@@ -0,0 +1,272 @@
+# -*- coding: utf-8 -*-
+import struct
+
+from .reading import READING_FIELDS, InverterReading
+
+#first bytes of every batch
+MAGIC = b'KACW'
+VERSION = 1
+
+#magic, version, schema id, flags, number of readings, length of the batch
+#in bytes and the base timestamp of delta encoded timestamps
+BATCH = struct.Struct('<4sBBBxIId')
+
+#flags of a batch
+DELTA = 1
+
+#marks of missing values
+NO_STATUS = 0xff
+NO_STRING = 0xffff
+
+#fields of every schema in the order of their struct codes: status 'B',
+#float 'f', text 's' (an index 'H' into the string table of the batch);
+#'common' is in every reading, the blocks of command 0 and 3 only if the
+#reading holds values of that command
+SCHEMAS = {
+    1: {
+        'common': (('e_day', 'f'),),
+        0: (('status', 'B'), ('u_dc', 'f'), ('i_dc', 'f'), ('p_dc', 'f'), ('u_ac', 'f'),
+            ('i_ac', 'f'), ('p_ac', 'f'), ('temp', 'f'), ('checksum', 's'), ('type', 's')),
+        3: (('p_top', 'f'), ('e_all', 'f'), ('no_idea', 's'), ('run_today', 's'),
+            ('run_all', 's'), ('run_all_again', 's')),
+    },
+}
+SCHEMA = 1
+
+#counters stored as difference to the reading before in delta batches
+DELTA_FIELDS = ('e_day', 'e_all')
+
+NAN = float('nan')
+
+FLOAT = struct.Struct('<f')
+
+
+class WireBlock(object):
+    """
+    struct and field positions of one block of a schema
+    """
+
+    def __init__(self, fields):
+        codes = [c for name, c in fields]
+        if codes != sorted(codes, key='Bfs'.index):
+            raise Exception('fields of a wire block must be ordered status, float, text')
+        self.names = [name for name, c in fields]
+        #positions in InverterReading
+        self.index = [READING_FIELDS.index(name) for name in self.names]
+        self.status = codes.count('B')
+        self.floats = codes.count('f')
+        self.struct = struct.Struct('<' + ''.join('H' if c == 's' else c for c in codes))
+
+
+class WireLayout(object):
+    """
+    compiled structs of one schema
+    """
+
+    def __init__(self, schema):
+        self.common = WireBlock(schema['common'])
+        #bit in the command mask of a reading -> block
+        self.commands = [(1, WireBlock(schema[0])), (2, WireBlock(schema[3]))]
+        for bit, block in self.commands:
+            #e_day is in both commands, the common block holds it
+            block.present = [i for i in block.index if i not in self.common.index]
+        self.delta = [READING_FIELDS.index(name) for name in DELTA_FIELDS]
+
+        #address, commands in the reading, timestamp
+        self.header = struct.Struct('<BBd')
+        #the same with the timestamp in milliseconds after the reading before
+        self.deltaHeader = struct.Struct('<BBi')
+
+
+LAYOUTS = {schemaId: WireLayout(schema) for schemaId, schema in SCHEMAS.items()}
+
+
+def encode(readings, delta=False, schema=SCHEMA):
+    """
+    encode a list of InverterReading into one batch
+
+    numbers are stored as 32 bit floats. delta: store timestamps (in
+    milliseconds) and counters as difference to the reading before;
+    smaller after compression, timestamps lose sub-millisecond precision,
+    a counter is off by at most the rounding of one difference
+    """
+    layout = LAYOUTS[schema]
+    strings = {}
+    records = []
+
+    base = readings[0].timestamp if readings else 0.0
+    lastTimestamp = base
+    lastCounter = {}
+
+    for reading in readings:
+        mask = 0
+        for bit, block in layout.commands:
+            for i in block.present:
+                if reading[i] is not None:
+                    mask |= bit
+                    break
+
+        if delta:
+            step = int(round((reading.timestamp - lastTimestamp) * 1000))
+            lastTimestamp += step / 1000.0
+            records.append(layout.deltaHeader.pack(reading.address, mask, step))
+            reading = list(reading)
+            for i in layout.delta:
+                value = reading[i]
+                if value is not None:
+                    #the difference to the value the decoder rebuilds, so
+                    #rounding to 32 bit does not add up over a batch
+                    key = (reading[0], i)
+                    last = lastCounter.get(key, 0.0)
+                    (step,) = FLOAT.unpack(FLOAT.pack(value - last))
+                    reading[i] = step
+                    lastCounter[key] = last + step
+        else:
+            records.append(layout.header.pack(reading.address, mask, reading.timestamp))
+
+        for bit, block in [(0, layout.common)] + layout.commands:
+            if bit and not mask & bit:
+                continue
+            values = [reading[i] for i in block.index]
+            packed = [NO_STATUS if v is None else v for v in values[:block.status]]
+            packed += [NAN if v is None else v for v in values[block.status:block.status + block.floats]]
+            for v in values[block.status + block.floats:]:
+                if v is None:
+                    packed.append(NO_STRING)
+                else:
+                    packed.append(strings.setdefault(v, len(strings)))
+            records.append(block.struct.pack(*packed))
+
+    table = [struct.pack('<H', len(strings))]
+    for value in strings:
+        data = value.encode('utf-8')
+        if len(data) > 255:
+            raise Exception('text field too long for the wire format: {!r}'.format(value))
+        table.append(struct.pack('<B', len(data)) + data)
+
+    body = b''.join(table + records)
+    header = BATCH.pack(MAGIC, VERSION, schema, DELTA if delta else 0, len(readings),
+                        BATCH.size + len(body), base)
+    return header + body
+
+
+def decode(data):
+    """
+    decode one batch into a list of InverterReading
+    """
+    readings, end = decodeAt(data, 0)
+    return readings
+
+
+def decodeAt(data, pos):
+    """
+    decode the batch starting at pos
+
+    return (list of InverterReading, position after the batch)
+    """
+    magic, version, schema, flags, count, length, base = BATCH.unpack_from(data, pos)
+    if magic != MAGIC:
+        raise Exception('no kacors485 wire batch at {}'.format(pos))
+    if version != VERSION:
+        raise Exception('wire format version {} is not supported'.format(version))
+    if schema not in LAYOUTS:
+        raise Exception('unknown wire schema {}'.format(schema))
+    layout = LAYOUTS[schema]
+    delta = flags & DELTA
+    end = pos + length
+    pos += BATCH.size
+
+    (nstrings,) = struct.unpack_from('<H', data, pos)
+    pos += 2
+    #index -> text, NO_STRING is not in it and maps to None
+    strings = {}
+    for i in range(nstrings):
+        size = data[pos]
+        strings[i] = bytes(data[pos + 1:pos + 1 + size]).decode('utf-8')
+        pos += 1 + size
+
+    header = layout.deltaHeader if delta else layout.header
+    blocks = [(0, layout.common)] + layout.commands
+    fields = len(READING_FIELDS)
+    timestamp = base
+    lastCounter = {}
+    readings = []
+    for n in range(count):
+        address, mask, t = header.unpack_from(data, pos)
+        pos += header.size
+        if delta:
+            timestamp += t / 1000.0
+        else:
+            timestamp = t
+
+        row = [None] * fields
+        row[0] = address
+        row[1] = timestamp
+        for bit, block in blocks:
+            if bit and not mask & bit:
+                continue
+            values = block.struct.unpack_from(data, pos)
+            pos += block.struct.size
+            floats = block.status + block.floats
+            for j, (i, value) in enumerate(zip(block.index, values)):
+                if j < block.status:
+                    row[i] = None if value == NO_STATUS else value
+                elif j < floats:
+                    #nan is the only value not equal to itself
+                    row[i] = value if value == value else None
+                else:
+                    row[i] = strings.get(value)
+
+        if delta:
+            for i in layout.delta:
+                if row[i] is not None:
+                    key = (address, i)
+                    row[i] = lastCounter[key] = lastCounter.get(key, 0.0) + row[i]
+
+        readings.append(InverterReading._make(row))
+
+    if pos != end:
+        raise Exception('wire batch length {} does not match its content'.format(length))
+    return readings, end
+
+
+def decodeAll(data):
+    """
+    generator of the InverterReading of all batches in data,
+    e.g. a file written by WireWriter
+    """
+    pos = 0
+    while pos < len(data):
+        readings, pos = decodeAt(data, pos)
+        for reading in readings:
+            yield reading
+
+
+class WireWriter(object):
+    """
+    append batches of readings to a file
+
+    example
+    ``
+    with WireWriter('export.kw') as writer:
+        writer.write(readings)
+    readings = list(decodeAll(open('export.kw', 'rb').read()))
+    ``
+    """
+
+    def __init__(self, path, delta=False):
+        self.f = open(path, 'ab')
+        self.delta = delta
+
+    def write(self, readings):
+        if readings:
+            self.f.write(encode(readings, self.delta))
+
+    def close(self):
+        self.f.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
@@ -1,58 +1,42 @@
 #!/usr/bin/python
 # -*- coding: utf-8 -*-
 
-## runs mock of inverter
+## runs mock of inverters
 ## use socat to create mock tty interface
 ## socat -d -d pty,raw,echo=0 pty,raw,echo=0
+##
+## usage: mockinverter.py serial-port [addresses]
+## e.g.   mockinverter.py /dev/pts/29 1,2,3,4
 
-mapping = {
-        #clean answer, what we whould expect
-        '#010': '*010 4 585.9 10.17 5958 229.5 24.90 5720 36 17614 d 9600I',
-        '#013': '2286 4184 42 581 8:46 11:04 11:04',
-
-        #do not answer anything for test cases
-        '#010': '',
-        '#013': '',
-
-        #recorded answer on system
-        '#010': 'n\xd6\xf6V\xeb\x00\n*010   4 585.9  0.88   515 230.0  2.04   460  14    377 x 8000xi\r\x00',
-        '#013': 'n\xd6\x96V\xeb\x00\n   883    377  44661  44661      0:47  25301:20  25301:20\x00',
-
-
-        #recorded answer, but intendetly broken! (missing one part)
-        '#010': 'n\xd6\xf6V\xeb\x00\n*010   4 585.9  0.88   515 230.0  2.04   460  14    377 x 8000xi\r\x00',
-        '#013': 'n\xd6\x96V\xeb\x00\n   377  44661  44661      0:47  25301:20  25301:20\x00',
+import sys
+import time
+import serial
 
-        #test, if only command one gives an answer
-        #but 3 is empty
-        '#010': 'n\xd6\xf6V\xeb\x00\n*010   4 585.9  0.88   515 230.0  2.04   460  14    377 x 8000xi\r\x00',
-        '#013': 'nv\x96V\xeb',
+from kacors485.simulator import BusSimulator, SimulatedInverter
 
-        #another inverter id with full answer
-        '#020': 'n\xd6\xf6V\xeb\x00\n*010   4 585.9  0.88   515 230.0  2.04   460  14    377 x 8000xi\r\x00',
-        '#023': 'n\xd6\x96V\xeb\x00\n   883    377  44661  44661      0:47  25301:20  25301:20\x00',
+port = sys.argv[1]
 
-        #another inverter id with full answer
-        '#030': 'n\xd6\xf6V\xeb\x00\n*010   4 585.9  0.88   515 230.0  2.04   460  14    377 x 8000xi\r\x00',
-        '#033': 'n\xd6\x96V\xeb\x00\n   883    377  44661  44661      0:47  25301:20  25301:20\x00',
+addresses = [1, 2, 3, 4]
+if len(sys.argv) > 2:
+    addresses = [int(a) for a in sys.argv[2].split(',')]
 
-        #another inverter id with full answer
-        '#040': 'n\xd6\xf6V\xeb\x00\n*010   4 585.9  0.88   515 230.0  2.04   460  14    377 x 8000xi\r\x00',
-        '#043': 'n\xd6\x96V\xeb\x00\n   883    377  44661  44661      0:47  25301:20  25301:20\x00',
-        }
+#pretend it is 10 o'clock in the morning, so the inverters are awake
+offset = 10 * 3600 - time.time() % 86400
 
-import sys
-import serial
-port = sys.argv[1]
+bus = BusSimulator([SimulatedInverter(a, latency=0.1, jitter=0.02) for a in addresses],
+                   clock=lambda: time.time() + offset)
 
-s = serial.Serial(port)
+s = serial.Serial(port, timeout=0.1)
 
 
 while True:
-    line = s.readline().strip()
+    data = s.read(64)
+    if not data:
+        continue
 
-    print("line is '{:s}'".format(line))
+    print("received {!r}".format(data))
 
-    if line in mapping:
-        print("send answer '{:s}'".format(mapping[line]))
-        s.write(mapping[line]+'\r\n')
+    for answer, latency in bus.feed(data):
+        time.sleep(latency)
+        print("send answer {!r}".format(answer))
+        s.write(answer + b'\r\n')
@@ -0,0 +1,89 @@
+import unittest
+
+#set import path to ../ directory
+import sys
+import os
+import os.path
+import asyncio
+libpath = os.path.abspath(os.path.join(os.path.dirname(__file__),  os.path.pardir))
+sys.path.append(libpath)
+
+from kacors485.aio import AsyncKacoRS485
+
+
+answers = {
+    b'#010': b'n\xd6\xf6V\xeb\x00\n*010   4 585.9  0.88   515 230.0  2.04   460  14    377 x 8000xi\r\x00',
+    b'#013': b'n\xd6\x96V\xeb\x00\n   883    377  44661  44661      0:47  25301:20  25301:20\x00',
+}
+
+
+class PtyInverter(object):
+    """
+    answer commands on the master side of a pty pair
+    """
+    def __init__(self, loop):
+        self.master, self.slave = os.openpty()
+        self.port = os.ttyname(self.slave)
+        self.received = b''
+        self.loop = loop
+        loop.add_reader(self.master, self.onReadable)
+
+    def onReadable(self):
+        self.received += os.read(self.master, 1024)
+        while b'\n' in self.received:
+            line, self.received = self.received.split(b'\n', 1)
+            line = line.strip()
+            if line in answers:
+                os.write(self.master, answers[line] + b'\r\n')
+
+    def close(self):
+        self.loop.remove_reader(self.master)
+        os.close(self.master)
+        os.close(self.slave)
+
+
+class TestAsyncKacoRS485(unittest.TestCase):
+    def run_async(self, coro_fn):
+        async def wrapper():
+            inverter = PtyInverter(asyncio.get_running_loop())
+            kaco = AsyncKacoRS485(inverter.port)
+            try:
+                return await coro_fn(kaco)
+            finally:
+                kaco.close()
+                inverter.close()
+        return asyncio.run(wrapper())
+
+    def testReadInverterAndParse(self):
+        async def read(kaco):
+            return await kaco.readInverterAndParse(1)
+
+        data = self.run_async(read)
+
+        self.assertEqual(data['status']['value'], 4)
+        self.assertEqual(data['u_dc']['value'], 585.9)
+        self.assertEqual(data['e_all']['value'], 44661.0)
+
+    def testTimeout(self):
+        async def read(kaco):
+            loop = asyncio.get_running_loop()
+            start = loop.time()
+            answer = await kaco.sendCmdAndRead('#050\r\n', timeout=0.1)
+            return answer, loop.time() - start
+
+        answer, elapsed = self.run_async(read)
+
+        self.assertEqual(answer, b'')
+        self.assertGreaterEqual(elapsed, 0.1)
+
+    def testConcurrentCommandsDoNotInterleave(self):
+        async def read(kaco):
+            return await asyncio.gather(
+                kaco.sendCmdAndRead('#010\r\n'),
+                kaco.sendCmdAndRead('#013\r\n'),
+            )
+
+        first, second = self.run_async(read)
+
+        self.assertTrue(first.startswith(answers[b'#010']))
+        self.assertTrue(second.startswith(answers[b'#013']))
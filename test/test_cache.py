@@ -0,0 +1,92 @@
+import unittest
+
+#set import path to ../ directory
+import sys
+import os.path
+libpath = os.path.abspath(os.path.join(os.path.dirname(__file__),  os.path.pardir))
+sys.path.append(libpath)
+
+from kacors485.kacors485 import KacoRS485
+from kacors485.cache import CommandCache
+from kacors485.simulator import BusSimulator, SimulatedInverter
+
+NOON = 12 * 3600.0
+
+
+class FakeClock(object):
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestCommandCache(unittest.TestCase):
+    def testTTL(self):
+        clock = FakeClock()
+        cache = CommandCache({3: 60}, clock=clock)
+
+        cache.put(1, 0, b'answer0')
+        cache.put(1, 3, b'')
+        self.assertIsNone(cache.get(1, 0))
+        self.assertIsNone(cache.get(1, 3))
+
+        cache.put(1, 3, b'answer3')
+        clock.now = 59
+        self.assertEqual(cache.get(1, 3), b'answer3')
+        self.assertEqual(cache.age(1, 3), 59)
+        self.assertIsNone(cache.get(2, 3))
+
+        clock.now = 60
+        self.assertIsNone(cache.get(1, 3))
+
+        cache.invalidate(1)
+        self.assertIsNone(cache.age(1, 3))
+
+    def testReadInverterSkipsCachedCommand(self):
+        clock = FakeClock()
+        bus = BusSimulator([SimulatedInverter(1, latency=0)], clock=lambda: NOON)
+        ser = bus.serial(timeScale=0)
+        sent = []
+        write = ser.write
+        ser.write = lambda data: sent.append(data) or write(data)
+
+        kaco = KacoRS485(ser)
+        kaco.cache = CommandCache({3: 60}, clock=clock)
+
+        first = kaco.readInverterAndParse(1)
+        clock.now = 30
+        second = kaco.readInverterAndParse(1)
+        clock.now = 61
+        kaco.readInverter(1)
+
+        self.assertEqual(sent, [b'#010\r\n', b'#013\r\n', b'#010\r\n', b'#010\r\n', b'#013\r\n'])
+        self.assertEqual(second['e_all']['value'], first['e_all']['value'])
+        self.assertEqual(second['e_all']['age'], 30)
+        self.assertNotIn('age', second['p_ac'])
+
+    def testFreshValuesWin(self):
+        clock = FakeClock()
+        now = [NOON]
+        bus = BusSimulator([SimulatedInverter(1, latency=0)], clock=lambda: now[0])
+        kaco = KacoRS485(bus.serial(timeScale=0))
+        kaco.cache = CommandCache({3: 600}, clock=clock)
+
+        first = kaco.readInverterAndParse(1)
+        now[0] = NOON + 3600
+        clock.now = 300
+        second = kaco.readInverterAndParse(1)
+        reading = kaco.readReading(1)
+        fresh = KacoRS485(bus.serial(timeScale=0)).readInverterAndParse(1)
+
+        #e_day is in both commands, the fresh command 0 has the newer value
+        self.assertGreater(second['e_day']['value'], first['e_day']['value'])
+        self.assertEqual(second['e_day']['value'], fresh['e_day']['value'])
+        self.assertEqual(reading.e_day, fresh['e_day']['value'])
+        self.assertNotIn('age', second['e_day'])
+        self.assertEqual(second['e_all']['value'], first['e_all']['value'])
+        self.assertEqual(second['e_all']['age'], 300)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,102 @@
+import unittest
+
+#set import path to ../ directory
+import sys
+import os.path
+import tempfile
+import threading
+import time
+libpath = os.path.abspath(os.path.join(os.path.dirname(__file__),  os.path.pardir))
+sys.path.append(libpath)
+
+from kacors485.kacors485 import KacoRS485
+from kacors485.capture import CaptureWriter, CaptureReader, ReplaySerial, CaptureRecord, AnswerSerial
+
+
+answer0 = b'n\xd6\xf6V\xeb\x00\n*010   4 585.9  0.88   515 230.0  2.04   460  14    377 x 8000xi\r\x00'
+answer3 = b'n\xd6\x96V\xeb\x00\n   883    377  44661  44661      0:47  25301:20  25301:20\x00'
+
+
+class TestCapture(unittest.TestCase):
+    def setUp(self):
+        fd, self.path = tempfile.mkstemp()
+        os.close(fd)
+        os.unlink(self.path)
+
+    def tearDown(self):
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+
+    def testWriteAndRead(self):
+        with CaptureWriter(self.path) as w:
+            w.write('/dev/ttyUSB0', '#010\r\n', answer0, 0.08, timestamp=1000.0)
+        #appending keeps one header
+        with CaptureWriter(self.path) as w:
+            w.write('/dev/ttyUSB0', '#013\r\n', b'', 0.5, timestamp=1001.0)
+
+        records = list(CaptureReader(self.path))
+
+        self.assertEqual(len(records), 2)
+        self.assertEqual(records[0].port, '/dev/ttyUSB0')
+        self.assertEqual(records[0].command, '#010\r\n')
+        self.assertEqual(records[0].answer, answer0)
+        self.assertAlmostEqual(records[0].latency, 0.08, places=5)
+        self.assertEqual(records[1].timestamp, 1001.0)
+        self.assertEqual(records[1].answer, b'')
+
+    def testThreads(self):
+        with CaptureWriter(self.path) as w:
+            def write(port):
+                for i in range(200):
+                    w.write(port, '#010\r\n', answer0, 0.01)
+            threads = [threading.Thread(target=write, args=('port{}'.format(i),)) for i in range(4)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+
+        records = list(CaptureReader(self.path))
+        self.assertEqual(len(records), 800)
+        self.assertTrue(all(r.answer == answer0 for r in records))
+
+    def testTruncatedFile(self):
+        with CaptureWriter(self.path) as w:
+            w.write('p', '#010\r\n', answer0, 0.1)
+            w.write('p', '#013\r\n', answer3, 0.1)
+        with open(self.path, 'rb+') as f:
+            f.truncate(os.path.getsize(self.path) - 3)
+
+        self.assertEqual(len(list(CaptureReader(self.path))), 1)
+
+    def testCaptureAndReplay(self):
+        records = [
+            CaptureRecord(1000.0, 'p', '#010\r\n', answer0, 0.05),
+            CaptureRecord(1000.1, 'p', '#013\r\n', answer3, 0.05),
+        ]
+
+        #replay through KacoRS485 and capture again
+        kaco = KacoRS485(ReplaySerial(records))
+        kaco.capture = CaptureWriter(self.path)
+        reading = kaco.readReading(1)
+        kaco.capture.close()
+
+        self.assertEqual(reading.u_dc, 585.9)
+        self.assertEqual(reading.e_all, 44661.0)
+        self.assertEqual([(r.command, r.answer) for r in CaptureReader(self.path)],
+                         [('#010\r\n', answer0), ('#013\r\n', answer3)])
+
+    def testReplayRealtime(self):
+        records = [CaptureRecord(1000.0, 'p', '#010\r\n', answer0, 0.1)]
+        kaco = KacoRS485(ReplaySerial(records, realtime=True))
+
+        start = time.monotonic()
+        answer = kaco.sendCmdAndRead('#010\r\n')
+
+        self.assertEqual(answer, answer0)
+        self.assertGreaterEqual(time.monotonic() - start, 0.1)
+        #no more recorded answers
+        self.assertEqual(kaco.sendCmdAndRead('#010\r\n', timeout=0.01), b'')
+
+    def testEmptyBus(self):
+        kaco = KacoRS485(AnswerSerial())
+        self.assertEqual(kaco.sendCmdAndRead('#010\r\n', timeout=0.01), b'')
@@ -0,0 +1,114 @@
+import unittest
+
+#set import path to ../ directory
+import sys
+import time
+import os.path
+libpath = os.path.abspath(os.path.join(os.path.dirname(__file__),  os.path.pardir))
+sys.path.append(libpath)
+
+from kacors485.collector import KacoCollector
+from kacors485.metrics import BusMetrics
+
+
+class FakeKaco(object):
+    """
+    every command keeps the bus busy for 0.05 seconds
+    """
+    def __init__(self, port):
+        self.port = port
+        self.closed = False
+
+    def sendCmdAndRead(self, cmd):
+        time.sleep(0.05)
+        if cmd.startswith('#01'):
+            return b'*010   4 585.9  0.88   515 230.0  2.04   460  14    377 x 8000xi\r'
+        return b''
+
+    def readInverterAndParse(self, address):
+        time.sleep(0.05)
+        if address == 1:
+            return {'port': self.port}
+        raise Exception('no answer')
+
+    def close(self):
+        self.closed = True
+
+
+class BrokenKaco(FakeKaco):
+    """
+    the usb adapter was reset, every command fails
+    """
+    def sendCmdAndRead(self, cmd):
+        raise OSError(5, 'Input/output error')
+
+
+class TestCollector(unittest.TestCase):
+    def testWildcardOpensAllPorts(self):
+        dir_path = os.path.dirname(os.path.realpath(__file__))
+        collector = KacoCollector(os.path.join(dir_path, 'ttyUSB*'), [1], kacoFactory=FakeKaco)
+
+        self.assertEqual(collector.ports, [os.path.join(dir_path, 'ttyUSB0.test')])
+
+    def testReadAllInParallel(self):
+        ports = ['/dev/a', '/dev/b', '/dev/c']
+        collector = KacoCollector(ports, [1, 2], kacoFactory=FakeKaco)
+
+        start = time.monotonic()
+        data = collector.readAll()
+        elapsed = time.monotonic() - start
+        collector.close()
+
+        #sequential would take 6 * 0.05 seconds
+        self.assertLess(elapsed, 0.25)
+        self.assertEqual(data[('/dev/b', 1)], {'port': '/dev/b'})
+        self.assertIsNone(data[('/dev/c', 2)])
+        self.assertEqual(len(data), 6)
+        self.assertEqual(collector.kacos, {})
+
+    def testCollect(self):
+        collector = KacoCollector(['/dev/a', '/dev/b'], {'/dev/a': [1], '/dev/b': [1, 2]},
+                                  intervals={0: 0.01}, kacoFactory=FakeKaco)
+        collector.start()
+
+        results = []
+        for item in collector.collect(timeout=1):
+            results.append(item)
+            if len(results) >= 6:
+                break
+        collector.close()
+
+        self.assertEqual(set(r[0] for r in results), set(['/dev/a', '/dev/b']))
+        self.assertTrue(all(r[2] == 0 for r in results))
+        self.assertEqual(collector.latest[('/dev/a', 1)]['status'], 4)
+        self.assertNotIn(('/dev/b', 2), collector.latest)
+        self.assertIsNotNone(collector.cycleTime())
+
+    def testBusErrorReopensPort(self):
+        opened = []
+
+        def factory(port):
+            opened.append(port)
+            return BrokenKaco(port) if len(opened) == 1 else FakeKaco(port)
+
+        collector = KacoCollector(['/dev/a'], [1], intervals={0: 0.01}, kacoFactory=factory)
+        collector.retryDelay = 0.01
+        metrics = BusMetrics()
+        collector.open()
+        collector.kacos['/dev/a'].metrics = metrics
+        broken = collector.kacos['/dev/a']
+        collector.start()
+
+        results = []
+        for item in collector.collect(timeout=1):
+            results.append(item)
+            break
+        collector.close()
+
+        self.assertEqual(results[0][:3], ('/dev/a', 1, 0))
+        self.assertEqual(len(opened), 2)
+        self.assertTrue(broken.closed)
+        self.assertEqual(collector.errors['/dev/a'], 1)
+        self.assertIn('Input/output error', collector.lastError['/dev/a'])
+        self.assertEqual(metrics.busErrors['/dev/a'], 1)
+        self.assertIn('kacors485_bus_errors_total{port="/dev/a"} 1', metrics.prometheus())
@@ -0,0 +1,84 @@
+import socket
+import unittest
+
+#set import path to ../ directory
+import sys
+import time
+import os.path
+import shutil
+import tempfile
+libpath = os.path.abspath(os.path.join(os.path.dirname(__file__),  os.path.pardir))
+sys.path.append(libpath)
+
+from kacors485.kacors485 import KacoRS485
+from kacors485.collector import KacoCollector
+from kacors485.daemon import KacoDaemon, KacoDaemonClient
+from kacors485.simulator import BusSimulator, SimulatedInverter
+
+NOON = 12 * 3600.0
+
+
+class TestDaemon(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.socketPath = os.path.join(self.directory, 'kacors485.sock')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def testServe(self):
+        bus = BusSimulator([SimulatedInverter(1, latency=0.005), SimulatedInverter(2, latency=0.005)],
+                           clock=lambda: NOON)
+        collector = KacoCollector('bus0', [1, 2], {0: 0.05, 3: 0.2},
+                                  kacoFactory=lambda port: KacoRS485(bus.serial()))
+
+        with KacoDaemon(collector, self.socketPath, historySize=5):
+            with KacoDaemonClient(self.socketPath) as client:
+                deadline = time.time() + 5
+                while len(client.latest()) < 2 or 'e_all' not in (client.latest(2) or {}):
+                    self.assertLess(time.time(), deadline)
+                    time.sleep(0.02)
+                time.sleep(0.3)
+
+                data = client.latest(2)
+                self.assertEqual(data['last_command_sent'][-3:], '020')
+                self.assertIn('p_ac', data)
+                self.assertIn('e_all', data)
+
+                inverters = client.latest()
+                self.assertEqual([(i['port'], i['address']) for i in inverters], [('bus0', 1), ('bus0', 2)])
+
+                history = client.history(1)
+                self.assertEqual(len(history), 5)
+                self.assertEqual(client.history(1, since=history[-1]['timestamp']), history[-1:])
+
+                self.assertEqual(client.status()['ports'], ['bus0'])
+
+                with self.assertRaises(Exception):
+                    client.request(op='nothing')
+                #the connection is still usable after an error
+                self.assertIsNotNone(client.latest(1, port='bus0'))
+
+        self.assertFalse(os.path.exists(self.socketPath))
+
+    def testSocketInUse(self):
+        collector = KacoCollector('bus0', [1], {0: 0.05},
+                                  kacoFactory=lambda port: KacoRS485(BusSimulator([]).serial()))
+
+        #a running daemon keeps its socket
+        other = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        other.bind(self.socketPath)
+        other.listen(1)
+        with self.assertRaises(Exception):
+            KacoDaemon(collector, self.socketPath).start()
+        self.assertTrue(os.path.exists(self.socketPath))
+
+        #a stale socket is replaced
+        other.close()
+        with KacoDaemon(collector, self.socketPath):
+            with KacoDaemonClient(self.socketPath) as client:
+                self.assertEqual(client.status()['ports'], ['bus0'])
+
+
+if __name__ == '__main__':
+    unittest.main()
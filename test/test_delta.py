@@ -0,0 +1,81 @@
+import unittest
+
+#set import path to ../ directory
+import sys
+import os.path
+libpath = os.path.abspath(os.path.join(os.path.dirname(__file__),  os.path.pardir))
+sys.path.append(libpath)
+
+from kacors485.delta import DeltaFilter
+from kacors485.poller import KacoBusPoller
+from kacors485.simulator import BusSimulator, SimulatedInverter
+
+
+class TestDeltaFilter(unittest.TestCase):
+    def testDeadbandsAndSnapshots(self):
+        f = DeltaFilter({'p_ac': 50}, snapshotInterval=100)
+
+        out = f.update(1, 0, {'last_command_sent': '*010', 'p_ac': 1000.0, 'u_ac': 230.0, 'type': '8000xi'})
+        self.assertEqual(out, ({'p_ac': 1000.0, 'u_ac': 230.0, 'type': '8000xi'}, True))
+
+        #within deadbands
+        self.assertIsNone(f.update(1, 10, {'p_ac': 1040.0, 'u_ac': 230.5, 'type': '8000xi'}))
+        #drift is measured against the last sent value
+        self.assertEqual(f.update(1, 20, {'p_ac': 1060.0, 'u_ac': 230.5}), ({'p_ac': 1060.0}, False))
+        self.assertEqual(f.update(1, 30, {'type': '9600I'}), ({'type': '9600I'}, False))
+        self.assertIsNone(f.update(1, 40, None))
+
+        #other inverters have their own state
+        self.assertTrue(f.update(2, 40, {'p_ac': 5.0})[1])
+
+        out = f.update(1, 100, {'p_ac': 1061.0})
+        self.assertEqual(out, ({'p_ac': 1061.0, 'u_ac': 230.5, 'type': '9600I'}, True))
+
+
+class FakeClock(object):
+    def __init__(self):
+        self.now = 12 * 3600.0
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+
+class TestPollerDeltas(unittest.TestCase):
+    def testDeltas(self):
+        clock = FakeClock()
+        bus = BusSimulator([SimulatedInverter(1), SimulatedInverter(2)], clock=clock)
+        kaco = KacoRS485Fake(bus, clock)
+        poller = KacoBusPoller(kaco, [1, 2], {0: 10, 3: 60}, clock=clock, sleep=clock.sleep, timestamp=clock)
+
+        deltaFilter = DeltaFilter({'p_dc': 200, 'p_ac': 200, 'i_dc': 1, 'i_ac': 1, 'u_ac': 5, 'e_day': 100},
+                                  snapshotInterval=600)
+        out = list(poller.deltas(deltaFilter, duration=300))
+
+        snapshots = [o for o in out if o[3]]
+        self.assertEqual(sorted(o[0] for o in snapshots), [1, 2])
+        self.assertTrue(any('e_all' in o[2] for o in out if o[0] == 1))
+        self.assertTrue([o for o in out if not o[3]])
+        self.assertTrue(all('last_command_sent' not in o[2] for o in out))
+
+        #about 8 fields per answer without the filter
+        sentFields = sum(len(o[2]) for o in out)
+        self.assertLess(sentFields, kaco.commands * 8 / 2)
+
+
+class KacoRS485Fake(object):
+    """
+    answers from the simulator, every command takes 0.1 seconds
+    """
+    def __init__(self, bus, clock):
+        self.bus = bus
+        self.clock = clock
+        self.commands = 0
+
+    def sendCmdAndRead(self, cmd):
+        self.commands += 1
+        self.clock.now += 0.1
+        answer = self.bus.answer(cmd)
+        return answer[0] if answer else b''
@@ -0,0 +1,114 @@
+import unittest
+
+#set import path to ../ directory
+import sys
+import os.path
+import shutil
+import tempfile
+libpath = os.path.abspath(os.path.join(os.path.dirname(__file__),  os.path.pardir))
+sys.path.append(libpath)
+
+from kacors485.kacors485 import KacoRS485
+from kacors485.discovery import AddressMap, BusScanner
+from kacors485.poller import KacoBusPoller
+from kacors485.simulator import BusSimulator, SimulatedInverter
+
+NOON = 12 * 3600.0
+
+
+class TestBusScanner(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'bus.json')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def kaco(self):
+        bus = BusSimulator([SimulatedInverter(3, latency=0.005),
+                            SimulatedInverter(7, latency=0.005, type='5000xi'),
+                            SimulatedInverter(9, latency=0.03)], clock=lambda: NOON)
+        return KacoRS485(bus.serial())
+
+    def testScan(self):
+        kaco = self.kaco()
+        scanner = BusScanner(kaco, AddressMap(self.path), addresses=range(1, 11))
+        scanner.scanTimeouts = (0.02, 0.08)
+
+        found = scanner.scan()
+
+        #9 is too slow for the first pass
+        self.assertEqual(sorted(found), [3, 7, 9])
+        self.assertEqual(found[7]['type'], '5000xi')
+        self.assertLess(found[3]['latency'], 0.02)
+
+        #a later start knows the map and does not scan
+        addressMap = AddressMap(self.path)
+        self.assertEqual(addressMap.addresses(), [3, 7, 9])
+        sent = []
+        kaco.sendCmdAndRead = lambda cmd, timeout=None: sent.append(cmd) or b''
+        self.assertEqual(BusScanner(kaco, addressMap).addresses(), [3, 7, 9])
+        self.assertEqual(sent, [])
+
+    def testPollerFindsInverters(self):
+        kaco = self.kaco()
+        scanner = BusScanner(kaco, AddressMap(self.path), addresses=range(1, 9))
+        scanner.probeTimeout = 0.02
+
+        poller = KacoBusPoller(kaco, [3], {0: 0.3}, scanner=scanner)
+        results = list(poller.poll(0.6))
+
+        self.assertEqual(sorted(poller.intervals), [3, 7])
+        self.assertIn((7, 0), [(a, c) for a, c, data in results if data is not None])
+        #the given address is kept as well
+        self.assertEqual(AddressMap(self.path).addresses(), [3, 7])
+        #every other address was probed once
+        self.assertEqual(sorted(scanner.lastProbe), [1, 2, 4, 5, 6, 7, 8])
+
+    def testPollerWithoutInverters(self):
+        kaco = self.kaco()
+        clock = [NOON]
+        sleeps = []
+
+        def sleep(seconds):
+            sleeps.append(seconds)
+            clock[0] += seconds
+
+        scanner = BusScanner(kaco, AddressMap(self.path), addresses=[1, 2], clock=lambda: clock[0])
+        poller = KacoBusPoller(kaco, [], {0: 10}, clock=lambda: clock[0], sleep=sleep, scanner=scanner)
+
+        #nothing answers: both addresses are probed, then again after rescanInterval
+        probes = []
+        scanner.probe = lambda address, timeout=None: probes.append(address)
+        poller._waitForInverter()
+        poller._waitForInverter()
+        poller._waitForInverter()
+        self.assertEqual(probes, [1, 2])
+        self.assertEqual(sleeps, [scanner.rescanInterval])
+
+        #an inverter appears and is polled
+        del scanner.probe
+        scanner.candidates = [3]
+        self.assertEqual(poller.step()[:2], (3, 0))
+        self.assertEqual(sorted(poller.intervals), [3])
+
+    def testProbeErrorKeepsTask(self):
+        kaco = self.kaco()
+        scanner = BusScanner(kaco, AddressMap(self.path), addresses=range(1, 9))
+        scanner.probeTimeout = 0.02
+        poller = KacoBusPoller(kaco, [3], {0: 0.3}, scanner=scanner)
+        poller.step()
+
+        def broken(exclude=()):
+            raise IOError('bus gone')
+        scanner.probeNext = broken
+        with self.assertRaises(IOError):
+            poller.step()
+        self.assertEqual([(a, c) for due, seq, a, c in poller._queue], [(3, 0)])
+
+        del scanner.probeNext
+        self.assertEqual(poller.step()[:2], (3, 0))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,68 @@
+import unittest
+
+#set import path to ../ directory
+import sys
+import os.path
+libpath = os.path.abspath(os.path.join(os.path.dirname(__file__),  os.path.pardir))
+sys.path.append(libpath)
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+from kacors485.fleet import FleetBuffer
+from kacors485.reading import InverterReading
+from kacors485.simulator import SimulatedInverter
+
+NOON = 12 * 3600.0
+
+
+@unittest.skipUnless(numpy, 'needs numpy')
+class TestFleetBuffer(unittest.TestCase):
+    def fleet(self, cycles=3):
+        fleet = FleetBuffer(range(1, 11), cycles=cycles)
+        inverters = [SimulatedInverter(a) for a in range(1, 11)]
+        for i in range(cycles + 2):
+            readings = {}
+            for inverter in inverters:
+                readings[inverter.address] = inverter.values(NOON + i * 10)
+            fleet.addCycle(NOON + i * 10, readings)
+        return fleet
+
+    def testRingBuffer(self):
+        fleet = self.fleet(3)
+
+        self.assertEqual(fleet.window('p_ac').shape, (3, 10))
+        self.assertEqual(list(fleet.timestamps[fleet._rows(None)]), [NOON + 20, NOON + 30, NOON + 40])
+        self.assertEqual(fleet.window('p_ac', 1).shape, (1, 10))
+        self.assertTrue((fleet.latest('status') == 5).all())
+
+        #missing inverters are nan in their cycle
+        fleet.addCycle(NOON + 50, {1: InverterReading(address=1, timestamp=NOON + 50, p_ac=10.0), 2: None})
+        self.assertEqual(fleet.latest('p_ac')[0], 10.0)
+        self.assertTrue(numpy.isnan(fleet.latest('p_ac')[1:]).all())
+
+    def testChecks(self):
+        fleet = self.fleet(3)
+        fleet.set(4, {'u_dc': 300.0, 'status': 11})
+        fleet.set(7, {'status': {'name': 'status', 'value': 10}, 'p_ac': 0.0})
+
+        checks = fleet.check()
+
+        self.assertEqual(list(checks['addresses'][checks['u_dc_outlier']]), [4])
+        self.assertFalse(checks['i_dc_outlier'].any())
+        self.assertEqual(list(checks['addresses'][checks['derating']]), [4])
+        self.assertEqual(list(checks['addresses'][checks['over_temperature']]), [7])
+        self.assertAlmostEqual(checks['efficiency'][0], 0.95)
+        self.assertEqual(checks['efficiency'][6], 0.0)
+
+        #over more cycles the status is still seen, the efficiency recovers
+        fleet.addCycle(NOON + 100, {7: {'status': 5, 'p_ac': 950.0, 'p_dc': 1000.0}})
+        checks = fleet.check(cycles=2)
+        self.assertTrue(checks['over_temperature'][6])
+        self.assertAlmostEqual(checks['efficiency'][6], 950.0 / (1000.0 + fleet.window('p_dc', 2)[0, 6]))
+
+
+if __name__ == '__main__':
+    unittest.main()
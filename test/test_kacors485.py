@@ -3,6 +3,7 @@ import unittest
 #set import path to ../ directory
 import sys
 import json
+import time
 import os.path
 libpath = os.path.abspath(os.path.join(os.path.dirname(__file__),  os.path.pardir))
 sys.path.append(libpath)
@@ -16,6 +17,26 @@ except ImportError:
 
 import serial
 
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+import random
+
+from kacors485.simulator import SimulatedInverter, checksum
+
+
+def frameWithChecksum(value):
+    """
+    answer to command 0 whose checksum byte is value
+    """
+    for pad in range(8):
+        for e_day in range(10000, 100000, 7):
+            line = '*010 {}  5 570.0 13.99  7976 229.5 33.01  7577  55  {:5d} '.format(' ' * pad, e_day).encode()
+            if checksum(line) == value:
+                return b'\n' + line + value + b' 8000xi\r'
+
 class TestSerialMethods(unittest.TestCase):
     def setUp(self):
         pass
@@ -69,27 +90,71 @@ class TestSerialMethods(unittest.TestCase):
         self.first_call = True
 
         instance = mock_serial.return_value
-        instance.inWaiting.side_effect = self.side_effect_1_and_then_0
-        instance.readline.return_value = 'answer'
+        instance.inWaiting.side_effect = self.side_effect_6_and_then_0
+        instance.read.return_value = b'answer'
+        self.readintoFromRead(instance)
+
+        read = k.sendCmdAndRead('question', timeout=0.05)
+
+        instance.reset_input_buffer.assert_called_once_with()
+        instance.write.assert_called_once_with(b'question')
+
+        self.assertEqual(b'answer',read)
+
+    @mock.patch('serial.Serial', spec=serial.Serial)
+    def testSendCmdAndRead_CompleteFrame(self,mock_serial):
+        k = KacoRS485('/dev/ttyUSB0')
+
+        chunks = [
+            b'n\xd6\xf6V\xeb\x00\n*010   4 585.9  0.88   515',
+            b' 230.0  2.04   460  14    377 x 8000xi\r\x00',
+        ]
+
+        instance = mock_serial.return_value
+        instance.inWaiting.side_effect = lambda: len(chunks[0]) if chunks else 0
+        instance.read.side_effect = lambda n: chunks.pop(0)
+        self.readintoFromRead(instance)
+
+        #would block for a minute if the frame end is not detected
+        start = time.monotonic()
+        read = k.sendCmdAndRead('#010\r\n', timeout=60)
 
-        read = k.sendCmdAndRead('question')
+        self.assertLess(time.monotonic() - start, 1)
+        self.assertEqual(read, b'n\xd6\xf6V\xeb\x00\n*010   4 585.9  0.88   515'
+                               b' 230.0  2.04   460  14    377 x 8000xi\r\x00')
 
-        instance.write.assert_called_once_with('question')
+    @mock.patch('serial.Serial', spec=serial.Serial)
+    def testSendCmdAndRead_Timeout(self,mock_serial):
+        k = KacoRS485('/dev/ttyUSB0')
+
+        instance = mock_serial.return_value
+        instance.inWaiting.return_value = 0
+
+        start = time.monotonic()
+        read = k.sendCmdAndRead('#010\r\n', timeout=0.05)
 
-        self.assertEqual('answer',read)
+        self.assertGreaterEqual(time.monotonic() - start, 0.05)
+        self.assertEqual(read, b'')
 
-    def side_effect_1_and_then_0(self):
+    def side_effect_6_and_then_0(self):
         """
         side effect
-        on first call return 1
+        on first call return 6, the length of b'answer'
         on other calls return 0
         """
         if self.first_call:
             self.first_call = False
-            return 1
+            return 6
 
         return 0
 
+    def readintoFromRead(self, instance):
+        """
+        let the mocked readinto copy what the mocked read returns,
+        like serial.Serial does
+        """
+        instance.readinto.side_effect = lambda b: serial.serialutil.SerialBase.readinto(instance, b)
+
     @mock.patch('serial.Serial', spec=serial.Serial)
     def testReadInverter(self,mock_serial):
         with self.assertRaises(Exception):
@@ -101,24 +166,58 @@ class TestSerialMethods(unittest.TestCase):
         self.first_call = True
 
         instance = mock_serial.return_value
-        instance.inWaiting.side_effect = self.side_effect_1_and_then_0
-        instance.readline.return_value = 'answer'
+        instance.inWaiting.side_effect = self.side_effect_6_and_then_0
+        instance.read.return_value = b'answer'
+        self.readintoFromRead(instance)
+        k.waitBeforeRead = 0.05
 
         nr = 2
         read = k.readInverter(nr)
 
         expected_calls = [
-                    mock.call('#0'+str(nr)+'0\r\n'),
-                    #mock.call('#0'+str(nr)+'2\r\n'),
-                    mock.call('#0'+str(nr)+'3\r\n'),
+                    mock.call(b'#0'+str(nr).encode()+b'0\r\n'),
+                    #mock.call(b'#0'+str(nr).encode()+b'2\r\n'),
+                    mock.call(b'#0'+str(nr).encode()+b'3\r\n'),
                 ]
 
         self.assertEqual(instance.write.mock_calls, expected_calls)
 
         #we only send once answer back
-        expected_answer = {'#020\r\n': 'answer', '#023\r\n': ''}
+        expected_answer = {'#020\r\n': b'answer', '#023\r\n': b''}
         self.assertEqual(read,expected_answer)
 
+    @mock.patch('serial.Serial', spec=serial.Serial)
+    def testSendCmdAndRead_GrowsBuffer(self,mock_serial):
+        k = KacoRS485('/dev/ttyUSB0')
+        k.buffer = bytearray(8)
+
+        chunks = [b'\n*010   4 585.9  0.88   515', b' 230.0  2.04   460  14    377 x 8000xi\r']
+
+        instance = mock_serial.return_value
+        instance.inWaiting.side_effect = lambda: len(chunks[0]) if chunks else 0
+        instance.read.side_effect = lambda n: chunks.pop(0)
+        self.readintoFromRead(instance)
+
+        read = k.sendCmdAndRead('#010\r\n', timeout=60)
+
+        self.assertEqual(read, b'\n*010   4 585.9  0.88   515 230.0  2.04   460  14    377 x 8000xi\r')
+        #the buffer is reused by the next command
+        self.assertGreaterEqual(len(k.buffer), len(read))
+
+    @mock.patch('serial.Serial', spec=serial.Serial)
+    def testReadInverter_NoAnswer(self,mock_serial):
+        k = KacoRS485('/dev/ttyUSB0')
+
+        instance = mock_serial.return_value
+        instance.inWaiting.return_value = 0
+        k.waitBeforeRead = 0.01
+
+        read = k.readInverter(2)
+
+        #no answer to command 0, command 3 is not sent
+        instance.write.assert_called_once_with(b'#020\r\n')
+        self.assertEqual(read, {'#020\r\n': b''})
+
 class TestParserMethods(unittest.TestCase):
     maxDiff = None
 
@@ -189,10 +288,150 @@ class TestParserMethods(unittest.TestCase):
                 # assert it can be json encoded
                 json.dumps(answer_list)
 
-                self.assertEqual(sorted(item[2]), sorted(answer_list))
+                self.assertEqual(item[2], answer_list)
             except Exception as e:
                 if item[2] is False:
                     # we do not except an answer but exception
                     pass
                 else:
                     raise
+
+    def test_parse_bytes(self):
+        p = KacoRS485Parser()
+
+        answer = p.parse(b'n\xd6\xf6V\xeb\x00\n*010   4 585.9  0.88   515 230.0  2.04   460  14    377 x 8000xi\r\x00', '#010\r\n')
+
+        self.assertEqual(self.answer_to_list(answer),
+            ['nV*010', 4, 585.9, 0.88, 515.0, 230.0, 2.04, 460.0, 14.0, 377.0, 'x', '8000xi'])
+
+    def test_frameEnd(self):
+        #garbage before the line feed must not end the frame
+        self.assertEqual(KacoRS485Parser.frameEnd(b'n\xd6\xf6V\xeb\x00\n*010   4 585.9', '#010\r\n'), -1)
+
+        frame = b'n\xd6\x96V\xeb\x00\n   883    377  44661  44661      0:47  25301:20  25301:20\x00'
+        self.assertEqual(KacoRS485Parser.frameEnd(frame + b'\r\n', '#013\r\n'), len(frame))
+
+        frame = b'*010\t4\t585.9\t10.17\t5958\t229.5\t24.90\t5720\t36\t17614\t9600I dx\r'
+        self.assertEqual(KacoRS485Parser.frameEnd(frame, '#010\r\n'), len(frame))
+
+        #only the new part of a buffer is searched
+        buf = bytearray(frame) + bytearray(10)
+        self.assertEqual(KacoRS485Parser.frameEnd(buf, '#010\r\n', 20, len(frame)), len(frame))
+        self.assertEqual(KacoRS485Parser.frameEnd(buf, '#010\r\n', 0, len(frame) - 1), -1)
+
+    def test_decode(self):
+        p = KacoRS485Parser()
+
+        #command echo missing
+        decoded = p.decode(b'\n   883    377  44661  44661      0:47  25301:20  25301:20\x00', '#013\r\n')
+
+        self.assertEqual(decoded, {
+            'p_top': 883.0, 'e_day': 377.0, 'no_idea': '44661', 'e_all': 44661.0,
+            'run_today': '0:47', 'run_all': '25301:20', 'run_all_again': '25301:20'})
+
+        decoded = p.decode(b'*010 4 585.9 10.17 5958 229.5 24.90 5720 36 17614 9600I dx\r', '#010\r\n')
+        self.assertEqual(decoded['status'], 4)
+        self.assertEqual(decoded['type'], 'dx')
+
+        with self.assertRaises(Exception):
+            p.decode(b'*010 4 585.9\r', '#010\r\n')
+
+    def test_parse_does_not_touch_mapping(self):
+        p = KacoRS485Parser()
+
+        p.parse('*013 2286 4184 42 581 8:46 11:04 11:04', '#013\r\n')
+
+        for template in KacoRS485Parser.mapping.values():
+            for item in template.values():
+                self.assertNotIn('value', item)
+
+    @unittest.skipUnless(numpy, 'needs numpy')
+    def test_parse_many(self):
+        p = KacoRS485Parser()
+
+        for command in ('#010\r\n', '#013\r\n'):
+            lines = [item[1] for item in self.test_lines if item[0] == command]
+            frames = [line.encode('latin-1') for line in lines] + [b'*010 4 5x5 1 1 1 1 1 1 1 x y',
+                #bytes which split() does not take as whitespace
+                b'*010   4 585.9\x1c0.88   515 230.0  2.04   460  14    377 x 8000xi\r',
+                b'*010   4 585.9  0.88   515\x1f230.0  2.04   460  14    377 x 8000xi\r']
+
+            columns = p.parse_many(frames, command)
+
+            self.assertEqual(len(columns['valid']), len(frames))
+            for i, frame in enumerate(frames):
+                try:
+                    decoded = p.decode(frame, command)
+                except Exception:
+                    decoded = {}
+                #both accept or both reject a frame
+                self.assertEqual(bool(columns['valid'][i]), bool(decoded), frame)
+                if not decoded:
+                    continue
+                for name in columns:
+                    if name != 'valid':
+                        self.assertEqual(columns[name][i], decoded[name])
+
+        columns = p.parse_many(b'*010 4 585.9 10.17 5958 229.5 24.90 5720 36 17614 9600I dx\r\n\n', 0)
+        self.assertEqual(list(columns['valid']), [True, False])
+        self.assertEqual(columns['status'][0], 4)
+        self.assertEqual(columns['p_ac'][0], 5720.0)
+
+    @unittest.skipUnless(numpy, 'needs numpy')
+    def test_parse_many_checksum_like_whitespace(self):
+        p = KacoRS485Parser()
+        frames = [frameWithChecksum(value) for value in (b' ', b'\r', b'\x00', b'\x0b', b'\n', b'x')]
+
+        columns = p.parse_many(frames, '#010\r\n')
+
+        self.assertTrue(columns['valid'].all())
+        for i, frame in enumerate(frames):
+            decoded = p.decode(frame, '#010\r\n')
+            self.assertEqual(columns['e_day'][i], decoded['e_day'])
+            self.assertEqual(columns['status'][i], 5)
+
+    @unittest.skipUnless(numpy, 'needs numpy')
+    def test_parse_many_agrees_with_decode(self):
+        p = KacoRS485Parser()
+        rng = random.Random(1)
+        inverter = SimulatedInverter(1)
+        for command in (0, 3):
+            cmd = '#01{}\r\n'.format(command)
+            frames = []
+            for i in range(500):
+                frame = bytearray(inverter.frame(command, 8 * 3600 + rng.random() * 8 * 3600))
+                #some clean, some with broken bytes
+                for k in range(rng.randint(0, 2)):
+                    frame[rng.randrange(len(frame))] = rng.randrange(256)
+                frames.append(bytes(frame))
+
+            columns = p.parse_many(frames, cmd)
+
+            for i, frame in enumerate(frames):
+                try:
+                    decoded = p.decode(frame, cmd)
+                except Exception:
+                    decoded = {}
+                self.assertEqual(bool(columns['valid'][i]), bool(decoded), frame)
+                for name in columns:
+                    if name != 'valid' and decoded:
+                        value = decoded[name]
+                        if value == value:
+                            self.assertEqual(columns[name][i], value, frame)
+                        else:
+                            self.assertTrue(numpy.isnan(columns[name][i]))
+
+    def test_subclass_mapping(self):
+        class RenamedParser(KacoRS485Parser):
+            mapping = {0: KacoRS485Parser.mapping[0], 3: dict(KacoRS485Parser.mapping[3])}
+            mapping[3][3] = dict(mapping[3][3], name='e_day_again')
+
+        answer = b'*013   883    377  44661  44661      0:47  25301:20  25301:20\x00'
+        #the base class compiled its layouts first
+        self.assertIn('no_idea', KacoRS485Parser().decode(answer, '#013\r\n'))
+
+        decoded = RenamedParser().decode(answer, '#013\r\n')
+
+        self.assertIn('e_day_again', decoded)
+        self.assertNotIn('no_idea', decoded)
+        self.assertIn('no_idea', KacoRS485Parser().decode(answer, '#013\r\n'))
@@ -0,0 +1,57 @@
+import unittest
+
+#set import path to ../ directory
+import sys
+import os.path
+libpath = os.path.abspath(os.path.join(os.path.dirname(__file__),  os.path.pardir))
+sys.path.append(libpath)
+
+from kacors485.kacors485 import KacoRS485, KacoRS485Parser
+from kacors485.metrics import BusMetrics, Histogram, splitCommand
+from kacors485.simulator import BusSimulator, SimulatedInverter
+
+NOON = 12 * 3600.0
+
+
+class TestMetrics(unittest.TestCase):
+    def testSplitCommand(self):
+        self.assertEqual(splitCommand('#070\r\n'), (7, 0))
+        self.assertEqual(splitCommand('#123\r\n'), (12, 3))
+        self.assertEqual(splitCommand('question'), (None, None))
+
+    def testHistogram(self):
+        h = Histogram((0.1, 0.5))
+        for value in (0.05, 0.1, 0.3, 2):
+            h.observe(value)
+
+        self.assertEqual(h.cumulative(), [(0.1, 2), (0.5, 3), ('+Inf', 4)])
+        self.assertEqual(h.count, 4)
+        self.assertAlmostEqual(h.sum, 2.45)
+
+    def testBusMetrics(self):
+        bus = BusSimulator([SimulatedInverter(1, latency=0.02, echo3=False)], clock=lambda: NOON)
+        kaco = KacoRS485(bus.serial())
+        kaco.metrics = metrics = BusMetrics()
+        kaco.waitBeforeRead = 0.05
+
+        kaco.readInverterAndParse(1)
+        kaco.sendCmdAndRead('#020\r\n')
+
+        self.assertEqual(metrics.counter('commands'), 3)
+        self.assertEqual(metrics.counter('commands', address=1, command=3), 1)
+        self.assertEqual(metrics.counter('timeouts'), 1)
+        self.assertEqual(metrics.counter('timeouts', address=2), 1)
+        self.assertEqual(metrics.counter('command_echo_missing', address=1), 1)
+        self.assertGreater(metrics.counter('bytes_read', address=1), 100)
+        self.assertEqual(metrics.histogram('frame_seconds', 1).count, 2)
+        self.assertGreaterEqual(metrics.histogram('first_byte_seconds', 1).sum, 0.04)
+        self.assertIsNone(metrics.histogram('first_byte_seconds', 2))
+
+        with self.assertRaises(Exception):
+            KacoRS485Parser(metrics).decode(b'*010 4 585.9\r', '#010\r\n')
+        self.assertEqual(metrics.counter('parse_failures', address=1, command=0), 1)
+
+        text = metrics.prometheus()
+        self.assertIn('kacors485_timeouts_total{address="2",command="0"} 1\n', text)
+        self.assertIn('kacors485_frame_seconds_count{address="1"} 2\n', text)
+        self.assertIn('kacors485_frame_seconds_bucket{address="1",le="+Inf"} 2\n', text)
@@ -0,0 +1,167 @@
+import unittest
+
+#set import path to ../ directory
+import sys
+import os.path
+libpath = os.path.abspath(os.path.join(os.path.dirname(__file__),  os.path.pardir))
+sys.path.append(libpath)
+
+from kacors485.poller import KacoBusPoller, AWAKE, SLEEPING, UNREACHABLE
+
+try:
+    from unittest import mock
+except ImportError:
+    import mock
+
+
+answers = {
+    '#010\r\n': b'*010   4 585.9  0.88   515 230.0  2.04   460  14    377 x 8000xi\r',
+    '#013\r\n': b'*013   883    377  44661  44661      0:47  25301:20  25301:20\x00',
+    '#020\r\n': b'*020   4 585.9  0.88   515 230.0  2.04   460  14    377 x 8000xi\r',
+    '#023\r\n': b'',
+    '#030\r\n': b'',
+    '#033\r\n': b'',
+    '#040\r\n': b'*040  15   0.0  0.00     0 230.0  0.00     0  14    377 x 8000xi\r',
+    '#043\r\n': b'*043   883    377  44661  44661      0:47  25301:20  25301:20\x00',
+    #garbage instead of an answer while asleep
+    '#050\r\n': b'nv\x96V\xeb\x00',
+    '#053\r\n': b'',
+}
+
+
+class FakeClock(object):
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+
+class TestBusPoller(unittest.TestCase):
+    def setUp(self):
+        self.clock = FakeClock()
+        self.kaco = mock.Mock()
+        self.kaco.sendCmdAndRead.side_effect = self.send
+
+    def send(self, cmd):
+        #every command takes 0.1 seconds on the bus
+        self.clock.now += 0.1
+        return answers[cmd]
+
+    def makePoller(self, addresses=[1, 2], intervals={0: 1, 3: 10}):
+        return KacoBusPoller(self.kaco, addresses, intervals,
+                             clock=self.clock, sleep=self.clock.sleep, timestamp=self.clock)
+
+    def testInvalidAddress(self):
+        with self.assertRaises(Exception):
+            self.makePoller([0])
+        with self.assertRaises(Exception):
+            self.makePoller([33])
+
+    def testBackToBack(self):
+        poller = self.makePoller()
+
+        results = [poller.step() for i in range(4)]
+
+        #all commands are due at start, so they run without pause
+        self.assertEqual([r[:2] for r in results], [(1, 0), (1, 3), (2, 0), (2, 3)])
+        self.assertAlmostEqual(self.clock.now, 0.4)
+        self.assertAlmostEqual(poller.cycleTime, 0.4)
+        self.assertAlmostEqual(poller.utilisation(), 1.0)
+
+        self.assertEqual(results[0][2]['status'], 4)
+        self.assertEqual(results[1][2]['e_all'], 44661.0)
+        self.assertIsNone(results[3][2])
+        self.assertEqual(poller.failures[(2, 3)], 1)
+
+    def testIntervals(self):
+        poller = self.makePoller(intervals={0: 1, 3: 10, 2: {0: 5}})
+
+        sent = [poller.step()[:2] for i in range(7)]
+
+        self.assertEqual(sent, [(1, 0), (1, 3), (2, 0), (1, 0), (1, 0), (1, 0), (1, 0)])
+        self.assertAlmostEqual(self.clock.now, 4.1)
+
+    def testStaleness(self):
+        poller = self.makePoller()
+
+        self.assertIsNone(poller.staleness(1))
+        for i in range(4):
+            poller.step()
+
+        self.clock.now += 2
+        self.assertAlmostEqual(poller.staleness(1, 0), 2.3)
+        self.assertAlmostEqual(poller.staleness(1), 2.3)
+        self.assertIsNone(poller.staleness(2))
+        self.assertEqual(set(poller.stalenessAll()), set([1, 2]))
+
+        self.assertEqual(poller.results[(2, 0)][1]['last_command_sent'], '*020')
+        reading = poller.reading(1)
+        self.assertEqual(reading.address, 1)
+        self.assertAlmostEqual(reading.timestamp, 0.2)
+        self.assertEqual(reading.p_top, 883.0)
+        self.assertEqual(reading.u_dc, 585.9)
+        self.assertIsNone(poller.reading(2).e_all)
+
+        #e_day of command 0 is newer than the one of command 3
+        poller.results[(1, 0)] = (5.0, dict(poller.results[(1, 0)][1], e_day=400.0))
+        self.assertEqual(poller.reading(1).e_day, 400.0)
+        self.assertEqual(poller.reading(1).timestamp, 5.0)
+
+    def testPollDuration(self):
+        poller = self.makePoller()
+
+        results = list(poller.poll(duration=3))
+
+        self.assertGreaterEqual(self.clock.now, 3)
+        self.assertEqual(len([r for r in results if r[:2] == (1, 0)]), 4)
+
+    def testSleepingAndUnreachable(self):
+        poller = self.makePoller(addresses=[1, 2, 3, 4], intervals={0: 1, 3: 10})
+
+        sent = [poller.step()[:2] for i in range(40)]
+
+        #missing command 3 does not make inverter 2 unreachable
+        self.assertEqual(poller.states[2], AWAKE)
+        self.assertEqual(poller.states[3], UNREACHABLE)
+        self.assertEqual(poller.states[4], SLEEPING)
+
+        #only command 0 probes, with growing intervals
+        self.assertEqual(sent.count((4, 3)), 0)
+        self.assertEqual(sent.count((3, 3)), 1)
+        self.assertLessEqual(sent.count((4, 0)), 6)
+        self.assertGreaterEqual(poller.backoff[4], 8)
+        self.assertGreater(sent.count((1, 0)), 10)
+
+        #inverter 4 wakes up: both commands are sent again
+        answers['#040\r\n'] = answers['#010\r\n']
+        try:
+            self.clock.now += poller.backoff[4]
+            sent = [poller.step()[:2] for i in range(40)]
+        finally:
+            answers['#040\r\n'] = b'*040  15   0.0  0.00     0 230.0  0.00     0  14    377 x 8000xi\r'
+
+        self.assertEqual(poller.states[4], AWAKE)
+        self.assertIn((4, 3), sent)
+        self.assertGreater(sent.count((4, 0)), 5)
+
+    def testGarbageWhileAsleep(self):
+        poller = self.makePoller(addresses=[1, 5], intervals={0: 1, 3: 2})
+
+        sent = [poller.step()[:2] for i in range(40)]
+
+        self.assertEqual(poller.states[5], UNREACHABLE)
+        self.assertEqual(sent.count((5, 3)), 1)
+        self.assertLessEqual(sent.count((5, 0)), 6)
+
+        #parked commands do not hold up the cycle
+        self.assertIsNotNone(poller.cycleTime)
+        self.assertNotIn((5, 3), poller._cyclePending)
+        cycles = set()
+        for i in range(20):
+            poller.step()
+            cycles.add(poller.cycleTime)
+        self.assertGreater(len(cycles), 1)
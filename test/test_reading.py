@@ -0,0 +1,65 @@
+import unittest
+
+#set import path to ../ directory
+import sys
+import os.path
+libpath = os.path.abspath(os.path.join(os.path.dirname(__file__),  os.path.pardir))
+sys.path.append(libpath)
+
+from kacors485.kacors485 import KacoRS485Parser
+from kacors485.reading import InverterReading, ReadingColumns
+
+
+answers = {
+    '#010\r\n': b'n\xd6\xf6V\xeb\x00\n*010   4 585.9  0.88   515 230.0  2.04   460  14    377 x 8000xi\r\x00',
+    '#013\r\n': b'n\xd6\x96V\xeb\x00\n   883    377  44661  44661      0:47  25301:20  25301:20\x00',
+}
+
+
+class TestReading(unittest.TestCase):
+    def testParseReading(self):
+        reading = KacoRS485Parser().parseReading(answers, 1, timestamp=1000.0)
+
+        self.assertEqual(reading.address, 1)
+        self.assertEqual(reading.timestamp, 1000.0)
+        self.assertEqual(reading.status, 4)
+        self.assertEqual(reading.p_ac, 460.0)
+        self.assertEqual(reading.type, '8000xi')
+        self.assertEqual(reading.e_all, 44661.0)
+        self.assertEqual(reading.run_all, '25301:20')
+
+        #no per instance dict
+        self.assertFalse(hasattr(reading, '__dict__'))
+
+    def testParseReadingOnlyCommand0(self):
+        reading = KacoRS485Parser().parseReading({'#010\r\n': answers['#010\r\n'], '#013\r\n': b''}, 1)
+
+        self.assertEqual(reading.u_dc, 585.9)
+        self.assertIsNone(reading.e_all)
+        self.assertNotIn('e_all', reading.asDict())
+
+        with self.assertRaises(Exception):
+            KacoRS485Parser().parseReading({'#010\r\n': b''}, 1)
+
+    def testSchema(self):
+        schema = KacoRS485Parser.schema()
+
+        self.assertEqual(schema['status'].command, 0)
+        self.assertEqual(schema['status'].convert_to, int)
+        self.assertEqual(schema['p_top'].command, 3)
+        self.assertIn('Spitzenleistung', schema['p_top'].description)
+        self.assertIn('u_dc', schema.numeric())
+        self.assertNotIn('type', schema.numeric())
+        self.assertEqual([f.name for f in schema.byCommand[3]][:2], ['last_command_sent', 'p_top'])
+
+    def testColumns(self):
+        columns = ReadingColumns()
+        first = KacoRS485Parser().parseReading(answers, 1, timestamp=1000.0)
+        second = InverterReading(address=2, timestamp=1010.0, p_ac=100.0, type='8000xi')
+        columns.extend([first, second])
+
+        self.assertEqual(len(columns), 2)
+        self.assertEqual(list(columns.column('p_ac')), [460.0, 100.0])
+        self.assertEqual(columns[0], first)
+        self.assertEqual(columns[1], second)
+        self.assertIs(columns.column('type')[0], columns.column('type')[1])
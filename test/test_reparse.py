@@ -0,0 +1,130 @@
+import json
+import unittest
+
+#set import path to ../ directory
+import sys
+import os.path
+import shutil
+import tempfile
+libpath = os.path.abspath(os.path.join(os.path.dirname(__file__),  os.path.pardir))
+sys.path.append(libpath)
+
+from kacors485.capture import CaptureWriter
+from kacors485.reparse import parseCapture, reparse
+from kacors485.simulator import SimulatedInverter
+from kacors485.store import ReadingStore, DAY
+
+NOON = 12 * 3600.0
+
+
+class TestReparse(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def capture(self, name, day, cycles, start=NOON, port='/dev/ttyUSB0'):
+        """
+        capture file of two inverters read every minute from start of day
+        """
+        path = os.path.join(self.directory, name)
+        inverters = [SimulatedInverter(1), SimulatedInverter(2, echo3=False)]
+        with CaptureWriter(path) as writer:
+            for i in range(cycles):
+                t = day * DAY + start + i * 60
+                for inverter in inverters:
+                    for command in (0, 3):
+                        cmd = '#{:02d}{}\r\n'.format(inverter.address, command)
+                        writer.write(port, cmd, inverter.frame(command, t), 0.05, t + command)
+                writer.write(port, '#030\r\n', b'', 0.7, t + 5)
+            writer.write(port, '#010\r\n', b'\n*010 broken\r', 0.05, t + 10)
+        return path
+
+    def testParseCapture(self):
+        readings, stats, ports = parseCapture(self.capture('a.cap', 10, 3))
+
+        self.assertEqual(stats, {'answers': 13, 'readings': 6, 'failures': 1})
+        self.assertEqual(ports, {'/dev/ttyUSB0'})
+        self.assertEqual([r.address for r in readings], [1, 2] * 3)
+        self.assertIsNotNone(readings[0].p_ac)
+        self.assertIsNotNone(readings[1].e_all)
+
+    def testReparseAndResume(self):
+        captures = [self.capture('b.cap', 11, 4), self.capture('a.cap', 10, 3)]
+        storeDirectory = os.path.join(self.directory, 'store')
+        checkpoint = os.path.join(self.directory, 'checkpoint.json')
+        seen = []
+
+        totals = reparse(captures, storeDirectory, workers=2, checkpoint=checkpoint,
+                         progress=lambda done, total, path, stats: seen.append((done, total, os.path.basename(path))))
+
+        self.assertEqual(seen, [(1, 2, 'a.cap'), (2, 2, 'b.cap')])
+        self.assertEqual(totals['stored'], 14)
+        data = ReadingStore(storeDirectory).query(2, 0, 20 * DAY, ['e_all'])
+        self.assertEqual(len(data['timestamp']), 7)
+
+        #nothing to do after a finished run
+        totals = reparse(captures, storeDirectory, workers=1, checkpoint=checkpoint)
+        self.assertEqual(totals['files'], 0)
+
+        #a store with readings is only taken to resume a run
+        with self.assertRaises(Exception):
+            reparse(captures, storeDirectory, workers=1)
+
+    def testResumeInterruptedFile(self):
+        captures = [self.capture('a.cap', 10, 3), self.capture('b.cap', 10, 3, start=NOON + 3600)]
+        storeDirectory = os.path.join(self.directory, 'store')
+        checkpoint = os.path.join(self.directory, 'checkpoint.json')
+
+        def interrupt(done, total, path, stats):
+            raise KeyboardInterrupt()
+
+        with self.assertRaises(KeyboardInterrupt):
+            reparse(captures, storeDirectory, workers=1, checkpoint=checkpoint, progress=interrupt)
+        #as if the run stopped while b.cap was written: a part of it is stored
+        with open(checkpoint) as f:
+            state = json.load(f)
+        state['current'] = {'capture': os.path.abspath(captures[1]),
+                            'segments': [[1, 10 * DAY, 3], [2, 10 * DAY, 3]]}
+        with open(checkpoint, 'w') as f:
+            json.dump(state, f)
+        with ReadingStore(storeDirectory) as store:
+            store.extend(parseCapture(captures[1])[0][:3])
+
+        totals = reparse(captures, storeDirectory, workers=1, checkpoint=checkpoint)
+
+        self.assertEqual((totals['files'], totals['stored'], totals['skipped']), (1, 6, 0))
+        for address in (1, 2):
+            data = ReadingStore(storeDirectory).query(address, 0, 20 * DAY, ['e_all'])
+            self.assertEqual(len(data['timestamp']), 6)
+            self.assertEqual(list(data['timestamp']), sorted(data['timestamp']))
+
+    def testPorts(self):
+        #two buses, each with an inverter 1
+        captures = [self.capture('a.cap', 10, 3), self.capture('b.cap', 10, 3, port='/dev/ttyUSB1')]
+
+        with self.assertRaises(Exception):
+            reparse(captures, os.path.join(self.directory, 'mixed'), workers=1)
+
+        storeDirectory = os.path.join(self.directory, 'usb1')
+        totals = reparse(captures, storeDirectory, workers=1, port='/dev/ttyUSB1')
+        self.assertEqual(totals['stored'], 6)
+        data = ReadingStore(storeDirectory).query(1, 0, 20 * DAY, ['e_all'])
+        self.assertEqual(len(data['timestamp']), 3)
+
+    def testCapturesInTimeOrder(self):
+        #names do not sort by time: the morning is in z.cap
+        captures = [self.capture('a.cap', 10, 3), self.capture('z.cap', 10, 3, start=NOON - 3600)]
+        storeDirectory = os.path.join(self.directory, 'store')
+        seen = []
+
+        totals = reparse(captures, storeDirectory, workers=1,
+                         progress=lambda done, total, path, stats: seen.append(os.path.basename(path)))
+
+        self.assertEqual(seen, ['z.cap', 'a.cap'])
+        self.assertEqual((totals['stored'], totals['skipped']), (12, 0))
+
+
+if __name__ == '__main__':
+    unittest.main()
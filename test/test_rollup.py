@@ -0,0 +1,111 @@
+import unittest
+
+#set import path to ../ directory
+import sys
+import json
+import os.path
+libpath = os.path.abspath(os.path.join(os.path.dirname(__file__),  os.path.pardir))
+sys.path.append(libpath)
+
+from kacors485.reading import InverterReading
+from kacors485.rollup import Rollup
+
+
+class TestRollup(unittest.TestCase):
+    def feed(self, rollup, start, samples):
+        #one sample every 10 seconds, 1000 W more every minute
+        for i in range(samples):
+            t = start + i * 10
+            rollup.add(1, t, {'p_ac': 1000.0 * (i // 6), 'temp': 20 + i % 6, 'e_day': 10.0 * i, 'e_all': 5000 + 0.01 * i})
+
+    def testWindows(self):
+        rollup = Rollup((60, 900))
+        self.feed(rollup, 3600, 100)
+
+        minutes = rollup.completed(1, 60)
+        self.assertEqual(len(minutes), 16)
+        self.assertEqual(minutes[0]['start'], 3600)
+        self.assertEqual(minutes[0]['end'], 3660)
+        self.assertEqual(minutes[2]['p_ac_avg'], 2000.0)
+        self.assertEqual((minutes[2]['temp_min'], minutes[2]['temp_max']), (20, 25))
+        #the first sample has no difference to build on
+        self.assertEqual(minutes[0]['e_day_wh'], 50.0)
+        self.assertEqual(minutes[1]['e_day_wh'], 60.0)
+        self.assertAlmostEqual(minutes[1]['e_all_wh'], 60.0)
+
+        quarters = rollup.completed(1, 900)
+        self.assertEqual(len(quarters), 1)
+        self.assertEqual(quarters[0]['samples'], 90)
+        self.assertEqual(rollup.latest(1, 900)['samples'], 10)
+        self.assertEqual(len(rollup.completed(1, 60, since=3600 + 600)), 6)
+
+    def testResetAndJumps(self):
+        rollup = Rollup((3600,))
+        rollup.add(1, 0, {'e_day': 30000.0, 'e_all': 100.0})
+        #next morning: e_day starts again
+        rollup.add(1, 3600 * 10, {'e_day': 20.0, 'e_all': 100.02})
+        #a glitch which would mean megawatts, and back
+        rollup.add(1, 3600 * 10 + 10, {'e_day': 90000.0, 'e_all': 100.03})
+        rollup.add(1, 3600 * 10 + 20, {'e_day': 30.0, 'e_all': 100.03})
+        rollup.add(1, 3600 * 10 + 30, {'e_day': 35.0, 'e_all': 90.0})
+
+        hour = rollup.latest(1, 3600)
+        self.assertEqual(hour['e_day_wh'], 20.0 + 10.0 + 5.0)
+        self.assertAlmostEqual(hour['e_all_wh'], 30.0)
+        self.assertEqual(hour['jumps'], 2)
+
+        #a counter which stays at a new value is followed
+        for i in range(4):
+            rollup.add(1, 3600 * 10 + 40 + 10 * i, {'e_all': 90.0 + 0.001 * i})
+        self.assertAlmostEqual(rollup.latest(1, 3600)['e_all_wh'], 30.0 + 2.0)
+
+    def testWholeKilowattHours(self):
+        rollup = Rollup((3600,))
+        #8 kW for an hour, e_all only counts whole kWh
+        for i in range(361):
+            t = 3600 + i * 10
+            rollup.add(1, t, {'e_all': 5000.0 + (8 * i * 10) // 3600})
+
+        hour = rollup.completed(1, 3600)[0]
+        self.assertEqual(hour['e_all_wh'], 7000.0)
+        self.assertEqual(hour['jumps'], 0)
+        self.assertEqual(rollup.latest(1, 3600)['e_all_wh'], 1000.0)
+
+        #a step soon after the first sample is a jump, but its energy is
+        #counted once it is plausible for the time since the last change
+        rollup = Rollup((3600,))
+        for i in range(6):
+            rollup.add(1, i * 20, {'e_all': 5000.0 if i == 0 else 5001.0})
+        hour = rollup.latest(1, 3600)
+        self.assertEqual(hour['e_all_wh'], 1000.0)
+        self.assertEqual(hour['jumps'], 1)
+
+    def testLastingJump(self):
+        rollup = Rollup((3600,))
+        #1 kWh, a jump by 40000 kWh which lasts, 1 kWh
+        values = [5000.0] * 10 + [5001.0] * 5 + [45001.0] * 15 + [45002.0] * 10
+        for i, value in enumerate(values):
+            rollup.add(1, i * 10, {'e_all': value})
+
+        hour = rollup.latest(1, 3600)
+        #the jump is followed without energy, the steps before and after are counted
+        self.assertEqual(hour['e_all_wh'], 2000.0)
+        self.assertEqual(hour['jumps'], 3)
+        self.assertEqual(rollup.counters[1]['e_all'][1], 45002.0)
+
+    def testInputsAndSnapshot(self):
+        rollup = Rollup((60,))
+        rollup.add(1, 0, InverterReading(address=1, timestamp=0, p_ac=100.0, temp=30.0))
+        rollup.add(1, 10, {'p_ac': {'name': 'p_ac', 'value': 300.0}})
+
+        restored = Rollup.restore(json.loads(json.dumps(rollup.snapshot())))
+        restored.add(1, 60, {'p_ac': 0.0})
+        rollup.add(1, 60, {'p_ac': 0.0})
+
+        self.assertEqual(restored.completed(1, 60), rollup.completed(1, 60))
+        self.assertEqual(restored.completed(1, 60)[0]['p_ac_avg'], 200.0)
+        self.assertEqual(restored.completed(1, 60)[0]['temp_max'], 30.0)
+
+
+if __name__ == '__main__':
+    unittest.main()
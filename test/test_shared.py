@@ -0,0 +1,110 @@
+import unittest
+
+#set import path to ../ directory
+import sys
+import threading
+import os.path
+libpath = os.path.abspath(os.path.join(os.path.dirname(__file__),  os.path.pardir))
+sys.path.append(libpath)
+
+from kacors485.kacors485 import KacoRS485
+from kacors485.shared import SharedKacoRS485
+from kacors485.simulator import BusSimulator, SimulatedInverter
+
+NOON = 12 * 3600.0
+
+
+class FakeClock(object):
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestSharedKacoRS485(unittest.TestCase):
+    def kaco(self, latency):
+        bus = BusSimulator([SimulatedInverter(a, latency=latency) for a in (1, 2)], clock=lambda: NOON)
+        return KacoRS485(bus.serial())
+
+    def testCoalescing(self):
+        shared = SharedKacoRS485(self.kaco(0.05))
+        results = []
+        errors = []
+        start = threading.Barrier(10)
+
+        def read(address):
+            start.wait()
+            try:
+                results.append((address, shared.readInverterAndParse(address)))
+            except Exception as e:
+                errors.append(e)
+
+        threads = [threading.Thread(target=read, args=(1 + i % 2,)) for i in range(10)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(errors, [])
+        self.assertEqual(len(results), 10)
+        for address, data in results:
+            self.assertEqual(data['last_command_sent']['value'][:3], '*{:02d}'.format(address))
+            self.assertIn('e_all', data)
+        #far less than 2 commands for each of the 10 reads
+        self.assertLessEqual(shared.transactions, 8)
+        self.assertEqual(shared.transactions + shared.coalesced, 20)
+
+    def testMaxAge(self):
+        clock = FakeClock()
+        shared = SharedKacoRS485(self.kaco(0), clock=clock)
+
+        first = shared.transaction(1, 0)
+        clock.now = 4
+        self.assertEqual(shared.transaction(1, 0, maxAge=5), first)
+        self.assertEqual(shared.transactions, 1)
+        self.assertEqual(shared.reused, 1)
+
+        clock.now = 6
+        shared.transaction(1, 0, maxAge=5)
+        shared.transaction(1, 0)
+        self.assertEqual(shared.transactions, 3)
+
+    def testErrorsReachAllWaiters(self):
+        class BrokenKaco(KacoRS485):
+            def __init__(self):
+                self.entered = threading.Event()
+                self.release = threading.Event()
+
+            def sendCmdAndRead(self, cmd, timeout=None):
+                self.entered.set()
+                self.release.wait()
+                raise Exception('port gone')
+
+        kaco = BrokenKaco()
+        shared = SharedKacoRS485(kaco)
+        errors = []
+
+        def read():
+            try:
+                shared.transaction(1, 0)
+            except Exception as e:
+                errors.append(str(e))
+
+        leader = threading.Thread(target=read)
+        leader.start()
+        kaco.entered.wait()
+        waiter = threading.Thread(target=read)
+        waiter.start()
+        while shared.coalesced == 0:
+            pass
+        kaco.release.set()
+        leader.join()
+        waiter.join()
+
+        self.assertEqual(errors, ['port gone', 'port gone'])
+        self.assertEqual(shared.flights, {})
+
+
+if __name__ == '__main__':
+    unittest.main()
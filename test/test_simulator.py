@@ -0,0 +1,82 @@
+import unittest
+
+#set import path to ../ directory
+import sys
+import random
+import os.path
+libpath = os.path.abspath(os.path.join(os.path.dirname(__file__),  os.path.pardir))
+sys.path.append(libpath)
+
+from kacors485.kacors485 import KacoRS485, KacoRS485Parser
+from kacors485.simulator import BusSimulator, SimulatedInverter, PtyBus, checksum
+
+NOON = 12 * 3600.0
+NIGHT = 2 * 3600.0
+
+
+class TestSimulator(unittest.TestCase):
+    def testFramesParse(self):
+        inverter = SimulatedInverter(7)
+        p = KacoRS485Parser()
+
+        for t in (NOON, 8 * 3600.0, 17.9 * 3600):
+            data = p.decode(inverter.frame(0, t), '#070\r\n')
+            self.assertEqual(data['last_command_sent'], '*070')
+            self.assertIn(data['status'], (2, 4, 5))
+            self.assertEqual(data['type'], '8000xi')
+
+            data = p.decode(inverter.frame(3, t), '#073\r\n')
+            self.assertEqual(data['last_command_sent'], '*073')
+
+        data = p.decode(inverter.frame(0, NOON), '#070\r\n')
+        self.assertAlmostEqual(data['p_dc'], 8000, delta=400)
+
+        frame = inverter.frame(0, NOON)
+        line = frame[1:frame.rindex(b' ', 0, -9) + 1]
+        self.assertEqual(frame[len(line) + 1:len(line) + 2], checksum(line))
+
+    def testInProcessBus(self):
+        bus = BusSimulator([SimulatedInverter(a) for a in (1, 2, 3)], clock=lambda: NOON)
+        kaco = KacoRS485(bus.serial(timeScale=0))
+
+        for address in (1, 2, 3):
+            reading = kaco.readReading(address)
+            self.assertEqual(reading.address, address)
+            self.assertEqual(reading.status, 5)
+            self.assertIsNotNone(reading.e_all)
+
+        kaco.waitBeforeRead = 0.01
+        with self.assertRaises(Exception):
+            kaco.readInverterAndParse(4)
+
+    def testNightAndFaults(self):
+        self.assertIsNone(SimulatedInverter(1).answer(0, NIGHT))
+        self.assertIsNone(SimulatedInverter(1, dropRate=1).answer(0, NOON))
+
+        frame = SimulatedInverter(1).frame(0, NOON)
+        answer, latency = SimulatedInverter(1, truncateRate=1, latency=0.2).answer(0, NOON)
+        self.assertLess(len(answer), len(frame))
+        self.assertEqual(latency, 0.2)
+
+        answer, latency = SimulatedInverter(1, garbleRate=1, rng=random.Random(3)).answer(0, NOON)
+        self.assertEqual(len(answer), len(frame))
+
+        latencies = [SimulatedInverter(1, latency=0.1, jitter=0.02).answer(0, NOON)[1] for i in range(5)]
+        self.assertTrue(all(l >= 0 for l in latencies))
+
+        with self.assertRaises(Exception):
+            BusSimulator([SimulatedInverter(33)])
+
+    def testPty(self):
+        bus = BusSimulator([SimulatedInverter(1, latency=0.01), SimulatedInverter(2, latency=0.01)],
+                           clock=lambda: NOON)
+        with PtyBus(bus) as pty:
+            kaco = KacoRS485(pty.port)
+            try:
+                reading = kaco.readReading(2)
+                self.assertEqual(kaco.sendCmdAndRead('#050\r\n', timeout=0.05), b'')
+            finally:
+                kaco.close()
+
+        self.assertEqual(reading.address, 2)
+        self.assertEqual(reading.status, 5)
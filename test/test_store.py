@@ -0,0 +1,90 @@
+import unittest
+
+#set import path to ../ directory
+import sys
+import math
+import os.path
+import shutil
+import tempfile
+libpath = os.path.abspath(os.path.join(os.path.dirname(__file__),  os.path.pardir))
+sys.path.append(libpath)
+
+from kacors485.reading import InverterReading
+from kacors485.store import ReadingStore, DAY
+import kacors485.store
+
+
+class TestReadingStore(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def fill(self, store):
+        #two days of readings every 600 seconds for two inverters
+        start = 10 * DAY
+        for t in range(start, start + 2 * DAY, 600):
+            store.append(InverterReading(address=7, timestamp=float(t), status=4, p_ac=float(t - start)))
+            store.append(InverterReading(address=8, timestamp=float(t), status=4, p_ac=1.0, e_all=5.0))
+        return start
+
+    def testQuery(self):
+        with ReadingStore(self.directory) as store:
+            start = self.fill(store)
+
+            data = store.query(7, start + DAY - 1200, start + DAY + 1200, ['p_ac'])
+
+            self.assertEqual(list(data['timestamp']), [start + DAY - 1200, start + DAY - 600, start + DAY, start + DAY + 600])
+            self.assertEqual(list(data['p_ac']), [DAY - 1200, DAY - 600, DAY, DAY + 600])
+            self.assertNotIn('u_dc', data)
+
+        #reopen and query all fields
+        store = ReadingStore(self.directory)
+        data = store.query(8, 0, 100 * DAY)
+        self.assertEqual(len(data['timestamp']), 2 * DAY // 600)
+        self.assertEqual(data['e_all'][0], 5.0)
+        self.assertTrue(math.isnan(data['u_dc'][0]))
+        self.assertEqual(len(store.days()), 2)
+
+        with self.assertRaises(Exception):
+            store.query(8, 0, DAY, ['type'])
+
+    def testAppendAfterReopen(self):
+        with ReadingStore(self.directory) as store:
+            store.append(InverterReading(address=1, timestamp=100.0, p_ac=1.0))
+        with ReadingStore(self.directory) as store:
+            with self.assertRaises(Exception):
+                store.append(InverterReading(address=1, timestamp=50.0, p_ac=2.0))
+            store.append(InverterReading(address=1, timestamp=200.0, p_ac=3.0))
+            data = store.query(1, 0, DAY)
+
+        self.assertEqual(list(data['p_ac']), [1.0, 3.0])
+
+    def testOpenSegmentsAreCapped(self):
+        with ReadingStore(self.directory) as store:
+            store.maxOpenSegments = 4
+            for day in range(10):
+                for address in (1, 2, 3):
+                    for i in range(3):
+                        store.append(InverterReading(address=address, timestamp=day * DAY + i * 600.0, p_ac=float(day)))
+                self.assertLessEqual(len(store._segments), 4)
+            #a closed segment of a past day opens again
+            store.append(InverterReading(address=1, timestamp=9 * DAY + 1800.0, p_ac=9.0))
+            data = store.query(1, 0, 10 * DAY, ['p_ac'])
+
+        self.assertEqual(len(data['p_ac']), 31)
+        self.assertEqual(list(data['p_ac'][::3]), [float(day) for day in range(10)] + [9.0])
+
+    def testQueryWithoutNumpy(self):
+        with ReadingStore(self.directory) as store:
+            start = self.fill(store)
+            numpy = kacors485.store.numpy
+            kacors485.store.numpy = None
+            try:
+                data = store.query(7, start, start + 1800, ['p_ac', 'status'])
+            finally:
+                kacors485.store.numpy = numpy
+
+        self.assertEqual(list(data['p_ac']), [0.0, 600.0, 1200.0])
+        self.assertEqual(list(data['status']), [4.0, 4.0, 4.0])
@@ -0,0 +1,91 @@
+import unittest
+
+#set import path to ../ directory
+import sys
+import os.path
+libpath = os.path.abspath(os.path.join(os.path.dirname(__file__),  os.path.pardir))
+sys.path.append(libpath)
+
+from kacors485.kacors485 import KacoRS485Parser
+from kacors485.simulator import SimulatedInverter, checksum
+
+NOON = 12 * 3600.0
+
+
+def frameWithChecksum(value):
+    """
+    answer to command 0 whose checksum byte is value
+    """
+    for pad in range(8):
+        for e_day in range(10000, 100000, 7):
+            line = '*010 {}  5 570.0 13.99  7976 229.5 33.01  7577  55  {:5d} '.format(' ' * pad, e_day).encode()
+            if checksum(line) == value:
+                return b'\n' + line + value + b' 8000xi\r'
+
+
+class TestFrameDecoder(unittest.TestCase):
+    def testStream(self):
+        inverter = SimulatedInverter(2)
+        frame0 = inverter.frame(0, NOON)
+        frame3 = inverter.frame(3, NOON)
+        corrupt = bytearray(frame0)
+        corrupt[20] = ord('x')
+
+        stream = (b'n\xd6\xf6V \xeb\x00' + frame0 + frame3[:15] + bytes(corrupt) + frame0 + b'\x00'
+                  + b'garbage' + frame3)
+
+        decoder = KacoRS485Parser().frameDecoder()
+        out = []
+        for i in range(0, len(stream), 7):
+            out += decoder.feed(stream[i:i + 7])
+
+        self.assertEqual([(a, c) for a, c, data in out], [(2, 0), (2, 0), (2, 3)])
+        expected = KacoRS485Parser().decode(frame0, '#020\r\n')
+        self.assertEqual(out[0][2], expected)
+        self.assertEqual(out[2][2]['e_all'], KacoRS485Parser().decode(frame3, '#023\r\n')['e_all'])
+        #cut off command 3 and the frame with the broken field
+        self.assertEqual(decoder.errors, 2)
+
+    def testChecksum(self):
+        decoder = KacoRS485Parser().frameDecoder()
+
+        bad = bytearray(frameWithChecksum(b'A'))
+        bad[-9] = ord('B')
+        self.assertEqual(decoder.feed(bytes(bad)), [])
+        self.assertEqual(decoder.errors, 1)
+
+        #checksum bytes which look like whitespace or a terminator
+        for value in (b' ', b'\x0b', b'\r', b'\x00'):
+            out = decoder.feed(frameWithChecksum(value))
+            self.assertEqual(len(out), 1, value)
+            self.assertEqual(out[0][2]['type'], '8000xi')
+            self.assertEqual(out[0][2]['p_ac'], 7577)
+
+    def testWithoutEcho(self):
+        frame3 = SimulatedInverter(4, echo3=False).frame(3, NOON)
+
+        decoder = KacoRS485Parser().frameDecoder()
+        self.assertEqual(decoder.feed(frame3), [])
+
+        decoder.expect(4, 3)
+        out = decoder.feed(b'n\xd6\x96V\xeb\x00' + frame3)
+        self.assertEqual([(a, c) for a, c, data in out], [(4, 3)])
+        self.assertNotIn('last_command_sent', out[0][2])
+
+    def testDecodeRecovers(self):
+        p = KacoRS485Parser()
+
+        #noise with a space in front of the answer
+        answer = b'n\xd6 V\xeb\x00' + SimulatedInverter(1).frame(0, NOON)
+        self.assertEqual(p.decode(answer, '#010\r\n')['last_command_sent'], '*010')
+
+        answer = frameWithChecksum(b'\x0b')
+        self.assertEqual(p.decode(answer, '#010\r\n')['type'], '8000xi')
+
+        #still broken
+        with self.assertRaises(Exception):
+            p.decode(b'\n*010   5 570.0 13.99  7976 229.5\r', '#010\r\n')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,88 @@
+import unittest
+
+#set import path to ../ directory
+import sys
+import time
+import os.path
+libpath = os.path.abspath(os.path.join(os.path.dirname(__file__),  os.path.pardir))
+sys.path.append(libpath)
+
+from kacors485.kacors485 import KacoRS485
+from kacors485.timing import AdaptiveTimeouts
+from kacors485.simulator import BusSimulator, SimulatedInverter
+
+NOON = 12 * 3600.0
+
+
+class TestAdaptiveTimeouts(unittest.TestCase):
+    def testLearnsDeadline(self):
+        t = AdaptiveTimeouts()
+
+        self.assertEqual(t.deadline(1, 0, 0.7), 0.7)
+        for i in range(20):
+            t.answered(1, 0, 0.06)
+        t.answered(1, 0, 0.3)
+
+        self.assertAlmostEqual(t.deadline(1, 0, 0.7), 0.06 * 1.2 + 0.05)
+        #other command and address are not known yet
+        self.assertEqual(t.deadline(1, 3, 0.7), 0.7)
+        self.assertEqual(t.deadline(2, 0, 0.7), 0.7)
+        #never more than the default
+        self.assertEqual(t.deadline(1, 0, 0.1), 0.1)
+
+    def testIncompleteAnswerIsAMiss(self):
+        t = AdaptiveTimeouts()
+        for i in range(5):
+            t.answered(1, 0, 0.06)
+
+        #a cut-off answer: retry with the full deadline
+        t.incomplete(1, 0, 0.122, 40)
+        self.assertEqual(t.deadline(1, 0, 0.7), 0.7)
+        self.assertEqual(list(t.samples[(1, 0)]), [0.06] * 5)
+
+        #garbage while asleep: only probed like a silent address
+        t.incomplete(1, 0, 0.7, 6)
+        t.incomplete(1, 0, 0.7, 6)
+        self.assertTrue(t.isSilent(1))
+        self.assertEqual(t.deadline(1, 0, 0.7), t.probeTimeout)
+        self.assertAlmostEqual(t.estimate(1, 0), 0.06)
+
+    def testSilentAddress(self):
+        t = AdaptiveTimeouts()
+        for i in range(5):
+            t.answered(1, 0, 0.06)
+
+        t.incomplete(1, 0, 0.122, 0)
+        #retry with the full deadline
+        self.assertEqual(t.deadline(1, 0, 0.7), 0.7)
+
+        t.incomplete(1, 0, 0.7, 0)
+        t.incomplete(1, 0, 0.7, 0)
+        self.assertTrue(t.isSilent(1))
+
+        deadlines = [t.deadline(1, 0, 0.7) for i in range(10)]
+        self.assertEqual(deadlines.count(0.7), 1)
+        self.assertEqual(deadlines.count(t.probeTimeout), 9)
+
+        t.answered(1, 0, 0.3)
+        self.assertFalse(t.isSilent(1))
+
+
+class TestKacoAdaptiveTimeouts(unittest.TestCase):
+    def testCycleGetsFaster(self):
+        bus = BusSimulator([SimulatedInverter(1, latency=0.01)], clock=lambda: NOON)
+        kaco = KacoRS485(bus.serial())
+        kaco.waitBeforeRead = 0.3
+
+        for i in range(6):
+            kaco.readInverter(1)
+        self.assertLess(kaco.timeouts.deadline(1, 0, kaco.waitBeforeRead), 0.1)
+
+        #address 2 does not exist: after a few full waits it is only probed
+        for i in range(3):
+            kaco.sendCmdAndRead('#020\r\n')
+        self.assertTrue(kaco.timeouts.isSilent(2))
+
+        start = time.monotonic()
+        self.assertEqual(kaco.sendCmdAndRead('#020\r\n'), b'')
+        self.assertLess(time.monotonic() - start, 0.25)
@@ -0,0 +1,102 @@
+import unittest
+import json
+import shutil
+import struct
+import tempfile
+
+#set import path to ../ directory
+import sys
+import os.path
+libpath = os.path.abspath(os.path.join(os.path.dirname(__file__),  os.path.pardir))
+sys.path.append(libpath)
+
+from kacors485.kacors485 import KacoRS485
+from kacors485.reading import InverterReading
+from kacors485.simulator import BusSimulator, SimulatedInverter
+from kacors485 import wire
+
+NOON = 12 * 3600.0
+
+
+def float32(value):
+    return None if value is None else struct.unpack('<f', struct.pack('<f', value))[0]
+
+
+class TestWire(unittest.TestCase):
+    def readings(self, cycles=3, inverters=4):
+        bus = BusSimulator([SimulatedInverter(a, latency=0) for a in range(1, inverters + 1)], clock=lambda: NOON)
+        kaco = KacoRS485(bus.serial())
+        out = []
+        for i in range(cycles):
+            for address in range(1, inverters + 1):
+                out.append(kaco.readReading(address)._replace(timestamp=NOON + i * 10.25 + address / 1000.0))
+        return out
+
+    def assertReadingEqual(self, decoded, reading):
+        for name, value, original in zip(InverterReading._fields, decoded, reading):
+            if isinstance(original, float) and name != 'timestamp':
+                self.assertEqual(value, float32(original), name)
+            else:
+                self.assertEqual(value, original, name)
+
+    def testRoundTrip(self):
+        readings = self.readings()
+        readings.append(InverterReading(address=9, timestamp=NOON + 99, status=2, p_ac=10.0))
+        readings.append(InverterReading(address=9, timestamp=NOON + 100, e_all=44661.0, run_all='25301:20'))
+
+        for delta in (False, True):
+            decoded = wire.decode(wire.encode(readings, delta=delta))
+            self.assertEqual(len(decoded), len(readings))
+            for d, r in zip(decoded, readings):
+                if delta:
+                    self.assertAlmostEqual(d.timestamp, r.timestamp, places=3)
+                    d = d._replace(timestamp=r.timestamp)
+                self.assertReadingEqual(d, r)
+
+    def testSmallerThanJson(self):
+        bus = BusSimulator([SimulatedInverter(a, latency=0) for a in range(1, 5)], clock=lambda: NOON)
+        kaco = KacoRS485(bus.serial())
+        parsed = json.dumps([kaco.readInverterAndParse(a) for a in range(1, 5)], default=str).encode()
+        data = wire.encode([kaco.readReading(a) for a in range(1, 5)])
+        self.assertLess(len(data) * 10, len(parsed))
+
+    def testErrors(self):
+        data = wire.encode(self.readings(1, 1))
+        with self.assertRaises(Exception):
+            wire.decode(b'JUNK' + data[4:])
+        with self.assertRaises(Exception):
+            wire.decode(data[:4] + b'\x63' + data[5:])
+        with self.assertRaises(Exception):
+            wire.decode(data[:-1])
+        with self.assertRaises(Exception):
+            wire.encode([InverterReading(address=1, timestamp=NOON, type='x' * 300)])
+
+    def testWriter(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        path = os.path.join(directory, 'export.kw')
+        readings = self.readings()
+        with wire.WireWriter(path, delta=True) as writer:
+            writer.write(readings[:5])
+            writer.write([])
+            writer.write(readings[5:])
+        with open(path, 'rb') as f:
+            decoded = list(wire.decodeAll(f.read()))
+        self.assertEqual([d.address for d in decoded], [r.address for r in readings])
+        self.assertEqual([d.e_all for d in decoded], [float32(r.e_all) for r in readings])
+
+    def testLongDeltaBatch(self):
+        #counters with fractions, rounding must not add up
+        readings = [InverterReading(address=1, timestamp=NOON + i * 10.0, e_day=(i * 1234.567) % 30000,
+                                    e_all=44661.0 + i * 0.0037) for i in range(20000)]
+
+        decoded = wire.decode(wire.encode(readings, delta=True))
+
+        for d, r in zip(decoded, readings):
+            self.assertLess(abs(d.e_all - r.e_all), 0.001)
+            self.assertLess(abs(d.e_day - r.e_day), 0.002)
+        self.assertEqual(decoded[-1].timestamp, readings[-1].timestamp)
+
+
+if __name__ == '__main__':
+    unittest.main()